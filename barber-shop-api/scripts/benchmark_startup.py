@@ -0,0 +1,98 @@
+'''
+Measures how long an API worker takes to start and how much memory it holds once started.
+
+Each run imports the app in a fresh interpreter, as a uvicorn worker does, then builds the
+database engine as the app lifespan does. Nothing connects to the database or to Keycloak,
+but the settings are read from the environment (or .env) like the app itself.
+
+Usage, from the barber-shop-api directory:
+    python scripts/benchmark_startup.py [--runs N] [--max-import-seconds S] [--max-rss-mb MB]
+
+The medians of the runs are printed. With a limit given, the script exits with status 1 when
+the median is over it, so it can guard against startup regressions.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Runs in the fresh interpreter, prints the measurements of one startup as JSON
+WORKER_STARTUP = '''
+import json
+import resource
+import sys
+import time
+
+# Current resident memory in MB, from /proc where available, otherwise the peak
+def rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+baseline_rss = rss_mb()
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import_rss = rss_mb()
+
+from core.db import async_session_manager
+async_session_manager.init()
+ready = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - start,
+    "engine_seconds": ready - imported,
+    "interpreter_rss_mb": baseline_rss,
+    "import_rss_mb": import_rss,
+    "ready_rss_mb": rss_mb(),
+}))
+'''
+
+
+def measure(src_dir: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER_STARTUP],
+        cwd=src_dir,
+        env={**os.environ, "PYTHONPATH": src_dir},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Worker startup failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API worker startup time and memory")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--src", default=SRC_DIR, help="Source directory of the app")
+    parser.add_argument("--max-import-seconds", type=float, help="Fail when the median import time is over this")
+    parser.add_argument("--max-rss-mb", type=float, help="Fail when the median resident memory once ready is over this")
+    args = parser.parse_args()
+
+    runs = [measure(os.path.abspath(args.src)) for _ in range(args.runs)]
+    medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    for key, value in medians.items():
+        print(f"{key:>20}: {value:.3f}")
+
+    failures = []
+    if args.max_import_seconds is not None and medians["import_seconds"] > args.max_import_seconds:
+        failures.append(f"import took {medians['import_seconds']:.3f}s, limit {args.max_import_seconds}s")
+    if args.max_rss_mb is not None and medians["ready_rss_mb"] > args.max_rss_mb:
+        failures.append(f"resident memory is {medians['ready_rss_mb']:.1f}MB, limit {args.max_rss_mb}MB")
+    if failures:
+        raise SystemExit("Startup regression: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+'''
+Rebuilds the barber_daily_availability summary from the schedules and time slots,
+repairing any drift between the two.
+
+Usage, from the barber-shop-api directory:
+    python scripts/rebuild_availability.py [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--barber-id ID ...]
+
+Without arguments every day of every barber is rebuilt.
+'''
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from core.db import async_session_manager
+from operations.availability_operations import AvailabilityOperations
+
+
+async def rebuild(date_from, date_to, barber_ids):
+    try:
+        async with async_session_manager.session() as session:
+            await AvailabilityOperations(session).refresh_range(date_from, date_to, barber_ids)
+            await session.commit()
+    finally:
+        await async_session_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the barber daily availability summary")
+    parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat, help="First date to rebuild")
+    parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, help="Last date to rebuild")
+    parser.add_argument("--barber-id", dest="barber_ids", type=int, action="append", help="Barber to rebuild, repeatable")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild(args.date_from, args.date_to, args.barber_ids))
+    print("Barber daily availability rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,7 +37,7 @@ class AuthController:
 
         return TokenResponse(access_token=access_token)
 
-    def protected_endpoint(
+    async def protected_endpoint(
         credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
         required_role: str = None  # Optional parameter to enforce role-based access
     ) -> UserInfo:
@@ -57,7 +57,7 @@ class AuthController:
         token = credentials.credentials
 
         # Verify the token and get user information
-        user_info = AuthService.verify_token(token)
+        user_info = await AuthService.verify_token(token)
 
         if not user_info:
             raise HTTPException(
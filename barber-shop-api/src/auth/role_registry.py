@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+'''
+Keeps the realm roles in memory, indexed by name.
+
+Looking a role up used to list every realm role from Keycloak and scan it. The
+registry loads the list once and reloads it when it is older than the TTL or
+when a lookup misses, so roles created in Keycloak are still picked up.
+'''
+class RealmRoleRegistry:
+
+    def __init__(self, load_roles: Callable[[], Awaitable[list[dict]]], ttl: float = 300.0):
+        self._load_roles = load_roles
+        self.ttl = ttl
+
+        self._roles: dict[str, dict] = {}
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+        # Keycloak round trips made, and lookups answered without one
+        self.round_trips = 0
+        self.round_trips_saved = 0
+
+    # Returns the role representation for a role name, or None if the realm has no such role
+    async def get(self, role_name: str) -> Optional[dict]:
+        if time.monotonic() < self._expires_at:
+            role = self._roles.get(role_name)
+            if role:
+                self.round_trips_saved += 1
+                return role
+
+        await self.refresh()
+        return self._roles.get(role_name)
+
+    # Reloads the roles, concurrent callers share a single Keycloak request
+    async def refresh(self):
+        generation = self._generation
+        async with self._lock:
+            if self._generation != generation:
+                self.round_trips_saved += 1
+                return
+
+            roles = await self._load_roles()
+            self.round_trips += 1
+            self._roles = {role["name"]: role for role in roles}
+            self._expires_at = time.monotonic() + self.ttl
+            self._generation += 1
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "roles": len(self._roles),
+            "round_trips": self.round_trips,
+            "round_trips_saved": self.round_trips_saved,
+        }
@@ -1,13 +1,21 @@
+import asyncio
+import functools
+import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import HTTPException, status, Security
 from keycloak.exceptions import KeycloakAuthenticationError
 from core.config import settings
 from auth.models import UserInfo
 from keycloak import KeycloakOpenID, KeycloakOpenIDConnection, KeycloakAdmin
+from auth.token_verifier import TokenVerifier
+from auth.role_registry import RealmRoleRegistry
 from modules.user.user_schema import UserCreate, UserUpdate
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+logger = logging.getLogger("auth_service")
+logger.setLevel(logging.ERROR)
 
 bearer_scheme = HTTPBearer()
 
@@ -15,24 +23,40 @@ class AuthService:
 
     # Keycloak connection using credentials from core/config/settings
     keycloak_openid = KeycloakOpenID(
-        server_url=settings.get_config()["keycloak_server_url"],
-        realm_name=settings.get_config()["keycloak_realm"],
-        client_id=settings.get_config()["keycloak_api_client_id"],
-        client_secret_key=settings.get_config()["keycloak_api_secret"],
+        server_url=settings.get_config().keycloak_server_url,
+        realm_name=settings.get_config().keycloak_realm,
+        client_id=settings.get_config().keycloak_api_client_id,
+        client_secret_key=settings.get_config().keycloak_api_secret,
     )
 
     # Keycloak Admin (For User Management)
     keycloak_admin_connection = KeycloakOpenIDConnection(
-        server_url=settings.get_config()["keycloak_server_url"],
-        username=settings.get_config()["keycloak_admin_username"],
-        password=settings.get_config()["keycloak_admin_password"],
-        realm_name=settings.get_config()["keycloak_realm"],
-        client_id=settings.get_config()["keycloak_api_client_id"],
-        client_secret_key=settings.get_config()["keycloak_api_secret"],
+        server_url=settings.get_config().keycloak_server_url,
+        username=settings.get_config().keycloak_admin_username,
+        password=settings.get_config().keycloak_admin_password,
+        realm_name=settings.get_config().keycloak_realm,
+        client_id=settings.get_config().keycloak_api_client_id,
+        client_secret_key=settings.get_config().keycloak_api_secret,
         verify=True,
+        timeout=settings.get_config().keycloak_admin_timeout,
     )
     keycloak_admin = KeycloakAdmin(connection=keycloak_admin_connection)
 
+    # Admin calls are blocking HTTP requests, they run on their own bounded executor
+    # so a slow Keycloak response never stalls the event loop
+    admin_executor = ThreadPoolExecutor(
+        max_workers=settings.get_config().keycloak_admin_max_workers,
+        thread_name_prefix="keycloak-admin",
+    )
+
+    # Realm roles indexed by name, reloaded on TTL expiry or when a lookup misses
+    realm_roles = RealmRoleRegistry(
+        lambda: AuthService.run_admin_call(AuthService.keycloak_admin.get_realm_roles)
+    )
+
+    # Verifies tokens locally against the cached realm signing keys
+    token_verifier = TokenVerifier(keycloak_openid)
+
     # Checks username and password against Keycloak DB and return JWT
     def authenticate_user(username: str, password: str) -> str:
         """
@@ -47,13 +71,10 @@ class AuthService:
                 detail="Invalid username or password",
             )
 
-    # Verifies token against Keycloak and UserInfo model and returns user info
-    def verify_token(token: str) -> UserInfo:
+    # Verifies token against the realm signing keys and UserInfo model and returns user info
+    async def verify_token(token: str) -> UserInfo:
         try:
-            token_info = AuthService.keycloak_openid.decode_token(
-                token,
-                validate=True,
-            )
+            token_info = await AuthService.token_verifier.verify(token)
             # Check if the token is expired
             if token_info["exp"] < int(time.time()):
                 raise HTTPException(
@@ -82,8 +103,48 @@ class AuthService:
                 detail="Could not validate credentials",
             )
 
+    # Runs a blocking Keycloak admin call on the admin executor with a timeout
+    # A call that times out keeps running on its thread. If it still succeeds, undo is
+    # called with its result on the executor, so its effect does not outlive the 504.
+    async def run_admin_call(func, *args, undo=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(
+            AuthService.admin_executor, functools.partial(func, *args, **kwargs)
+        )
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(call),
+                timeout=settings.get_config().keycloak_admin_timeout,
+            )
+        except asyncio.TimeoutError:
+            call.add_done_callback(functools.partial(AuthService.finish_abandoned_call, undo))
+            raise HTTPException(
+                status_code=504, detail="Keycloak admin request timed out"
+            )
+
+    # Runs when an admin call the caller stopped waiting for ends, undoing it if it succeeded
+    def finish_abandoned_call(undo, call: asyncio.Future):
+        if call.cancelled():
+            return
+        if call.exception() is not None:
+            logger.error(f"Abandoned Keycloak admin call failed: {call.exception()}")
+            return
+        if undo is None:
+            return
+        try:
+            AuthService.admin_executor.submit(undo, call.result()).add_done_callback(
+                AuthService.log_undo_failure
+            )
+        except RuntimeError as e:
+            # The executor is shut down with the app
+            logger.error(f"Could not undo an abandoned Keycloak admin call: {str(e)}")
+
+    def log_undo_failure(undo_call):
+        if undo_call.exception() is not None:
+            logger.error(f"Could not undo an abandoned Keycloak admin call: {undo_call.exception()}")
+
     # Register a new user in Keycloak
-    def register_kc_user(user: UserCreate):
+    async def register_kc_user(user: UserCreate):
         """
         Register a new user in Keycloak.
         """
@@ -101,8 +162,16 @@ class AuthService:
         }
 
         try:
-            kc_user_id = AuthService.keycloak_admin.create_user(user_representation)
+            # A user Keycloak creates after the request timed out is deleted again,
+            # the client got a 504 and no user row is written for it
+            kc_user_id = await AuthService.run_admin_call(
+                AuthService.keycloak_admin.create_user,
+                user_representation,
+                undo=lambda kc_user_id: AuthService.keycloak_admin.delete_user(user_id=kc_user_id),
+            )
             return kc_user_id
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=400, detail=f"Error creating user: {str(e)}"
@@ -110,7 +179,7 @@ class AuthService:
 
             
 
-    def update_kc_user(user: UserUpdate):
+    async def update_kc_user(user: UserUpdate):
 
         user_representation = {
             "username": user.email,
@@ -120,70 +189,118 @@ class AuthService:
         }
 
         try:
-            user_id = AuthService.keycloak_admin.get_user_id(username=user.email)
-            AuthService.keycloak_admin.update_user(
-                user_id=user_id, payload=user_representation
+            user_id = await AuthService.run_admin_call(
+                AuthService.keycloak_admin.get_user_id, username=user.email
+            )
+            await AuthService.run_admin_call(
+                AuthService.keycloak_admin.update_user,
+                user_id=user_id,
+                payload=user_representation,
             )
             return {"message": "User updated successfully"}
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Error updating user: {str(e)}"
             )
 
-    def delete_kc_user(user_email):
+    async def delete_kc_user(user_email):
         try:
-            user_id = AuthService.keycloak_admin.get_user_id(username=user_email)
-            AuthService.keycloak_admin.delete_user(user_id=user_id)
+            user_id = await AuthService.run_admin_call(
+                AuthService.keycloak_admin.get_user_id, username=user_email
+            )
+            await AuthService.run_admin_call(
+                AuthService.keycloak_admin.delete_user, user_id=user_id
+            )
             return {"message": "User deleted successfully"}
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Error deleting user: {str(e)}"
             )
 
-    def get_current_user(
+    async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
     ) -> UserInfo:
         """Extract and verify the token to retrieve user info."""
         token = credentials.credentials
-        user_info = AuthService.verify_token(token)
+        user_info = await AuthService.verify_token(token)
 
         if not user_info:
             raise HTTPException(status_code=401, detail="Invalid or expired token")
 
         return user_info
     
-    def add_role_to_user(user_id: str, role_name: str):
+    # Looks up a realm role by name, raising a 404 if the realm has no such role
+    async def get_realm_role(role_name: str) -> dict:
+        role_object = await AuthService.realm_roles.get(role_name)
+        if not role_object:
+            raise HTTPException(
+                status_code=404, detail=f"Role '{role_name}' not found"
+            )
+        return role_object
+
+    async def add_role_to_user(user_id: str, role_name: str):
         """
         Add a role to a user in Keycloak.
         """
         try:
             # Check if the role exists
-            roles = AuthService.keycloak_admin.get_realm_roles()
-            role_object = next(
-                (role for role in roles if role["name"] == role_name), None
-            )
-            if not role_object:
-                raise HTTPException(
-                    status_code=404, detail=f"Role '{role_name}' not found"
-                )
+            role_object = await AuthService.get_realm_role(role_name)
             # Assign the role to the user
-            AuthService.keycloak_admin.assign_realm_roles(
-                user_id=user_id, roles=[role_object]
+            await AuthService.run_admin_call(
+                AuthService.keycloak_admin.assign_realm_roles,
+                user_id=user_id,
+                roles=[role_object],
             )
             
             return {"message": "Role added successfully"}
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Error adding role to user: {str(e)}"
             )
+
+    async def add_role_to_users(user_ids: list[str], role_name: str):
+        """
+        Add a role to many users in Keycloak, looking the role up only once.
+        """
+        try:
+            role_object = await AuthService.get_realm_role(role_name)
+            await asyncio.gather(*(
+                AuthService.run_admin_call(
+                    AuthService.keycloak_admin.assign_realm_roles,
+                    user_id=user_id,
+                    roles=[role_object],
+                )
+                for user_id in user_ids
+            ))
+
+            return {"message": "Roles added successfully"}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error adding role to users: {str(e)}"
+            )
         
-    def remove_role_from_user(user_id: str, role_name: str):
+    async def remove_role_from_user(user_id: str, role_name: str):
         """
         Remove a role from a user in Keycloak.
         """
         try:
-            AuthService.keycloak_admin.delete_realm_roles_of_user(user_id=user_id, roles=[role_name])
+            role_object = await AuthService.get_realm_role(role_name)
+            await AuthService.run_admin_call(
+                AuthService.keycloak_admin.delete_realm_roles_of_user,
+                user_id=user_id,
+                roles=[role_object],
+            )
             return {"message": "Role removed successfully"}
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Error removing role from user: {str(e)}"
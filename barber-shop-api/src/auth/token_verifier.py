@@ -0,0 +1,128 @@
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from jwcrypto import jwk, jwt
+from keycloak import KeycloakOpenID
+
+'''
+Verifies Keycloak access tokens locally against the realm's signing keys.
+
+KeycloakOpenID.decode_token(validate=True) fetches the realm public key over HTTP
+on every call. The verifier instead keeps the realm JWKS in memory, only going back
+to Keycloak when a token is signed with a key id it has not seen yet, and remembers
+the claims of tokens it has already verified until they expire. The JWKS fetch is a
+blocking HTTP call, so it runs on a worker thread and never on the event loop.
+'''
+class TokenVerifier:
+
+    def __init__(
+        self,
+        keycloak_openid: KeycloakOpenID,
+        cache_size: int = 4096,
+        min_refresh_interval: float = 10.0,
+    ):
+        self.keycloak_openid = keycloak_openid
+        self.cache_size = cache_size
+        self.min_refresh_interval = min_refresh_interval
+
+        self._keys: dict[str, jwk.JWK] = {}
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+        # token hash -> (exp, claims), ordered from least to most recently used
+        self._cache: OrderedDict[bytes, tuple[int, dict]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.key_refreshes = 0
+
+    # Returns the verified claims of a token, raising if the token is invalid or expired
+    async def verify(self, token: str) -> dict:
+        token_hash = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+
+        with self._cache_lock:
+            cached = self._cache.get(token_hash)
+            if cached and cached[0] > now:
+                self._cache.move_to_end(token_hash)
+                self.hits += 1
+                return cached[1]
+            if cached:
+                del self._cache[token_hash]
+            self.misses += 1
+
+        key = await self._get_key(self._get_kid(token))
+        claims = json.loads(jwt.JWT(jwt=token, key=key).claims)
+
+        exp = claims.get("exp")
+        if not exp or exp <= now:
+            raise ValueError("Token has expired")
+
+        with self._cache_lock:
+            self._cache[token_hash] = (exp, claims)
+            self._cache.move_to_end(token_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return claims
+
+    # Loads the realm signing keys up front, so the first request does not pay for it
+    async def load_keys(self):
+        async with self._refresh_lock:
+            await self._refresh_keys()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "key_refreshes": self.key_refreshes,
+            "cached_tokens": len(self._cache),
+            "signing_keys": len(self._keys),
+        }
+
+    def clear(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    async def _get_key(self, kid: str) -> jwk.JWK:
+        key = self._keys.get(kid)
+        if key:
+            return key
+
+        # Only one caller refreshes the key set, the others wait and re-check
+        async with self._refresh_lock:
+            key = self._keys.get(kid)
+            if key:
+                return key
+            if time.monotonic() - self._last_refresh >= self.min_refresh_interval:
+                await self._refresh_keys()
+                key = self._keys.get(kid)
+
+        if not key:
+            raise ValueError(f"Unknown signing key: {kid}")
+        return key
+
+    async def _refresh_keys(self):
+        certs = await asyncio.to_thread(self.keycloak_openid.certs)
+        self._keys = {
+            key["kid"]: jwk.JWK.from_json(json.dumps(key))
+            for key in certs.get("keys", [])
+            if key.get("use", "sig") == "sig"
+        }
+        self._last_refresh = time.monotonic()
+        self.key_refreshes += 1
+
+    @staticmethod
+    def _get_kid(token: str) -> str:
+        header = token.split(".", 1)[0]
+        header += "=" * (-len(header) % 4)
+        kid = json.loads(base64.urlsafe_b64decode(header)).get("kid")
+        if not kid:
+            raise ValueError("Token header has no key id")
+        return kid
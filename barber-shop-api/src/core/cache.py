@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+'''
+Small in-process cache for read-heavy query results.
+
+Entries expire after the TTL and the least recently used ones are evicted past
+max_size. Each worker process has its own cache, so writers invalidate it on the
+process that handled the write and other workers catch up within the TTL.
+'''
+class TTLCache:
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # key -> (expires_at, value), ordered from least to most recently used
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the cached value for a key, or None if it is missing or expired
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,7 +1,8 @@
 import os
-from typing import TypedDict
+from dataclasses import dataclass
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from dotenv import load_dotenv
-from fastapi_mail import ConnectionConfig
 
 load_dotenv()
 
@@ -34,25 +35,34 @@ required_environment_variables = [
     "USE_CREDENTIALS",
 ]
 
-class BaseSettings(TypedDict):
+# Parsed application configuration, built once from the environment
+@dataclass(frozen=True, slots=True)
+class BaseSettings:
     secret_key: str
     mysql_user: str
     mysql_password: str
     mysql_db: str
     mysql_host: str
-    mysql_port: str
+    mysql_port: int
     mysql_echo: bool
+    mysql_pool_size: int
+    mysql_max_overflow: int
+    mysql_pool_timeout: float
+    mysql_pool_recycle: int
+    mysql_pool_pre_ping: bool
     debug: bool
-    backend_cors_origins: list[str]
+    backend_cors_origins: tuple[str, ...]
     frontend_host: str
     keycloak_server_url: str
     keycloak_realm: str
     keycloak_api_client_id: str
-    keycloak_frontend_client_id: str
+    keycloak_front_end_client_id: str
     keycloak_api_secret: str
     keycloak_front_end_secret: str
     keycloak_admin_username: str
     keycloak_admin_password: str
+    keycloak_admin_timeout: float
+    keycloak_admin_max_workers: int
     mail_username: str
     mail_password: str
     mail_from: str
@@ -61,64 +71,112 @@ class BaseSettings(TypedDict):
     mail_tls: bool
     mail_ssl: bool
     use_credentials: bool
+    email_batch_size: int
+    email_poll_interval: float
+    email_max_attempts: int
+    email_retry_delay: float
+    email_send_timeout: float
+    email_pool_size: int
+    email_pool_idle_timeout: float
+    appointment_reminder_hours: float
+    shop_timezone: ZoneInfo
 
 class Settings:
     def __init__(self):
-        self.check_environment_variables()
+        self._config: Optional[BaseSettings] = None
+        self.reload()
 
     def check_environment_variables(self):
         for env_var in required_environment_variables:
             if env_var not in os.environ:
                 raise EnvironmentError(f"Missing environment variable: {env_var}")
-            
-    def get_config(self) -> BaseSettings:
-        return {
-            "secret_key": os.getenv("SECRET_KEY"),
-            "mysql_user": os.getenv("MYSQL_USER"),
-            "mysql_password": os.getenv("MYSQL_PASSWORD"),
-            "mysql_db": os.getenv("MYSQL_DB"),
-            "mysql_host": os.getenv("MYSQL_HOST"),
-            "mysql_port": os.getenv("MYSQL_PORT"),
-            "mysql_echo": self.check_boolean(os.getenv("MYSQL_ECHO")),
-            "debug": self.check_boolean(os.getenv("DEBUG")),
-            "backend_cors_origins": os.getenv("BACKEND_CORS_ORIGINS").split(","),
-            "frontend_host": os.getenv("FRONTEND_HOST"),
-            "keycloak_server_url": os.getenv("KEYCLOAK_SERVER_URL"),
-            "keycloak_realm": os.getenv("KEYCLOAK_REALM"),
-            "keycloak_api_client_id": os.getenv("KEYCLOAK_API_CLIENT_ID"),
-            "keycloak_front_end_client_id": os.getenv("KEYCLOAK_FRONT_END_CLIENT_ID"),
-            "keycloak_api_secret": os.getenv("KEYCLOAK_API_SECRET"),
-            "keycloak_front_end_secret": os.getenv("KEYCLOAK_FRONT_END_SECRET"),
-            "keycloak_admin_username": os.getenv("KEYCLOAK_ADMIN_USERNAME"),
-            "keycloak_admin_password": os.getenv("KEYCLOAK_ADMIN_PASSWORD"),
-            "mail_username": os.getenv("MAIL_USERNAME"),
-            "mail_password": os.getenv("MAIL_PASSWORD"),
-            "mail_from": os.getenv("MAIL_FROM"),
-            "mail_port": os.getenv("MAIL_PORT"),
-            "mail_server": os.getenv("MAIL_SERVER"),
-            "mail_tls": self.check_boolean(os.getenv("MAIL_TLS")),
-            "mail_ssl": self.check_boolean(os.getenv("MAIL_SSL")),
-            "use_credentials": self.check_boolean(os.getenv("USE_CREDENTIALS")),
-        }
-    
-    def get_mail_config(self) -> ConnectionConfig:
-        config = self.get_config()
-        return ConnectionConfig(
-            MAIL_USERNAME=config["mail_username"],
-            MAIL_PASSWORD=config["mail_password"],
-            MAIL_FROM=config["mail_from"],
-            MAIL_PORT=config["mail_port"],
-            MAIL_SERVER=config["mail_server"],
-            MAIL_STARTTLS=config["mail_tls"],
-            MAIL_SSL_TLS=config["mail_ssl"],
-            USE_CREDENTIALS=config["use_credentials"],
+
+    # Re-reads the environment, only needed when it changes at runtime (e.g. in tests)
+    def reload(self) -> BaseSettings:
+        self.check_environment_variables()
+        self._config = BaseSettings(
+            secret_key=os.environ["SECRET_KEY"],
+            mysql_user=os.environ["MYSQL_USER"],
+            mysql_password=os.environ["MYSQL_PASSWORD"],
+            mysql_db=os.environ["MYSQL_DB"],
+            mysql_host=os.environ["MYSQL_HOST"],
+            mysql_port=self.check_integer("MYSQL_PORT"),
+            mysql_echo=self.check_boolean(os.environ["MYSQL_ECHO"]),
+            mysql_pool_size=self.check_integer("MYSQL_POOL_SIZE", 5),
+            mysql_max_overflow=self.check_integer("MYSQL_MAX_OVERFLOW", 10),
+            mysql_pool_timeout=self.check_float("MYSQL_POOL_TIMEOUT", 30.0),
+            mysql_pool_recycle=self.check_integer("MYSQL_POOL_RECYCLE", 1800),
+            mysql_pool_pre_ping=self.check_boolean(os.getenv("MYSQL_POOL_PRE_PING", "true")),
+            debug=self.check_boolean(os.environ["DEBUG"]),
+            backend_cors_origins=tuple(
+                origin.strip() for origin in os.environ["BACKEND_CORS_ORIGINS"].split(",")
+            ),
+            frontend_host=os.environ["FRONTEND_HOST"],
+            keycloak_server_url=os.environ["KEYCLOAK_SERVER_URL"],
+            keycloak_realm=os.environ["KEYCLOAK_REALM"],
+            keycloak_api_client_id=os.environ["KEYCLOAK_API_CLIENT_ID"],
+            keycloak_front_end_client_id=os.environ["KEYCLOAK_FRONT_END_CLIENT_ID"],
+            keycloak_api_secret=os.environ["KEYCLOAK_API_SECRET"],
+            keycloak_front_end_secret=os.environ["KEYCLOAK_FRONT_END_SECRET"],
+            keycloak_admin_username=os.environ["KEYCLOAK_ADMIN_USERNAME"],
+            keycloak_admin_password=os.environ["KEYCLOAK_ADMIN_PASSWORD"],
+            keycloak_admin_timeout=self.check_float("KEYCLOAK_ADMIN_TIMEOUT", 10.0),
+            keycloak_admin_max_workers=self.check_integer("KEYCLOAK_ADMIN_MAX_WORKERS", 4),
+            mail_username=os.environ["MAIL_USERNAME"],
+            mail_password=os.environ["MAIL_PASSWORD"],
+            mail_from=os.environ["MAIL_FROM"],
+            mail_port=self.check_integer("MAIL_PORT"),
+            mail_server=os.environ["MAIL_SERVER"],
+            mail_tls=self.check_boolean(os.environ["MAIL_TLS"]),
+            mail_ssl=self.check_boolean(os.environ["MAIL_SSL"]),
+            use_credentials=self.check_boolean(os.environ["USE_CREDENTIALS"]),
+            email_batch_size=self.check_integer("EMAIL_BATCH_SIZE", 50),
+            email_poll_interval=self.check_float("EMAIL_POLL_INTERVAL", 5.0),
+            email_max_attempts=self.check_integer("EMAIL_MAX_ATTEMPTS", 6),
+            email_retry_delay=self.check_float("EMAIL_RETRY_DELAY", 30.0),
+            email_send_timeout=self.check_float("EMAIL_SEND_TIMEOUT", 30.0),
+            email_pool_size=self.check_integer("EMAIL_POOL_SIZE", 2),
+            email_pool_idle_timeout=self.check_float("EMAIL_POOL_IDLE_TIMEOUT", 60.0),
+            appointment_reminder_hours=self.check_float("APPOINTMENT_REMINDER_HOURS", 24.0),
+            shop_timezone=self.check_timezone("SHOP_TIMEZONE", "UTC"),
         )
-    
+        return self._config
+
+    def get_config(self) -> BaseSettings:
+        return self._config
+
     def check_boolean(self, value: str) -> bool:
         return value.lower() == "true"
-    
+
+    def check_integer(self, env_var: str, default: Optional[int] = None) -> int:
+        value = os.getenv(env_var)
+        if value is None and default is not None:
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise EnvironmentError(f"Environment variable {env_var} must be an integer")
+
+    def check_float(self, env_var: str, default: Optional[float] = None) -> float:
+        value = os.getenv(env_var)
+        if value is None and default is not None:
+            return default
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise EnvironmentError(f"Environment variable {env_var} must be a number")
+
+    # IANA name of the timezone the shop's schedules are kept in, e.g. Europe/Athens
+    def check_timezone(self, env_var: str, default: str) -> ZoneInfo:
+        value = os.getenv(env_var, default)
+        try:
+            return ZoneInfo(value)
+        except (ValueError, ZoneInfoNotFoundError):
+            raise EnvironmentError(f"Environment variable {env_var} must be a timezone name")
+
     def get_database_url(self) -> str:
-        return f"mysql+aiomysql://{os.getenv('MYSQL_USER')}:{os.getenv('MYSQL_PASSWORD')}@{os.getenv('MYSQL_HOST')}:{os.getenv('MYSQL_PORT')}/{os.getenv('MYSQL_DB')}"
+        config = self._config
+        return f"mysql+aiomysql://{config.mysql_user}:{config.mysql_password}@{config.mysql_host}:{config.mysql_port}/{config.mysql_db}"
     
 
 settings = Settings()
@@ -1,28 +1,90 @@
 import contextlib
-from typing import Any, AsyncIterator, Iterator
+import time
+from typing import Any, AsyncIterator, Optional
 
 
 from core.config import settings
+from core.metrics import instrument_engine
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Connection
-from sqlalchemy.orm import Session, sessionmaker
 
+# Queue pool that records how long checkouts wait and how often they time out
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
 
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        self.checkouts += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        return connection
+
+
+# The engine is only built on first use (or in the app lifespan), not at import time
 class AsyncDatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
-        self._engine = create_async_engine(host, **engine_kwargs)
+    def __init__(self, host: str, engine_kwargs: Optional[dict[str, Any]] = None):
+        self._host = host
+        self._engine_kwargs = engine_kwargs or {}
+        self._engine: Optional[AsyncEngine] = None
+        self._sessionmaker: Optional[async_sessionmaker[AsyncSession]] = None
+
+    def init(self):
+        if self._engine is not None:
+            return
+
+        self._engine = create_async_engine(self._host, **self._engine_kwargs)
+        instrument_engine(self._engine)
         self._sessionmaker = async_sessionmaker(autocommit=False, bind=self._engine)
 
+    @property
+    def engine(self) -> AsyncEngine:
+        self.init()
+        return self._engine
+
+    # Current pool usage and checkout wait statistics
+    def pool_status(self) -> dict[str, Any]:
+        if self._engine is None:
+            return {"initialized": False}
+
+        pool = self._engine.pool
+        status = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        }
+        if isinstance(pool, InstrumentedQueuePool):
+            status.update(
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                wait_time_total=round(pool.wait_time_total, 6),
+                wait_time_avg=round(pool.wait_time_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+                wait_time_max=round(pool.wait_time_max, 6),
+            )
+        return status
+
     async def close(self):
         if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
+            return
         await self._engine.dispose()
 
         self._engine = None
@@ -30,8 +92,7 @@ class AsyncDatabaseSessionManager:
 
     @contextlib.asynccontextmanager
     async def connect(self) -> AsyncIterator[AsyncConnection]:
-        if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
+        self.init()
 
         async with self._engine.begin() as connection:
             try:
@@ -42,8 +103,7 @@ class AsyncDatabaseSessionManager:
 
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
-        if self._sessionmaker is None:
-            raise Exception("DatabaseSessionManager is not initialized")
+        self.init()
 
         session = self._sessionmaker()
         try:
@@ -56,7 +116,16 @@ class AsyncDatabaseSessionManager:
 
 
 async_session_manager = AsyncDatabaseSessionManager(
-    settings.get_database_url(), {"echo": settings.get_config()["mysql_echo"]}
+    settings.get_database_url(),
+    {
+        "echo": settings.get_config().mysql_echo,
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.get_config().mysql_pool_size,
+        "max_overflow": settings.get_config().mysql_max_overflow,
+        "pool_timeout": settings.get_config().mysql_pool_timeout,
+        "pool_recycle": settings.get_config().mysql_pool_recycle,
+        "pool_pre_ping": settings.get_config().mysql_pool_pre_ping,
+    },
 )
 
 
@@ -64,53 +133,3 @@ async def get_async_db_session():
     async with async_session_manager.session() as session:
         yield session
 
-
-class DatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
-        self._engine = create_engine(host, **engine_kwargs)
-        self._sessionmaker = sessionmaker(
-            autocommit=False, autoflush=False, bind=self._engine
-        )
-
-    def close(self):
-        if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-        self._engine.dispose()
-
-        self._engine = None
-        self._sessionmaker = None
-
-    @contextlib.contextmanager
-    def connect(self) -> Iterator[Connection]:
-        if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        connection = self._engine.connect()
-        try:
-            yield connection
-        except Exception:
-            connection.rollback()
-            raise
-        finally:
-            connection.close()
-
-    @contextlib.contextmanager
-    def session(self) -> Iterator[Session]:
-        if self._sessionmaker is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        session = self._sessionmaker()
-        try:
-            yield session
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            session.close()
-
-session_manager = DatabaseSessionManager(settings.get_database_url(), {"echo": settings.get_config()["mysql_echo"]})
-
-def get_db_session():
-    with session_manager.session() as session:
-        yield session
-
@@ -0,0 +1,79 @@
+import os
+from typing import Any, Iterable, List, NamedTuple, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
+
+# Email templates shipped with the API
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "email")
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    body: str
+
+
+'''
+Compiled, cached email templates.
+
+A template is an html file that sets its subject with {% set subject = ... %} and fills the
+content block of layout.html. Locale variants sit next to it as name.<locale>.html, a lookup
+for "pt-BR" tries name.pt-BR.html, then name.pt.html, then name.html. Every template is
+compiled once, and the variant chosen for each (name, locale) is remembered, so rendering
+only runs the compiled code.
+'''
+class EmailTemplates:
+
+    def __init__(self, directory: str = TEMPLATE_DIRECTORY):
+        self.environment = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=True,
+            undefined=StrictUndefined,
+            # Templates are only read from disk once, edits need a restart
+            auto_reload=False,
+            cache_size=-1,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        self._variants: dict[tuple[str, Optional[str]], Template] = {}
+        self.rendered = 0
+
+    # Compiles every template up front, so the first emails do not pay for it
+    def load(self):
+        for name in self.environment.list_templates(extensions=["html"]):
+            self.environment.get_template(name)
+
+    # Returns the compiled template for the locale, falling back to the language and then the default
+    def get(self, name: str, locale: Optional[str] = None) -> Template:
+        template = self._variants.get((name, locale))
+        if template is None:
+            candidates = []
+            if locale:
+                candidates.append(f"{name}.{locale}.html")
+                if "-" in locale:
+                    candidates.append(f"{name}.{locale.split('-')[0]}.html")
+            candidates.append(f"{name}.html")
+            template = self._variants[(name, locale)] = self.environment.select_template(candidates)
+        return template
+
+    def render(self, name: str, context: dict[str, Any], locale: Optional[str] = None) -> RenderedEmail:
+        return self.render_many(name, [context], locale)[0]
+
+    # Renders one template once per context
+    def render_many(self, name: str, contexts: Iterable[dict[str, Any]], locale: Optional[str] = None) -> List[RenderedEmail]:
+        template = self.get(name, locale)
+        emails = []
+        for context in contexts:
+            module = template.make_module(context)
+            emails.append(RenderedEmail(str(module.subject).strip(), str(module)))
+        self.rendered += len(emails)
+        return emails
+
+    def stats(self) -> dict:
+        return {
+            "compiled": len(self.environment.cache or {}),
+            "variants": len(self._variants),
+            "rendered": self.rendered,
+        }
+
+
+email_templates = EmailTemplates()
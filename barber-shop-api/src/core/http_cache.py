@@ -0,0 +1,117 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+'''
+HTTP validators and Cache-Control for read endpoints.
+
+Routes opt in by declaring a cache policy dependency. The middleware then gives their
+200 responses a strong ETag, hashed from the body unless the route already set one from
+a version it tracks, and answers a matching If-None-Match with a bodiless 304. Routes that
+know their version up front call revalidate before doing any work at all.
+'''
+
+# Headers describing the body, left out of a 304
+BODY_HEADERS = (b"content-length", b"content-type")
+
+# Request state attribute holding the policy of the matched route
+POLICY_STATE_KEY = "cache_policy"
+
+
+class CachePolicy:
+
+    def __init__(self, max_age: int = 0, private: bool = True):
+        self.max_age = max_age
+        self.private = private
+
+    # Cache-Control value, private responses are revalidated on every use
+    @property
+    def cache_control(self) -> str:
+        if self.private:
+            return "private, no-cache"
+        return f"public, max-age={self.max_age}"
+
+    def apply(self, response: Response, etag: str):
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = self.cache_control
+        if self.private:
+            # Keep the Origin entry CORS may have added
+            vary = response.headers.get("Vary")
+            response.headers["Vary"] = f"{vary}, Authorization" if vary else "Authorization"
+
+    # Dependency recording the policy for the middleware
+    def __call__(self, request: Request):
+        setattr(request.state, POLICY_STATE_KEY, self)
+
+
+# Responses vary per user, browsers keep them but revalidate each time
+PRIVATE_REVALIDATE = CachePolicy(private=True)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, W/ prefixes are ignored
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+# Returns a 304 response when the client already has the representation tagged etag.
+# The 304 carries the headers of the response it stands for, less those describing its body,
+# so the CORS headers and Vary added further in are not lost
+def not_modified(request: Request, etag: str, response: Optional[Response] = None) -> Optional[Response]:
+    if not etag_matches(request, etag):
+        return None
+    cached = Response(status_code=304)
+    if response is not None:
+        cached.raw_headers = [(key, value) for key, value in response.raw_headers if key not in BODY_HEADERS]
+    policy: Optional[CachePolicy] = getattr(request.state, POLICY_STATE_KEY, None)
+    (policy or PRIVATE_REVALIDATE).apply(cached, etag)
+    return cached
+
+
+# ETag of a read built from the versions it depends on, distinct for every path and query string
+def versioned_etag(request: Request, name: str, *versions: int) -> str:
+    url_key = hashlib.sha256(f"{request.url.path}?{request.url.query}".encode()).hexdigest()[:16]
+    return f'"{name}-{"-".join(map(str, versions))}-{url_key}"'
+
+
+# For routes that know their ETag before loading anything: returns the 304 to send when the
+# client's copy is current, otherwise sets the ETag on the route's response and returns None
+def revalidate(request: Request, response: Response, etag: str) -> Optional[Response]:
+    cached = not_modified(request, etag)
+    if cached is None:
+        response.headers["ETag"] = etag
+    return cached
+
+
+# HTTP middleware adding validators to the responses of routes that declared a cache policy
+async def conditional_get_middleware(request: Request, call_next):
+    response = await call_next(request)
+
+    policy: Optional[CachePolicy] = getattr(request.state, POLICY_STATE_KEY, None)
+    if policy is None or request.method not in ("GET", "HEAD") or response.status_code != 200:
+        return response
+
+    etag = response.headers.get("etag")
+    body = None
+    if etag is None:
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    cached = not_modified(request, etag, response)
+    if cached is not None:
+        return cached
+
+    if body is not None:
+        response = Response(
+            content=body,
+            status_code=response.status_code,
+            headers={key: value for key, value in response.headers.items() if key != "content-length"},
+        )
+    policy.apply(response, etag)
+    return response
@@ -0,0 +1,130 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import settings
+
+'''
+In-process request metrics.
+
+SQLAlchemy cursor events on the async engine attribute every statement to the
+request that issued it, through a context variable set by the middleware below.
+Per-route totals are kept in the metrics registry and served by the internal router.
+'''
+
+# Statements longer than this are cut when kept as a route's slowest statement
+STATEMENT_PREVIEW_LENGTH = 300
+
+
+class QueryStats:
+    __slots__ = ("count", "total_time", "slowest_time", "slowest_statement")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+# Query statistics of the request currently being handled, if any
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._routes: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, route: str, status_code: int, duration: float, stats: QueryStats):
+        with self._lock:
+            route_metrics = self._routes.get(route)
+            if route_metrics is None:
+                route_metrics = self._routes[route] = {
+                    "requests": 0,
+                    "errors": 0,
+                    "request_time_total": 0.0,
+                    "db_queries_total": 0,
+                    "db_queries_max": 0,
+                    "db_time_total": 0.0,
+                    "db_slowest_time": 0.0,
+                    "db_slowest_statement": None,
+                }
+
+            route_metrics["requests"] += 1
+            if status_code >= 500:
+                route_metrics["errors"] += 1
+            route_metrics["request_time_total"] += duration
+            route_metrics["db_queries_total"] += stats.count
+            route_metrics["db_queries_max"] = max(route_metrics["db_queries_max"], stats.count)
+            route_metrics["db_time_total"] += stats.total_time
+            if stats.slowest_time > route_metrics["db_slowest_time"]:
+                route_metrics["db_slowest_time"] = stats.slowest_time
+                route_metrics["db_slowest_statement"] = stats.slowest_statement[:STATEMENT_PREVIEW_LENGTH]
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            routes = {route: dict(values) for route, values in self._routes.items()}
+
+        for values in routes.values():
+            requests = values["requests"]
+            values["request_time_avg"] = values["request_time_total"] / requests
+            values["db_queries_avg"] = values["db_queries_total"] / requests
+            values["db_time_avg"] = values["db_time_total"] / requests
+        return routes
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+metrics = MetricsRegistry()
+
+
+# Attaches the statement timing hooks to an engine
+def instrument_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+
+# HTTP middleware collecting query statistics per request and per route template
+async def query_metrics_middleware(request: Request, call_next):
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_query_stats.reset(token)
+    duration = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None) or "unmatched"
+    metrics.record_request(f"{request.method} {route_path}", response.status_code, duration, stats)
+
+    if settings.get_config().debug:
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Query-Time-Ms"] = f"{stats.total_time * 1000:.2f}"
+        response.headers["X-DB-Slowest-Query-Ms"] = f"{stats.slowest_time * 1000:.2f}"
+    return response
@@ -0,0 +1,105 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from typing import Any, Callable, Optional, Sequence
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+from core.config import settings
+
+'''
+Opaque, signed cursors for keyset pagination.
+
+A cursor holds the sort key of the last row of a page. The next page is read with a
+WHERE on that key instead of an OFFSET, so deep pages cost the same as the first one.
+List endpoints return the cursor of the following page in the X-Next-Cursor header,
+and accept it back through their cursor query parameter. A cursor is signed together with
+the endpoint and filters it was issued for, and is refused anywhere else.
+'''
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Query parameters that only move through a list, cursors are not bound to them
+PAGINATION_PARAMS = frozenset({"page", "limit", "cursor"})
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(settings.get_config().secret_key.encode(), payload, hashlib.sha256).digest()[:16]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+# The list a request reads: its path and every query parameter but the pagination ones
+def cursor_scope(request: Request) -> str:
+    filters = sorted(
+        (name, value) for name, value in request.query_params.multi_items() if name not in PAGINATION_PARAMS
+    )
+    return f"{request.url.path}?{urlencode(filters)}"
+
+
+def encode_cursor(scope: str, *values: Any) -> str:
+    payload = json.dumps([scope, values], default=str, separators=(",", ":")).encode()
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+# Returns the key values held by the request's cursor, or None without one.
+# Raises a 400 if the cursor was not issued by this API, or was issued for another list
+def decode_cursor(request: Request, cursor: Optional[str], size: int) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        payload, signature = (_b64decode(part) for part in cursor.split("."))
+        if not hmac.compare_digest(signature, _sign(payload)):
+            raise ValueError("Bad cursor signature")
+        scope, values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("Bad cursor payload")
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if scope != cursor_scope(request):
+        raise HTTPException(status_code=400, detail="Pagination cursor belongs to another endpoint or set of filters")
+    return values
+
+
+# Rows sorting after the given key, (a, b) > (x, y) spelled out so MySQL can use an index range.
+# The redundant a >= x in front is the range itself, the OR alone is not seen as one
+def after_key(columns: Sequence[ColumnElement], values: Sequence[Any]) -> ColumnElement:
+    return and_(columns[0] >= values[0], or_(*(
+        and_(*(columns[j] == values[j] for j in range(i)), columns[i] > values[i])
+        for i in range(len(columns))
+    )))
+
+
+# Rows sorting after (value, last_id) in ORDER BY column, id_column, where column is nullable.
+# MySQL and SQLite sort NULLs first, so a NULL is followed by the NULLs with a larger id, then every other row
+def after_nullable_key(column: ColumnElement, id_column: ColumnElement, value: Any, last_id: Any) -> ColumnElement:
+    if value is None:
+        return or_(and_(column.is_(None), id_column > last_id), column.is_not(None))
+    return after_key((column, id_column), (value, last_id))
+
+
+# Rows sorting before the given key, for descending orders
+def before_key(columns: Sequence[ColumnElement], values: Sequence[Any]) -> ColumnElement:
+    return or_(*(
+        and_(*(columns[j] == values[j] for j in range(i)), columns[i] < values[i])
+        for i in range(len(columns))
+    ))
+
+
+# Sets the X-Next-Cursor header when the page is full, so there may be more rows
+def set_next_cursor(
+    request: Request, response: Response, items: Optional[Sequence[Any]], limit: int, key: Callable[[Any], tuple]
+):
+    if items and len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(cursor_scope(request), *key(items[-1]))
@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import math
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+import aiosmtplib
+
+from core.config import settings
+
+# Pooled connections idle for longer than this are checked with a NOOP before being reused
+HEALTH_CHECK_AFTER_SECONDS = 5.0
+
+# Fewest messages worth sending over a connection of their own
+MIN_MESSAGES_PER_CONNECTION = 10
+
+# Called with a message's index in the batch and its error, or None, as soon as it is known
+ResultCallback = Callable[[int, Optional[Exception]], Awaitable[None]]
+
+'''
+Pool of authenticated SMTP connections.
+
+Nothing is opened at import time or in the app lifespan, a connection is opened the first
+time mail is sent and kept for reuse. Connections idle for a while are checked with a NOOP
+before being handed out again, and the ones idle past the idle timeout are closed. At most
+pool size connections are open at once, send_many spreads a batch over them.
+'''
+class SMTPConnectionPool:
+
+    def __init__(self):
+        self._idle: deque[tuple[aiosmtplib.SMTP, float]] = deque()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.max_size = 0
+        self.idle_timeout = 0.0
+
+        self.opened = 0
+        self.reused = 0
+        self.health_check_failures = 0
+        self.idle_evictions = 0
+        self.in_use = 0
+
+    def init(self):
+        if self._slots is not None:
+            return
+
+        config = settings.get_config()
+        self.max_size = config.email_pool_size
+        self.idle_timeout = config.email_pool_idle_timeout
+        self._slots = asyncio.Semaphore(self.max_size)
+
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.popleft()
+            await self._disconnect(client)
+        self._slots = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        config = settings.get_config()
+        client = aiosmtplib.SMTP(
+            hostname=config.mail_server,
+            port=config.mail_port,
+            use_tls=config.mail_ssl,
+            start_tls=config.mail_tls,
+            timeout=config.email_send_timeout,
+        )
+        await client.connect()
+        try:
+            if config.use_credentials:
+                await client.login(config.mail_username, config.mail_password)
+        except Exception:
+            client.close()
+            raise
+        self.opened += 1
+        return client
+
+    async def _disconnect(self, client: aiosmtplib.SMTP):
+        if not client.is_connected:
+            return
+        try:
+            await client.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            client.close()
+
+    # Closes the connections that have been idle for longer than the idle timeout
+    async def evict_idle(self):
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            client, _ = self._idle.popleft()
+            self.idle_evictions += 1
+            await self._disconnect(client)
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        await self.evict_idle()
+        # Most recently used first, so the surplus connections age out when traffic drops
+        while self._idle:
+            client, idle_since = self._idle.pop()
+            if time.monotonic() - idle_since > HEALTH_CHECK_AFTER_SECONDS:
+                try:
+                    await client.noop()
+                except (aiosmtplib.SMTPException, OSError):
+                    self.health_check_failures += 1
+                    client.close()
+                    continue
+            self.reused += 1
+            return client
+        return await self._connect()
+
+    # Lends a connection, it goes back to the pool unless the block raised
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        self.init()
+
+        async with self._slots:
+            client = await self._checkout()
+            self.in_use += 1
+            try:
+                yield client
+            except BaseException:
+                client.close()
+                raise
+            finally:
+                self.in_use -= 1
+            if client.is_connected:
+                self._idle.append((client, time.monotonic()))
+
+    # Sends the messages over the pooled connections
+    # Returns the error of each message, or None for the ones the server accepted.
+    # on_result hears of each message as soon as it was accepted or given up on
+    async def send_many(
+        self, messages: List[EmailMessage], on_result: Optional[ResultCallback] = None
+    ) -> List[Optional[Exception]]:
+        if not messages:
+            return []
+        self.init()
+
+        chunk_size = max(MIN_MESSAGES_PER_CONNECTION, math.ceil(len(messages) / self.max_size))
+        results = await asyncio.gather(*(
+            self._send_chunk(messages[start:start + chunk_size], start, on_result)
+            for start in range(0, len(messages), chunk_size)
+        ))
+        return [error for chunk_errors in results for error in chunk_errors]
+
+    async def _send_chunk(
+        self, messages: List[EmailMessage], start: int, on_result: Optional[ResultCallback]
+    ) -> List[Optional[Exception]]:
+        errors: List[Optional[Exception]] = []
+
+        async def record(error: Optional[Exception]):
+            errors.append(error)
+            if on_result is not None:
+                await on_result(start + len(errors) - 1, error)
+
+        reconnected = False
+        while len(errors) < len(messages):
+            try:
+                async with self.connection() as client:
+                    for message in messages[len(errors):]:
+                        try:
+                            await client.send_message(message)
+                        except OSError:
+                            # Disconnects and timeouts leave the connection unusable
+                            raise
+                        except aiosmtplib.SMTPException as e:
+                            # The server rejected this message, the connection is still good
+                            await record(e)
+                        else:
+                            await record(None)
+            except (aiosmtplib.SMTPException, OSError) as e:
+                # A pooled connection may have been dropped by the server, or connecting failed,
+                # the rest of the chunk gets one more try on a fresh connection
+                if reconnected:
+                    while len(errors) < len(messages):
+                        await record(e)
+                    break
+                reconnected = True
+        return errors
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "idle": len(self._idle),
+            "in_use": self.in_use,
+            "opened": self.opened,
+            "reused": self.reused,
+            "health_check_failures": self.health_check_failures,
+            "idle_evictions": self.idle_evictions,
+        }
+
+
+smtp_pool = SMTPConnectionPool()
@@ -1,3 +1,4 @@
+import logging
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -6,8 +7,14 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from core.db import async_session_manager
 from core.config import settings
+from core.metrics import query_metrics_middleware
+from core.pagination import NEXT_CURSOR_HEADER
+from core.http_cache import conditional_get_middleware
+from core.smtp import smtp_pool
+from core.email_templates import email_templates
 from routers.user_router import user_router
 from auth.controller import AuthController
+from auth.service import AuthService
 from routers.barber_router import barber_router
 from routers.service_router import service_router
 from routers.schedule_router import schedule_router
@@ -16,15 +23,34 @@ from routers.appointment_router import appointment_router
 from routers.email_router import email_router
 from routers.thread_router import thread_router
 from routers.message_router import message_router
+from routers.internal_router import internal_router
+from operations.email_dispatcher import email_dispatcher
+from operations.notification_scheduler import notification_scheduler
 
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    async_session_manager.init()
+    # Warm the token verifier's signing keys, requests will retry if Keycloak is not up yet
+    try:
+        await AuthService.token_verifier.load_keys()
+    except Exception as e:
+        logging.error(f"Could not load Keycloak signing keys: {str(e)}")
+    # SMTP connections are only opened when the first email is sent
+    smtp_pool.init()
+    email_templates.load()
+    # Deliver the email outbox in the background
+    email_dispatcher.start()
+    # Move appointment reminders to the outbox when they are due
+    notification_scheduler.start()
     yield
-    if async_session_manager._engine is not None:
-        # Close the DB connection
-        await async_session_manager.close()
+    await notification_scheduler.stop()
+    await email_dispatcher.stop()
+    await smtp_pool.close()
+    # Close the DB connection
+    await async_session_manager.close()
+    AuthService.admin_executor.shutdown(wait=False, cancel_futures=True)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -36,12 +62,19 @@ bearer_scheme = HTTPBearer()
 app.add_middleware(
     CORSMiddleware,
 
-    allow_origins=settings.get_config()["backend_cors_origins"],
+    allow_origins=settings.get_config().backend_cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+# Adds ETags and Cache-Control to the routes declaring a cache policy, answering 304 when unchanged
+app.middleware("http")(conditional_get_middleware)
+
+# Attributes SQL statement counts and timings to each request
+app.middleware("http")(query_metrics_middleware)
+
 
 # Connect routers to app
 app.include_router(auth_router)
@@ -53,6 +86,7 @@ app.include_router(schedule_router)
 app.include_router(appointment_router)
 app.include_router(thread_router)
 app.include_router(message_router)
+app.include_router(internal_router)
 
 # Define the root endpoint
 @app.get("/")
@@ -34,7 +34,7 @@ class AppointmentUpdate(BaseModel):
 
 class AppointmentResponse(BaseModel):
     appointment_id: int
-    appointment_date: str
+    appointment_date: Optional[str]
     user: UserResponse
     barber: BarberResponse
     status: AppointmentStatus
@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from datetime import date, time
+from typing import Optional
+
+'''
+Pydantic models for the barber availability search
+'''
+
+class AvailabilityWindow(BaseModel):
+    date: date
+    start_time: time
+    end_time: time
+    slot_ids: list[int]
+
+class BarberAvailability(BaseModel):
+    barber_id: int
+    windows: list[AvailabilityWindow]
+
+class DailyAvailability(BaseModel):
+    barber_id: int
+    date: date
+    free_slots: int
+    first_free: Optional[time] = None
+    last_free: Optional[time] = None
+
+    class Config:
+        from_attributes = True
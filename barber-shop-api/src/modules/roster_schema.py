@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Optional
+import datetime
+
+'''
+Pydantic validation models for bulk roster generation
+'''
+
+class RosterRule(BaseModel):
+    barber_ids: Annotated[list[int], Field(min_length=1)]
+    start_date: datetime.date
+    end_date: datetime.date
+    # Days of the week the rule applies to, 0 is Monday and 6 is Sunday
+    weekdays: Annotated[list[Annotated[int, Field(ge=0, le=6)]], Field(min_length=1)]
+    open_time: datetime.time
+    close_time: datetime.time
+    slot_minutes: Annotated[int, Field(ge=5, le=480)] = 30
+
+class RosterException(BaseModel):
+    date: datetime.date
+    # Applies to every barber of the roster when not set
+    barber_id: Optional[int] = None
+    # A day off when no hours are given, otherwise the day is worked with these hours
+    open_time: Optional[datetime.time] = None
+    close_time: Optional[datetime.time] = None
+
+class RosterCreate(BaseModel):
+    rules: Annotated[list[RosterRule], Field(min_length=1)]
+    exceptions: list[RosterException] = []
+
+class RosterResponse(BaseModel):
+    schedules_inserted: int
+    schedules_skipped: int
+    time_slots_inserted: int
+    time_slots_skipped: int
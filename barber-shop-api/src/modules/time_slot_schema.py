@@ -16,7 +16,8 @@ class TimeSlotCreate(BaseModel):
         arbitrary_types_allowed = True
 
 class TimeSlotUpdate(BaseModel):
-    slot_id: int
+    # Left out or null for a slot the schedule does not have yet
+    slot_id: Optional[int] = None
     schedule_id: Optional[int] = None
     start_time: Optional[str] = None
     end_time: Optional[str] = None
@@ -18,6 +18,7 @@ from sqlalchemy import (
     Enum,
     Text,
     Date,
+    Index,
     UniqueConstraint
 )
 
@@ -29,18 +30,45 @@ from .barber_schema import BarberResponse
 from .user_schema import UserResponse
 from ..schedule_schema import ScheduleResponse, TimeSlotChildResponse
 from .service_schema import ServiceResponse
-from ..appointment_schema import AppointmentResponse
+from ..appointment_schema import AppointmentResponse, AppointmentStatus as SchemaAppointmentStatus
+from ..availability_schema import DailyAvailability
 
 class Base(DeclarativeBase):
     pass
 
 # Defining Enum to be used in Appointment table
+# The API spells the cancelled status "cancelled", the table stores "canceled"
 class AppointmentStatus(enum.Enum):
     pending = 'pending'
     confirmed = 'confirmed'
     completed = 'completed'
     canceled = 'canceled'
 
+    # The table's status for a status sent to the API
+    @classmethod
+    def from_schema(cls, status: SchemaAppointmentStatus) -> "AppointmentStatus":
+        if status == SchemaAppointmentStatus.cancelled:
+            return cls.canceled
+        return cls(status.value)
+
+    # The status the API responds with
+    def to_schema(self) -> SchemaAppointmentStatus:
+        if self is AppointmentStatus.canceled:
+            return SchemaAppointmentStatus.cancelled
+        return SchemaAppointmentStatus(self.value)
+
+# State of a scheduled appointment reminder, skipped ones belonged to appointments no longer upcoming
+class ReminderStatus(enum.Enum):
+    pending = 'pending'
+    sent = 'sent'
+    skipped = 'skipped'
+
+# Delivery state of a queued email in the outbox
+class EmailStatus(enum.Enum):
+    pending = 'pending'
+    sent = 'sent'
+    failed = 'failed'
+
 
 # User model
 class User(Base):
@@ -72,8 +100,10 @@ class User(Base):
     received_threads: Mapped[list["Thread"]] = relationship(foreign_keys="Thread.receivingUser", back_populates="receiving_user")
 
 
+    # Rows were validated when they were written, so the response schemas below are built with
+    # model_construct rather than validated again, re-checking every EmailStr is most of a list's cost
     def to_response_schema(self) -> UserResponse:
-        return UserResponse(
+        return UserResponse.model_construct(
             user_id=self.user_id,
             firstName=self.firstName,
             lastName=self.lastName,
@@ -93,7 +123,7 @@ class Barber(Base):
     '''
 
     # Barber is linked to a single user (as specified by 'uselist = false' in User table above. One-to-One)
-    user: Mapped["User"] = relationship(back_populates="barber", lazy="selectin")
+    user: Mapped["User"] = relationship(back_populates="barber")
 
     # Barber can have multiple Appointments (One-to-Many)
     appointments: Mapped[list["Appointment"]] = relationship(back_populates="barber")
@@ -102,17 +132,10 @@ class Barber(Base):
     schedules: Mapped[list["Schedule"]] = relationship(back_populates="barber")
 
     def to_response_schema(self) -> BarberResponse:
-        return BarberResponse(
-        barber_id=self.barber_id,
-        user=UserResponse(
-            user_id=self.user.user_id,
-            firstName=self.user.firstName,
-            lastName=self.user.lastName,
-            email=self.user.email,
-            phoneNumber=self.user.phoneNumber,
-            is_admin=self.user.is_admin
+        return BarberResponse.model_construct(
+            barber_id=self.barber_id,
+            user=self.user.to_response_schema()
         )
-    )
 
 class Appointment(Base):
     __tablename__ = "appointment"
@@ -122,35 +145,45 @@ class Appointment(Base):
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.user_id", ondelete="CASCADE"), nullable=False)
     barber_id: Mapped[int] = mapped_column(Integer, ForeignKey("barber.barber_id", ondelete="CASCADE"), nullable=False)
     status: Mapped[AppointmentStatus] = mapped_column(Enum(AppointmentStatus), nullable=False)
+
+    # Back the appointment list filters, rows come out in (appointment_date, appointment_id) order
+    __table_args__ = (
+        Index("ix_appointment_barber_date", "barber_id", "appointment_date"),
+        Index("ix_appointment_user_date", "user_id", "appointment_date"),
+        Index("ix_appointment_status_date", "status", "appointment_date"),
+    )
     
     '''
     Appointment class relationships
     '''
 
     # Each appointment is linked to one User (who booked it) - (Many-to-One)
-    user: Mapped["User"] = relationship(back_populates="appointments", lazy="selectin")
+    user: Mapped["User"] = relationship(back_populates="appointments")
 
     # Each appointment is assigned to one Barber (Many-to-One)
-    barber: Mapped["Barber"] = relationship(back_populates="appointments", lazy="selectin")
+    barber: Mapped["Barber"] = relationship(back_populates="appointments")
 
     # An Appointment can have multiple AppointmentService records ()
-    appointment_services: Mapped[list["AppointmentService"]] = relationship(back_populates="appointment", lazy="selectin")
+    appointment_services: Mapped[list["AppointmentService"]] = relationship(back_populates="appointment")
 
      # Relationship to Appointment_TimeSlot (creates Many-to-Many with TimeSlot)
-    appointment_time_slots: Mapped[list["Appointment_TimeSlot"]] = relationship("Appointment_TimeSlot", back_populates="appointment", lazy="selectin")
+    appointment_time_slots: Mapped[list["Appointment_TimeSlot"]] = relationship("Appointment_TimeSlot", back_populates="appointment")
 
-    def to_response_schema(self) -> AppointmentResponse:
+    # Services come from services_by_id, the service catalog's responses keyed by service_id.
+    # A service deleted after the appointment's links were read is left out
+    def to_response_schema(self, services_by_id: dict[int, ServiceResponse]) -> AppointmentResponse:
         return AppointmentResponse(
             appointment_id=self.appointment_id,
             appointment_date=self.appointment_date.strftime("%Y-%m-%d") if self.appointment_date else None,
             user=self.user.to_response_schema(),
             barber=self.barber.to_response_schema(),
-            status=self.status,
+            status=self.status.to_schema(),
             time_slots=[
                 time_slot.time_slot.to_response_schema() for time_slot in self.appointment_time_slots
             ],
             services=[
-                service.service.to_response_schema() for service in self.appointment_services
+                services_by_id[service.service_id] for service in self.appointment_services
+                if service.service_id in services_by_id
             ]
         )
 
@@ -194,7 +227,7 @@ class AppointmentService(Base):
     '''
 
     # Each AppointmentService is linked to one Appointment
-    service: Mapped["Service"] = relationship(back_populates="appointment_services", lazy="selectin")
+    service: Mapped["Service"] = relationship(back_populates="appointment_services")
 
     # Each AppointmentService is linked to one Service
     appointment: Mapped["Appointment"] = relationship(back_populates="appointment_services")
@@ -215,13 +248,13 @@ class Schedule(Base):
     Schedule class relationships
     '''
     # Each schedule is assigned to a single Barber (Many-to-One)
-    barber: Mapped["Barber"] = relationship(back_populates="schedules", lazy="selectin")
+    barber: Mapped["Barber"] = relationship(back_populates="schedules")
 
     # Each schedule links to multiple time slots (One-to-Many)
-    time_slots: Mapped[list["TimeSlot"]] = relationship("TimeSlot", back_populates="schedule", cascade="all, delete, delete-orphan", lazy="selectin")
+    time_slots: Mapped[list["TimeSlot"]] = relationship("TimeSlot", back_populates="schedule", cascade="all, delete, delete-orphan")
 
     def to_response_schema(self) -> ScheduleResponse:
-        return ScheduleResponse(
+        return ScheduleResponse.model_construct(
             barber_id=self.barber_id,
             date=self.date,
             is_working=self.is_working,
@@ -248,13 +281,13 @@ class TimeSlot(Base):
     TimeSlot class relationships
     '''
     #Multiple time slots link to one schedule (Many-to-One)
-    schedule: Mapped["Schedule"] = relationship("Schedule", back_populates="time_slots", lazy="selectin")
+    schedule: Mapped["Schedule"] = relationship("Schedule", back_populates="time_slots")
 
     #Relationship to Appointment_TimeSlot (creates Many-to-Many with appointment)
-    appointment_time_slots: Mapped[list["Appointment_TimeSlot"]] = relationship("Appointment_TimeSlot", back_populates="time_slot", cascade="all, delete, delete-orphan", lazy="selectin")
+    appointment_time_slots: Mapped[list["Appointment_TimeSlot"]] = relationship("Appointment_TimeSlot", back_populates="time_slot", cascade="all, delete, delete-orphan")
     
     def to_response_schema(self) -> TimeSlotChildResponse:
-        return TimeSlotChildResponse(
+        return TimeSlotChildResponse.model_construct(
             slot_id=self.slot_id,
             start_time=self.start_time,
             end_time=self.end_time,
@@ -272,11 +305,37 @@ class Appointment_TimeSlot(Base):
     Appointment_TimeSlot class relationships
     '''
     # Each Appointment_TimeSlot is linked to one TimeSlot
-    time_slot: Mapped["TimeSlot"] = relationship(back_populates="appointment_time_slots", lazy="selectin")
+    time_slot: Mapped["TimeSlot"] = relationship(back_populates="appointment_time_slots")
 
     # Each Appointment_TimeSlot is linked to one TimeSlot
     appointment: Mapped["Appointment"] = relationship(back_populates="appointment_time_slots")
 
+class BarberDailyAvailability(Base):
+    __tablename__ = "barber_daily_availability"
+
+    # Summary of a barber's free time slots per schedule day, kept up to date by the
+    # appointment and schedule writes so calendar views never load the slots themselves
+    barber_id: Mapped[int] = mapped_column(Integer, ForeignKey("barber.barber_id", ondelete="CASCADE"), primary_key=True)
+    date: Mapped[Date] = mapped_column(Date, primary_key=True)
+    free_slots: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Start times of the first and last free slots of the day
+    first_free: Mapped[Time] = mapped_column(Time, nullable=True)
+    last_free: Mapped[Time] = mapped_column(Time, nullable=True)
+
+    __table_args__ = (Index("ix_barber_daily_availability_date", "date"),)
+
+    # Plain scalar fields, validating them from the row in pydantic-core is cheaper than model_construct
+    def to_response_schema(self) -> DailyAvailability:
+        return DailyAvailability.model_validate(self)
+
+class CacheVersion(Base):
+    __tablename__ = "cache_version"
+
+    # Version counters of the in-process caches, bumped by every write to the cached data
+    # so each worker can tell when its copy is stale
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
 class Thread(Base):
     __tablename__ = "thread"
     
@@ -311,3 +370,39 @@ class Message(Base):
     
     # Each message belongs to one thread (Many-To-One)
     thread: Mapped["Thread"] = relationship(back_populates="messages")
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    # Emails are written here in the request transaction and delivered by the background dispatcher.
+    # A pending row is due once next_attempt_at has passed, the dispatcher pushes it forward while
+    # sending (so other workers skip it) and again with a backoff when delivery fails
+    email_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    recipient: Mapped[str] = mapped_column(String(255), nullable=False)
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[EmailStatus] = mapped_column(Enum(EmailStatus), nullable=False, default=EmailStatus.pending)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+    last_error: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False, default=func.current_timestamp())
+    sent_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+
+    # Backs the dispatcher's claim query, due rows come out in next_attempt_at order
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+class AppointmentReminder(Base):
+    __tablename__ = "appointment_reminder"
+
+    # Reminder emails due at send_at (naive UTC), the notification scheduler moves them to the
+    # email outbox once due. Rewritten whenever the appointment's time changes
+    reminder_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    appointment_id: Mapped[int] = mapped_column(Integer, ForeignKey("appointment.appointment_id", ondelete="CASCADE"), nullable=False)
+    send_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+    status: Mapped[ReminderStatus] = mapped_column(Enum(ReminderStatus), nullable=False, default=ReminderStatus.pending)
+
+    # Backs the scheduler's due and upcoming queries, and the rewrite of an appointment's reminders
+    __table_args__ = (
+        Index("ix_appointment_reminder_status_send_at", "status", "send_at"),
+        Index("ix_appointment_reminder_appointment", "appointment_id"),
+    )
@@ -28,3 +28,13 @@ class UserResponse(UserBase):
 
     class Config:
         from_attributes = True
+
+class UserImportError(BaseModel):
+    line: int
+    detail: str
+
+class UserImportResponse(BaseModel):
+    created: int
+    failed: int
+    # The first errors of the import, in line order
+    errors: list[UserImportError]
@@ -1,12 +1,13 @@
-from sqlalchemy import delete
+from sqlalchemy import delete, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
 from modules.user.models import (
     Appointment,
+    AppointmentStatus,
     User,
     Barber,
+    Schedule,
     TimeSlot,
     Appointment_TimeSlot,
     AppointmentService,
@@ -14,9 +15,20 @@ from modules.user.models import (
 )
 from typing import List, Optional
 from fastapi import HTTPException
-from modules.appointment_schema import AppointmentCreate, AppointmentResponse
+from modules.appointment_schema import (
+    AppointmentCreate,
+    AppointmentResponse,
+    AppointmentStatus as SchemaAppointmentStatus,
+)
+import datetime
 import logging
-from operations.email_operations import email_operations
+from operations.loader_options import APPOINTMENT_RESPONSE
+from operations.availability_operations import AvailabilityOperations
+from operations.email_dispatcher import email_dispatcher
+from operations.notification_operations import NotificationOperations
+from operations.notification_scheduler import notification_scheduler
+from operations.service_catalog import service_catalog
+from core.pagination import after_nullable_key
 
 logger = logging.getLogger("appointment_operations")
 logger.setLevel(logging.ERROR)
@@ -30,110 +42,250 @@ class AppointmentOperations:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    # Builds the responses of appointments loaded with APPOINTMENT_RESPONSE, taking their
+    # services from the in-process catalog instead of joining the service table
+    async def to_responses(self, appointments) -> List[AppointmentResponse]:
+        catalog = await service_catalog.get(self.db)
+        service_ids = {link.service_id for appt in appointments for link in appt.appointment_services}
+        # A service added through another worker can be newer than this worker's copy
+        if not service_ids <= catalog.by_id.keys():
+            service_catalog.invalidate()
+            catalog = await service_catalog.get(self.db)
+        return [appt.to_response_schema(catalog.by_id) for appt in appointments]
+
     # create a new appointment
+    # Everything happens in one transaction: the requested time slots are locked,
+    # checked and marked as booked before the commit, so two concurrent requests
+    # can never book the same slot.
     async def create_appointment(
         self, appointment_data: AppointmentCreate
     ) -> AppointmentResponse:
-        try:
+        slot_ids = sorted(set(appointment_data.time_slot))
+        service_ids = sorted(set(appointment_data.service_id))
 
-            # check if user_id exists in user table
-            user_result = await self.db.execute(
-                select(User).filter(User.user_id == appointment_data.user_id)
+        if not slot_ids:
+            raise HTTPException(
+                status_code=400, detail="At least one time slot is required"
             )
-            user = user_result.scalars().first()
 
-            if not user:
+        try:
+            # check that user_id and barber_id exist in a single round trip
+            user_exists, barber_exists = (
+                await self.db.execute(
+                    select(
+                        select(User.user_id)
+                        .where(User.user_id == appointment_data.user_id)
+                        .exists(),
+                        select(Barber.barber_id)
+                        .where(Barber.barber_id == appointment_data.barber_id)
+                        .exists(),
+                    )
+                )
+            ).one()
+
+            if not user_exists:
                 raise HTTPException(
                     status_code=400, detail="Invalid user_id: User does not exist"
                 )
 
-            # check if barber_id exists in the Barber table
-            barber_result = await self.db.execute(
-                select(Barber).filter(Barber.barber_id == appointment_data.barber_id)
-            )
-            barber = barber_result.scalars().first()
-
-            if not barber:
+            if not barber_exists:
                 raise HTTPException(
                     status_code=400, detail="Invalid barber_id: Barber does not exist"
                 )
 
-            # check if slot_id(s) exists in the time_slot table
-            appointment_date: str
-            for slot_id in appointment_data.time_slot:
-                time_slot_result = await self.db.execute(
-                    select(TimeSlot).filter(TimeSlot.slot_id == slot_id)
-                )
-                time_slot = time_slot_result.scalars().first()
+            slots = await self.lock_time_slots(slot_ids)
+            self.check_bookable(slots, slot_ids, appointment_data.barber_id)
 
-                if not time_slot:
+            # check that service_id(s) exist in the service table
+            if service_ids:
+                service_result = await self.db.execute(
+                    select(Service.service_id).where(Service.service_id.in_(service_ids))
+                )
+                missing_services = set(service_ids) - set(service_result.scalars().all())
+                if missing_services:
                     raise HTTPException(
                         status_code=400,
-                        detail="Invalid slot_id: Time slot does not exist",
+                        detail=f"Invalid service_id: Service does not exist: {sorted(missing_services)}",
                     )
 
-                appointment_date = time_slot.schedule.date
-
-            # create new appointment if both exist
+            # create the appointment, flushing to get its id without committing
             new_appointment = Appointment(
                 user_id=appointment_data.user_id,
-                appointment_date=appointment_date,
+                appointment_date=min(slot.date for slot in slots),
                 barber_id=appointment_data.barber_id,
-                status=appointment_data.status,
+                status=AppointmentStatus.from_schema(appointment_data.status),
             )
             self.db.add(new_appointment)
-            await self.db.commit()
-            await self.db.refresh(new_appointment)
+            await self.db.flush()
+            appointment_id = new_appointment.appointment_id
 
-            # Update the appointment_time_slot table with the newly associated appointment_id and slot_id(s)
-            for slot_id in appointment_data.time_slot:
-                new_appointment_time_slot = Appointment_TimeSlot(
-                    appointment_id=new_appointment.appointment_id, slot_id=slot_id
+            # Link the appointment to its time slot(s) and service(s) in bulk
+            await self.db.execute(
+                insert(Appointment_TimeSlot),
+                [{"appointment_id": appointment_id, "slot_id": slot_id} for slot_id in slot_ids],
+            )
+            if service_ids:
+                await self.db.execute(
+                    insert(AppointmentService),
+                    [{"appointment_id": appointment_id, "service_id": service_id} for service_id in service_ids],
                 )
-                self.db.add(new_appointment_time_slot)
 
-            # Update the is_available field in TimeSlot table for the selected slot_id(s)
-            await self.db.execute(
-                TimeSlot.__table__.update()
-                .where(TimeSlot.slot_id.in_(appointment_data.time_slot))
-                .values(is_booked=True)
+            await self.book_time_slots(slot_ids)
+            await AvailabilityOperations(self.db).refresh_days(
+                (slot.barber_id, slot.date) for slot in slots
             )
+            reminder_at = await NotificationOperations(self.db).appointment_booked(appointment_id)
 
-            # Update the service table with the newly associated appointment_id and service_id(s)
-            for service_id in appointment_data.service_id:
-                new_appointment_service = AppointmentService(
-                    service_id=service_id, appointment_id=new_appointment.appointment_id
-                )
-                self.db.add(new_appointment_service)
             await self.db.commit()
+            email_dispatcher.notify()
+            notification_scheduler.schedule(reminder_at)
 
-            await self.db.refresh(new_appointment)
-
-            # Refresh appointment again to ensure the session is aware of its latest state
+            # Load the appointment with everything needed for the response
             result = await self.db.execute(
-                select(Appointment).filter(
-                    Appointment.appointment_id == new_appointment.appointment_id
-                ).options(
-                    selectinload(Appointment.appointment_time_slots),
-                    selectinload(Appointment.appointment_services),
-                    selectinload(Appointment.user),
-                    selectinload(Appointment.barber),
-                )
+                select(Appointment)
+                .filter(Appointment.appointment_id == appointment_id)
+                .options(*APPOINTMENT_RESPONSE)
             )
             appt = result.scalars().first()
 
             if not appt:
                 return None
 
-            return appt.to_response_schema()
+            return (await self.to_responses([appt]))[0]
 
+        except HTTPException:
+            # Release the slot locks before reporting the error
+            await self.db.rollback()
+            raise
         except SQLAlchemyError as e:
             logger.error(e)
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail="An unexpected error occurred during appointment creation",
             )
 
+    # Locks time slots until the transaction ends, in slot_id order so concurrent
+    # bookings of overlapping slots cannot deadlock. Their schedules are locked first,
+    # as every writer of slots does, see AvailabilityOperations.
+    async def lock_time_slots(self, slot_ids):
+        await AvailabilityOperations(self.db).lock_schedules(
+            Schedule.schedule_id.in_(
+                select(TimeSlot.schedule_id).where(TimeSlot.slot_id.in_(sorted(slot_ids)))
+            )
+        )
+        slot_result = await self.db.execute(
+            select(
+                TimeSlot.slot_id,
+                TimeSlot.is_available,
+                TimeSlot.is_booked,
+                Schedule.barber_id,
+                Schedule.date,
+            )
+            .join(Schedule, TimeSlot.schedule_id == Schedule.schedule_id)
+            .where(TimeSlot.slot_id.in_(sorted(slot_ids)))
+            .order_by(TimeSlot.slot_id)
+            .with_for_update(of=TimeSlot)
+        )
+        return slot_result.all()
+
+    # Raises unless every requested slot exists, belongs to the barber and is free.
+    # Slots in held are already booked by the appointment being changed.
+    @staticmethod
+    def check_bookable(slots, slot_ids, barber_id: int, held: frozenset = frozenset()):
+        slot_ids = set(slot_ids)
+        requested = [slot for slot in slots if slot.slot_id in slot_ids]
+
+        missing_slots = slot_ids - {slot.slot_id for slot in requested}
+        if missing_slots:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid slot_id: Time slot does not exist: {sorted(missing_slots)}",
+            )
+
+        other_barber_slots = [
+            slot.slot_id for slot in requested if slot.barber_id != barber_id
+        ]
+        if other_barber_slots:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Time slot does not belong to the selected barber: {other_barber_slots}",
+            )
+
+        unavailable_slots = [
+            slot.slot_id for slot in requested
+            if slot.slot_id not in held and (slot.is_booked or not slot.is_available)
+        ]
+        if unavailable_slots:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Time slot is already booked or unavailable: {unavailable_slots}",
+            )
+
+    # Marks the slots as booked, only if they still are not
+    async def book_time_slots(self, slot_ids):
+        booked_result = await self.db.execute(
+            update(TimeSlot)
+            .where(TimeSlot.slot_id.in_(slot_ids), TimeSlot.is_booked.is_(False))
+            .values(is_booked=True)
+            .execution_options(synchronize_session=False)
+        )
+        if booked_result.rowcount != len(slot_ids):
+            raise HTTPException(
+                status_code=409,
+                detail="Time slot is already booked or unavailable",
+            )
+
+    # Frees slots that are no longer held by an appointment
+    async def release_time_slots(self, slot_ids):
+        await self.db.execute(
+            update(TimeSlot)
+            .where(TimeSlot.slot_id.in_(slot_ids))
+            .values(is_booked=False)
+            .execution_options(synchronize_session=False)
+        )
+
+    # Moves an appointment to a new set of time slots, booking the added ones and freeing
+    # the ones it no longer uses. Returns every (barber_id, date) day the change touched.
+    async def rebook_time_slots(self, appointment: Appointment, slot_ids) -> set:
+        slot_ids = sorted(set(slot_ids))
+        if not slot_ids:
+            raise HTTPException(
+                status_code=400, detail="At least one time slot is required"
+            )
+
+        current_result = await self.db.execute(
+            select(Appointment_TimeSlot.slot_id).where(
+                Appointment_TimeSlot.appointment_id == appointment.appointment_id
+            )
+        )
+        current_ids = frozenset(current_result.scalars().all())
+
+        slots = await self.lock_time_slots(current_ids | set(slot_ids))
+        self.check_bookable(slots, slot_ids, appointment.barber_id, held=current_ids)
+
+        released = sorted(current_ids.difference(slot_ids))
+        added = sorted(set(slot_ids) - current_ids)
+        if released:
+            await self.release_time_slots(released)
+            await self.db.execute(
+                delete(Appointment_TimeSlot).where(
+                    Appointment_TimeSlot.appointment_id == appointment.appointment_id,
+                    Appointment_TimeSlot.slot_id.in_(released),
+                )
+            )
+        if added:
+            await self.book_time_slots(added)
+            await self.db.execute(
+                insert(Appointment_TimeSlot),
+                [{"appointment_id": appointment.appointment_id, "slot_id": slot_id} for slot_id in added],
+            )
+
+        appointment.appointment_date = min(
+            slot.date for slot in slots if slot.slot_id not in released
+        )
+        return {(slot.barber_id, slot.date) for slot in slots}
+
     # Get all appointments
     async def get_all_appointments(
         self,
@@ -141,19 +293,48 @@ class AppointmentOperations:
         limit: int,
         user_id: Optional[int] = None,
         barber_id: Optional[int] = None,
+        after: Optional[list] = None,
+        status: Optional[SchemaAppointmentStatus] = None,
+        date_from: Optional[datetime.date] = None,
+        date_to: Optional[datetime.date] = None,
     ) -> List[AppointmentResponse]:
         try:
-            # Calculate offset for SQL query
-            offset = (page - 1) * limit
-
-            result = await self.db.execute(
-                select(Appointment).limit(limit).offset(offset)
+            query = (
+                select(Appointment)
+                .options(*APPOINTMENT_RESPONSE)
+                .order_by(Appointment.appointment_date, Appointment.appointment_id)
+                .limit(limit)
             )
-            appointments = result.scalars().all()
 
-            if not appointments:
-                return None
-            return [app.to_response_schema() for app in appointments]
+            # Filters are applied in SQL, each one is backed by an (x, appointment_date) index
+            if user_id is not None:
+                query = query.filter(Appointment.user_id == user_id)
+            if barber_id is not None:
+                query = query.filter(Appointment.barber_id == barber_id)
+            if status is not None:
+                query = query.filter(Appointment.status == AppointmentStatus.from_schema(status))
+            if date_from is not None:
+                query = query.filter(Appointment.appointment_date >= date_from)
+            if date_to is not None:
+                query = query.filter(Appointment.appointment_date <= date_to)
+
+            # Continue after the (appointment_date, appointment_id) of the cursor when given,
+            # otherwise calculate offset for SQL query. Appointments without a date sort first
+            if after:
+                last_date, last_id = after
+                query = query.filter(
+                    after_nullable_key(
+                        Appointment.appointment_date,
+                        Appointment.appointment_id,
+                        datetime.date.fromisoformat(last_date) if last_date is not None else None,
+                        last_id,
+                    )
+                )
+            else:
+                query = query.offset((page - 1) * limit)
+
+            result = await self.db.execute(query)
+            return await self.to_responses(result.scalars().all())
 
         except SQLAlchemyError as e:
             logger.error(e)
@@ -168,14 +349,16 @@ class AppointmentOperations:
     ) -> Optional[AppointmentResponse]:
         # try:
         result = await self.db.execute(
-            select(Appointment).filter(Appointment.appointment_id == appointment_id)
+            select(Appointment)
+            .filter(Appointment.appointment_id == appointment_id)
+            .options(*APPOINTMENT_RESPONSE)
         )
         appt = result.scalars().first()
 
         if not appt:
             return None
 
-        return appt.to_response_schema()
+        return (await self.to_responses([appt]))[0]
 
         # except SQLAlchemyError:
         #     raise HTTPException(
@@ -200,23 +383,27 @@ class AppointmentOperations:
             update_data = appointment_data.dict(
                 exclude_unset=True, exclude={"time_slot", "service_id"}
             )
+            # The request's status is the API schema's, the table spells cancelled differently
+            if update_data.get("status") is not None:
+                update_data["status"] = AppointmentStatus.from_schema(update_data["status"])
+            previous_status = appointment.status
             for key, value in update_data.items():
                 setattr(appointment, key, value)
 
-            # update Appointment_TimeSlot table if it has new tim_slot info
-            if "time_slot" in appointment_data.dict(exclude_unset=True):
-                # Delete current associations for this appointment
-                await self.db.execute(
-                    delete(Appointment_TimeSlot).where(
-                        Appointment_TimeSlot.appointment_id == appointment_id
+            # Move the appointment to its new time slots, or re-check the current ones
+            # against a new barber, keeping the slots' is_booked flags in step
+            rescheduled = appointment_data.time_slot is not None or "barber_id" in update_data
+            if rescheduled:
+                slot_ids = appointment_data.time_slot
+                if slot_ids is None:
+                    current = await self.db.execute(
+                        select(Appointment_TimeSlot.slot_id).where(
+                            Appointment_TimeSlot.appointment_id == appointment_id
+                        )
                     )
-                )
-                # Add new associations
-                for slot_id in appointment_data.time_slot:
-                    new_link = Appointment_TimeSlot(
-                        appointment_id=appointment_id, slot_id=slot_id
-                    )
-                    self.db.add(new_link)
+                    slot_ids = current.scalars().all()
+                days = await self.rebook_time_slots(appointment, slot_ids)
+                await AvailabilityOperations(self.db).refresh_days(days)
 
             # update AppointmentService table if it has new service_id information
             if "service_id" in appointment_data.dict(exclude_unset=True):
@@ -231,39 +418,39 @@ class AppointmentOperations:
                     )
                     self.db.add(new_service_link)
 
+            # Queue the emails of a status change or a move before the commit, so they are sent exactly when it lands
+            status_changed = (
+                update_data.get("status") is not None
+                and update_data["status"] != previous_status
+            )
+            reminder_at = None
+            if status_changed or rescheduled:
+                await self.db.flush()
+                reminder_at = await NotificationOperations(self.db).appointment_changed(
+                    appointment_id, status_changed, rescheduled
+                )
+
             # Commit all changes
             await self.db.commit()
-            await self.db.refresh(appointment)
+            if status_changed or rescheduled:
+                email_dispatcher.notify()
+                notification_scheduler.schedule(reminder_at)
 
             # Retrieve the updated data for the response
-            time_slot_result = await self.db.execute(
-                select(Appointment_TimeSlot).where(
-                    Appointment_TimeSlot.appointment_id == appointment_id
-                )
-            )
-            time_slot_links = time_slot_result.scalars().all()
-            time_slot_ids = [link.slot_id for link in time_slot_links]
-
-            service_result = await self.db.execute(
-                select(AppointmentService).where(
-                    AppointmentService.appointment_id == appointment_id
-                )
-            )
-            service_links = service_result.scalars().all()
-            service_ids = [link.service_id for link in service_links]
-
-            # Return with updated data
-            return AppointmentResponse(
-                appointment_id=appointment.appointment_id,
-                user_id=appointment.user_id,
-                barber_id=appointment.barber_id,
-                status=appointment.status,
-                time_slot=time_slot_ids,
-                service_id=service_ids,
+            result = await self.db.execute(
+                select(Appointment)
+                .filter(Appointment.appointment_id == appointment_id)
+                .options(*APPOINTMENT_RESPONSE)
+                .execution_options(populate_existing=True)
             )
+            return (await self.to_responses([result.scalars().first()]))[0]
 
+        except HTTPException:
+            await self.db.rollback()
+            raise
         except SQLAlchemyError as e:
             logger.error(e)
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail="An unexpected error occurred while updating the desired appointment",
@@ -273,13 +460,36 @@ class AppointmentOperations:
     async def delete_appointment(self, appointment_id: int) -> bool:
         try:
             result = await self.db.execute(
-                select(Appointment).filter(Appointment.appointment_id == appointment_id)
+                select(Appointment.appointment_id).filter(Appointment.appointment_id == appointment_id)
             )
-            appointment = result.scalars().first()
 
-            if not appointment:
+            if result.scalar() is None:
                 return False
 
+            # Queue the cancellation email while the appointment can still be read
+            await NotificationOperations(self.db).appointment_deleted(appointment_id)
+
+            # Free the appointment's time slots, locking their schedules first
+            appointment_slot_ids = select(Appointment_TimeSlot.slot_id).where(
+                Appointment_TimeSlot.appointment_id == appointment_id
+            )
+            await AvailabilityOperations(self.db).lock_schedules(
+                Schedule.schedule_id.in_(
+                    select(TimeSlot.schedule_id).where(TimeSlot.slot_id.in_(appointment_slot_ids))
+                )
+            )
+            slot_result = await self.db.execute(
+                select(TimeSlot.slot_id, Schedule.barber_id, Schedule.date)
+                .join(Schedule, TimeSlot.schedule_id == Schedule.schedule_id)
+                .join(Appointment_TimeSlot, Appointment_TimeSlot.slot_id == TimeSlot.slot_id)
+                .where(Appointment_TimeSlot.appointment_id == appointment_id)
+                .order_by(TimeSlot.slot_id)
+                .with_for_update(of=TimeSlot)
+            )
+            slots = slot_result.all()
+            if slots:
+                await self.release_time_slots([slot.slot_id for slot in slots])
+
             # Delete associated appointment_time_slot records
             await self.db.execute(
                 delete(Appointment_TimeSlot).where(
@@ -293,11 +503,18 @@ class AppointmentOperations:
                 )
             )
 
-            await self.db.delete(appointment)
+            await self.db.execute(
+                delete(Appointment).where(Appointment.appointment_id == appointment_id)
+            )
+            await AvailabilityOperations(self.db).refresh_days(
+                (slot.barber_id, slot.date) for slot in slots
+            )
             await self.db.commit()
+            email_dispatcher.notify()
             return True
         except SQLAlchemyError as e:
             logger.error(e)
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail="An unexpected error occurred while deleting the desired appointment",
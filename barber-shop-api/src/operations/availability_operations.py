@@ -0,0 +1,269 @@
+import datetime
+import logging
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, delete, exists, func, select, tuple_
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from modules.availability_schema import AvailabilityWindow, BarberAvailability, DailyAvailability
+from modules.user.models import BarberDailyAvailability, Schedule, TimeSlot
+from operations.cache_versions import SCHEDULES_VERSION, bump_versions
+from operations.service_catalog import service_catalog
+
+logger = logging.getLogger("availability_operations")
+logger.setLevel(logging.ERROR)
+
+# Longest date range a single availability search may cover
+MAX_AVAILABILITY_DAYS = 31
+
+# Longest date range a single calendar request may cover
+MAX_CALENDAR_DAYS = 62
+
+# Most (barber_id, date) pairs refreshed by a single statement
+REFRESH_BATCH_SIZE = 500
+
+'''
+Searches the schedules for free time, so clients no longer page through barbers and
+schedules and filter the slots themselves.
+
+The free slots of every barber over the requested dates are read in one query, then
+back-to-back slots are merged into windows in memory. Only windows long enough for
+the requested services and number of slots are returned.
+
+Calendar views read the barber_daily_availability summary instead. Every write that
+changes slots refreshes the summary rows of the days it touched, uncommitted, inside the
+writer's own transaction. The refresh reads the day's slots with shared locks, so writers
+lock the schedule rows of the days they change before any of their slots (lock_schedules).
+Two writers of the same barber and day then queue on the schedule row, instead of each
+holding slot locks the other's refresh waits for. The refresh itself is one upsert of the
+aggregates, plus a delete of the summary rows whose day no longer has a schedule.
+'''
+class AvailabilityOperations:
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # Returns, per barber, the free windows covering at least slot_count slots and the total duration of the services
+    async def find_availability(
+        self,
+        date_from: datetime.date,
+        date_to: Optional[datetime.date] = None,
+        service_ids: Optional[List[int]] = None,
+        slot_count: int = 1,
+        barber_id: Optional[int] = None,
+    ) -> List[BarberAvailability]:
+        date_to = date_to or date_from
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+        if (date_to - date_from).days >= MAX_AVAILABILITY_DAYS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Availability can be searched over at most {MAX_AVAILABILITY_DAYS} days"
+            )
+
+        try:
+            required_minutes = await self.get_services_duration(service_ids) if service_ids else 0
+
+            query = (
+                select(
+                    Schedule.barber_id,
+                    Schedule.date,
+                    TimeSlot.slot_id,
+                    TimeSlot.start_time,
+                    TimeSlot.end_time,
+                )
+                .join(Schedule, Schedule.schedule_id == TimeSlot.schedule_id)
+                .filter(
+                    Schedule.date.between(date_from, date_to),
+                    Schedule.is_working.is_(True),
+                    TimeSlot.is_available.is_(True),
+                    TimeSlot.is_booked.is_(False),
+                )
+                .order_by(Schedule.barber_id, Schedule.date, TimeSlot.start_time)
+            )
+            if barber_id is not None:
+                query = query.filter(Schedule.barber_id == barber_id)
+
+            rows = (await self.db.execute(query)).all()
+        except SQLAlchemyError as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred while searching availability"
+            )
+
+        return self.merge_windows(rows, required_minutes, slot_count)
+
+    # Sums the durations of the requested services, raising a 400 if any of them does not exist
+    async def get_services_duration(self, service_ids: List[int]) -> int:
+        catalog = await service_catalog.get(self.db)
+        services = [catalog.by_id.get(service_id) for service_id in set(service_ids)]
+        if None in services:
+            raise HTTPException(status_code=400, detail="One or more service IDs are invalid")
+        return sum(service.duration for service in services)
+
+    # Merges slots ordered by barber, date and start time into contiguous windows, keeping those long enough
+    @staticmethod
+    def merge_windows(rows, required_minutes: int, slot_count: int) -> List[BarberAvailability]:
+        required = datetime.timedelta(minutes=required_minutes)
+        availability: dict[int, BarberAvailability] = {}
+        window: Optional[AvailabilityWindow] = None
+        window_barber_id: Optional[int] = None
+
+        def close(window: Optional[AvailabilityWindow], barber_id: Optional[int]):
+            if window is None or len(window.slot_ids) < slot_count:
+                return
+            length = (
+                datetime.datetime.combine(window.date, window.end_time)
+                - datetime.datetime.combine(window.date, window.start_time)
+            )
+            if length >= required:
+                availability.setdefault(
+                    barber_id, BarberAvailability(barber_id=barber_id, windows=[])
+                ).windows.append(window)
+
+        for barber_id, date, slot_id, start_time, end_time in rows:
+            if (
+                window is not None
+                and window_barber_id == barber_id
+                and window.date == date
+                and window.end_time == start_time
+            ):
+                window.end_time = end_time
+                window.slot_ids.append(slot_id)
+                continue
+
+            close(window, window_barber_id)
+            window = AvailabilityWindow(date=date, start_time=start_time, end_time=end_time, slot_ids=[slot_id])
+            window_barber_id = barber_id
+
+        close(window, window_barber_id)
+        return list(availability.values())
+
+    # Returns the daily free slot summary of every barber, or of one barber, over a date range
+    async def get_daily_availability(
+        self,
+        date_from: datetime.date,
+        date_to: datetime.date,
+        barber_id: Optional[int] = None,
+    ) -> List[DailyAvailability]:
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+        if (date_to - date_from).days >= MAX_CALENDAR_DAYS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"The calendar can cover at most {MAX_CALENDAR_DAYS} days"
+            )
+
+        try:
+            query = (
+                select(BarberDailyAvailability)
+                .filter(BarberDailyAvailability.date.between(date_from, date_to))
+                .order_by(BarberDailyAvailability.barber_id, BarberDailyAvailability.date)
+            )
+            if barber_id is not None:
+                query = query.filter(BarberDailyAvailability.barber_id == barber_id)
+
+            result = await self.db.execute(query)
+            return [day.to_response_schema() for day in result.scalars().all()]
+        except SQLAlchemyError as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred while fetching the availability calendar"
+            )
+
+    # Locks the schedule rows matching schedule_filter until the transaction ends, in schedule_id order.
+    # Writers call it before locking or changing any time slot of those schedules.
+    async def lock_schedules(self, schedule_filter):
+        await self.db.execute(
+            select(Schedule.schedule_id)
+            .filter(schedule_filter)
+            .order_by(Schedule.schedule_id)
+            .with_for_update()
+        )
+
+    # Recomputes the summary rows of the given (barber_id, date) days, without committing
+    async def refresh_days(self, days: Iterable[tuple[int, datetime.date]]):
+        days = sorted(set(days))
+        for start in range(0, len(days), REFRESH_BATCH_SIZE):
+            batch = days[start:start + REFRESH_BATCH_SIZE]
+            await self.refresh_summary(
+                tuple_(BarberDailyAvailability.barber_id, BarberDailyAvailability.date).in_(batch),
+                tuple_(Schedule.barber_id, Schedule.date).in_(batch),
+            )
+
+    # Recomputes the summary rows over a date range, for the given barbers or all of them, without committing
+    async def refresh_range(
+        self,
+        date_from: Optional[datetime.date] = None,
+        date_to: Optional[datetime.date] = None,
+        barber_ids: Optional[Iterable[int]] = None,
+    ):
+        summary_filters = []
+        schedule_filters = []
+        if date_from is not None:
+            summary_filters.append(BarberDailyAvailability.date >= date_from)
+            schedule_filters.append(Schedule.date >= date_from)
+        if date_to is not None:
+            summary_filters.append(BarberDailyAvailability.date <= date_to)
+            schedule_filters.append(Schedule.date <= date_to)
+        if barber_ids is not None:
+            barber_ids = list(barber_ids)
+            summary_filters.append(BarberDailyAvailability.barber_id.in_(barber_ids))
+            schedule_filters.append(Schedule.barber_id.in_(barber_ids))
+
+        await self.refresh_summary(and_(True, *summary_filters), and_(True, *schedule_filters))
+
+    # Brings the summary rows matching summary_filter in line with the schedules matching schedule_filter
+    async def refresh_summary(self, summary_filter, schedule_filter):
+        is_free = and_(
+            Schedule.is_working.is_(True),
+            TimeSlot.is_available.is_(True),
+            TimeSlot.is_booked.is_(False),
+        )
+        aggregate = (
+            select(
+                Schedule.barber_id,
+                Schedule.date,
+                func.coalesce(func.sum(case((is_free, 1), else_=0)), 0),
+                func.min(case((is_free, TimeSlot.start_time))),
+                func.max(case((is_free, TimeSlot.start_time))),
+            )
+            .outerjoin(TimeSlot, TimeSlot.schedule_id == Schedule.schedule_id)
+            .filter(schedule_filter)
+            .group_by(Schedule.barber_id, Schedule.date)
+        )
+
+        await self.db.execute(self.upsert_summary(aggregate))
+
+        # Days left without a schedule, after a schedule was deleted or moved to another day
+        await self.db.execute(
+            delete(BarberDailyAvailability).where(
+                summary_filter,
+                ~exists().where(
+                    Schedule.barber_id == BarberDailyAvailability.barber_id,
+                    Schedule.date == BarberDailyAvailability.date,
+                ),
+            )
+        )
+        # Every schedule and slot write refreshes the summary, so the ETags of schedule reads move with it
+        await bump_versions(self.db, SCHEDULES_VERSION)
+
+    # INSERT ... SELECT of the aggregate rows, overwriting the summary rows that already exist.
+    # MySQL spells it ON DUPLICATE KEY UPDATE, SQLite (the tests) ON CONFLICT DO UPDATE
+    def upsert_summary(self, aggregate):
+        columns = ["barber_id", "date", "free_slots", "first_free", "last_free"]
+        if self.db.get_bind().dialect.name == "mysql":
+            statement = mysql.insert(BarberDailyAvailability).from_select(columns, aggregate)
+            return statement.on_duplicate_key_update(
+                {column: statement.inserted[column] for column in columns[2:]}
+            )
+        statement = sqlite.insert(BarberDailyAvailability).from_select(columns, aggregate)
+        return statement.on_conflict_do_update(
+            index_elements=columns[:2],
+            set_={column: statement.excluded[column] for column in columns[2:]},
+        )
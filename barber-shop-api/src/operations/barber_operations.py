@@ -1,17 +1,28 @@
-from typing import List
+import datetime
+from typing import List, Optional
 
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import exists
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
 from modules.user.models import Barber, Schedule, User
-from modules.user.barber_schema import BarberCreate
+from modules.user.barber_schema import BarberCreate, BarberResponse
 
 from auth.service import AuthService
+from operations.loader_options import BARBER_RESPONSE
+from core.pagination import after_key
+from core.cache import TTLCache
+from operations.cache_versions import BARBERS_VERSION, bump_versions
 import logging
 
 logger = logging.getLogger("barber_operations")
 logger.setLevel(logging.ERROR)
+
+# Barber listing pages by (schedule_date, page, limit, after), cleared whenever barbers,
+# their user details or schedules change
+barber_list_cache = TTLCache(ttl=30.0, max_size=512)
+
 '''
 Contains methods for barber creation and retrieval.
 Updating a Barber's information should be done using the User ID in the user router.
@@ -46,14 +57,27 @@ class BarberOperations:
                 )
         
         
+            # Read before commit, committing expires the loaded user
+            kc_id = user_object.kc_id
+
             barber = Barber(user_id=user.user_id)
             self.db.add(barber)
+            await self.db.flush()
+            barber_id = barber.barber_id
+            await bump_versions(self.db, BARBERS_VERSION)
             await self.db.commit()
-            await self.db.refresh(barber)
+
+            result = await self.db.execute(
+                select(Barber)
+                .filter(Barber.barber_id == barber_id)
+                .options(*BARBER_RESPONSE)
+            )
+            barber = result.scalars().first()
+            barber_list_cache.invalidate()
 
             # Add barber role to Keycloak user
             try:
-                AuthService.add_role_to_user(user_object.kc_id, "barber")
+                await AuthService.add_role_to_user(kc_id, "barber")
             except Exception as e:
                 logger.error(f"Error adding role to Keycloak user: {str(e)}")
                 await self.db.rollback()
@@ -72,13 +96,16 @@ class BarberOperations:
                 detail="An unexpected error occurred"
             )
     
-    # Retrieve all barbers
-    async def get_all_barbers(self, page: int, limit: int) -> List[Barber]:
+    # Retrieve a page of barbers, optionally only those with a schedule on schedule_date
+    async def get_all_barbers(
+        self,
+        page: int,
+        limit: int,
+        after: Optional[list] = None,
+        schedule_date: Optional[datetime.date] = None,
+    ) -> List[Barber]:
         try: 
-            # Calculate offset for SQL query
-            offset = (page - 1) * limit
-
-            result = await self.db.execute(select(Barber).limit(limit).offset(offset))
+            result = await self.db.execute(self.build_barber_query(page, limit, after, schedule_date))
             return result.scalars().all()
         except SQLAlchemyError as e:
             logger.error(e)
@@ -86,11 +113,56 @@ class BarberOperations:
                 status_code=500,
                 detail="An unexpected error occurred"
             )
+
+    # Same as get_all_barbers as response schemas, served from the listing cache when possible
+    async def list_barbers(
+        self,
+        page: int,
+        limit: int,
+        after: Optional[list] = None,
+        schedule_date: Optional[datetime.date] = None,
+    ) -> List[BarberResponse]:
+        key = (schedule_date, page, limit, tuple(after) if after else None)
+        barbers = barber_list_cache.get(key)
+        if barbers is None:
+            barbers = [
+                barber.to_response_schema()
+                for barber in await self.get_all_barbers(page, limit, after, schedule_date)
+            ]
+            barber_list_cache.set(key, barbers)
+        return barbers
+
+    # Builds the barber listing query, filtering and paginating in SQL
+    @staticmethod
+    def build_barber_query(page: int, limit: int, after: Optional[list], schedule_date: Optional[datetime.date]):
+        query = (
+            select(Barber)
+            .options(*BARBER_RESPONSE)
+            .order_by(Barber.barber_id)
+            .limit(limit)
+        )
+
+        # Only barbers with a schedule on the date, without joining in duplicate rows
+        if schedule_date:
+            query = query.filter(
+                exists().where(Schedule.barber_id == Barber.barber_id, Schedule.date == schedule_date)
+            )
+
+        # Continue after the cursor when given, otherwise calculate offset for SQL query
+        if after:
+            query = query.filter(after_key((Barber.barber_id,), after))
+        else:
+            query = query.offset((page - 1) * limit)
+        return query
         
     # Retrieve a specific barber by their Barber ID
     async def get_barber_by_id(self, barber_id: int):
         try:
-            result = await self.db.execute(select(Barber).filter(Barber.barber_id == barber_id))
+            result = await self.db.execute(
+                select(Barber)
+                .filter(Barber.barber_id == barber_id)
+                .options(*BARBER_RESPONSE)
+            )
             first_result = result.scalars().first()
             if not first_result:
                 raise HTTPException(status_code = 400, detail="No barber found with provided ID")
@@ -102,22 +174,3 @@ class BarberOperations:
                 status_code=500,
                 detail="An unexpected error occurred"
             )
-        
-    async def list_barbers_by_schedule_date(self, schedule_date: str, page: int = None, limit: int = None) -> List[Barber]:
-        # Get a Schedule object by date
-        schedules = await self.db.execute(select(Schedule).filter(Schedule.date == schedule_date))
-        schedules = schedules.scalars().all()
-        if not schedules:
-            return []
-
-        # Get all barbers by joining the Schedule table on the barber_id
-        result = await self.db.execute(
-            select(Barber).join(Schedule).filter(Schedule.schedule_id.in_([schedule.schedule_id for schedule in schedules])
-            ).distinct(Barber.barber_id)
-        )
-        barbers = result.scalars().all()
-        if page and limit:
-            offset = (page - 1) * limit
-            barbers = barbers[offset:offset + limit]
-        return barbers
-
@@ -0,0 +1,46 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from modules.user.models import CacheVersion
+
+'''
+Version counters of cached reads, one row per name in the cache_version table.
+
+Writers bump the counters their change affects in the same transaction as the change, and
+readers build their ETags from them: one primary key lookup tells whether a client's copy
+is still current without loading or serialising the response. A missing row reads as version 1.
+'''
+
+# Barbers and the user details embedded in their responses
+BARBERS_VERSION = "barbers"
+# Schedules and their time slots, bumped with every summary refresh
+SCHEDULES_VERSION = "schedules"
+# Threads and their messages
+THREADS_VERSION = "threads"
+
+
+# Moves the named versions forward, in the caller's transaction.
+# One upsert, so concurrent writers never race to create a missing row. Rows are locked in
+# name order, and after the rows of the change itself, so writers never wait on each other in a cycle
+async def bump_versions(db: AsyncSession, *names: str):
+    values = [{"name": name, "version": 2} for name in sorted(set(names))]
+    if db.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(CacheVersion).values(values)
+        statement = statement.on_duplicate_key_update(version=CacheVersion.version + 1)
+    else:
+        statement = sqlite.insert(CacheVersion).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={"version": CacheVersion.version + 1},
+        )
+    await db.execute(statement)
+
+
+# Current versions of the given names, in the order given
+async def read_versions(db: AsyncSession, *names: str) -> tuple[int, ...]:
+    result = await db.execute(
+        select(CacheVersion.name, CacheVersion.version).where(CacheVersion.name.in_(names))
+    )
+    versions = dict(result.all())
+    return tuple(versions.get(name, 1) for name in names)
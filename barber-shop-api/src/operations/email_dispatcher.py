@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Optional
+
+import aiosmtplib
+
+from core.config import settings
+from core.db import async_session_manager
+from core.smtp import smtp_pool
+from operations.email_operations import EmailOperations
+from operations.email_outbox_operations import DeliveryResult, EmailOutboxOperations, claim_lease_seconds
+
+logger = logging.getLogger("email_dispatcher")
+logger.setLevel(logging.ERROR)
+
+# 5xx rejections of the message itself would be given again on retry,
+# connection and login failures are retried
+def is_permanent(error: Exception) -> bool:
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(recipient.code >= 500 for recipient in error.recipients)
+    return isinstance(error, (aiosmtplib.SMTPSenderRefused, aiosmtplib.SMTPDataError)) and error.code >= 500
+
+
+'''
+Background delivery of the email outbox.
+
+Each worker runs one dispatcher from the app lifespan. It claims due emails in batches,
+sends every batch over the pooled SMTP connections and records the outcome of each email
+as soon as it is known, retrying failures with a backoff. Between batches it sleeps until the poll interval runs
+out, or until a request on the same worker queues a new email.
+'''
+class EmailDispatcher:
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+        self.batches = 0
+        self.attempted = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.send_time_total = 0.0
+        self.send_time_max = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    # Wakes the dispatcher up early after an email was queued
+    def notify(self):
+        self._wakeup.set()
+
+    async def run(self):
+        config = settings.get_config()
+        while True:
+            self._wakeup.clear()
+            try:
+                claimed = await self.dispatch_batch()
+            except Exception as e:
+                logger.error(e)
+                self.last_error = str(e)
+                claimed = 0
+
+            # A full batch means more emails may be due, keep going without waiting
+            if claimed < config.email_batch_size:
+                await smtp_pool.evict_idle()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), config.email_poll_interval)
+
+    # Claims, sends and records one batch, returns how many emails were claimed
+    async def dispatch_batch(self) -> int:
+        config = settings.get_config()
+        async with async_session_manager.session() as session:
+            outbox_ops = EmailOutboxOperations(session)
+            emails = await outbox_ops.claim_due(
+                config.email_batch_size,
+                claim_lease_seconds(config.email_batch_size, config.email_send_timeout),
+            )
+            if not emails:
+                return 0
+
+            # The session is shared by the chunks sent in parallel, one outcome is written at a time
+            session_lock = asyncio.Lock()
+
+            # Marks the email sent, or schedules its retry, right after the server answered for it
+            async def record(index: int, error: Optional[Exception]):
+                email = emails[index]
+                if error is None:
+                    result = DeliveryResult(email.email_id, email.attempts)
+                else:
+                    permanent = is_permanent(error)
+                    result = DeliveryResult(email.email_id, email.attempts, str(error) or type(error).__name__, permanent)
+                    if permanent or email.attempts >= config.email_max_attempts:
+                        self.failed += 1
+                    else:
+                        self.retried += 1
+                    self.last_error = str(error)
+                async with session_lock:
+                    await outbox_ops.record_results([result], config.email_max_attempts, config.email_retry_delay)
+
+            email_ops = EmailOperations()
+            messages = [email_ops.build_message(email.recipient, email.subject, email.body) for email in emails]
+            start = time.perf_counter()
+            errors = await email_ops.send_many(messages, record)
+            elapsed = time.perf_counter() - start
+
+        self.batches += 1
+        self.attempted += len(emails)
+        self.sent += sum(1 for error in errors if error is None)
+        self.send_time_total += elapsed
+        self.send_time_max = max(self.send_time_max, elapsed)
+        return len(emails)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "batches": self.batches,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batch_send_time_avg": round(self.send_time_total / self.batches, 6) if self.batches else 0.0,
+            "batch_send_time_max": round(self.send_time_max, 6),
+            "email_send_time_avg": round(self.send_time_total / self.attempted, 6) if self.attempted else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+email_dispatcher = EmailDispatcher()
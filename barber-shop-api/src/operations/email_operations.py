@@ -1,40 +1,40 @@
+from email.message import EmailMessage
+from typing import List, Optional
+
 from fastapi import HTTPException
-from fastapi_mail import FastMail, MessageSchema
 from core.config import settings
+from core.smtp import ResultCallback, smtp_pool
 import logging
 
 logger = logging.getLogger("email_operations")
 logger.setLevel(logging.ERROR)
 
 class EmailOperations:
-    def __init__(self):
-        try:
-            # Initialize the email configuration
-            email_config = settings.get_mail_config()
-            self.fast_mail = FastMail(email_config)
-        except Exception as e:
-            logger.error(e)
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to initialize email configuration"
-            ) 
+
+    # Builds the message of an html email from the configured sender
+    def build_message(self, recipient: str, subject: str, body: str) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = settings.get_config().mail_from
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body, subtype="html")
+        return message
+
+    # Sends the messages over the pooled SMTP connections
+    # Returns the error of each message, or None for the ones the server accepted
+    async def send_many(
+        self, messages: List[EmailMessage], on_result: Optional[ResultCallback] = None
+    ) -> List[Optional[Exception]]:
+        errors = await smtp_pool.send_many(messages, on_result)
+        for error in errors:
+            if error is not None:
+                logger.error(error)
+        return errors
 
     async def send_email(self, email: str, subject: str, body: str):
-        try:
-            # Create the email message schema
-            message = MessageSchema(
-                subject=subject,
-                recipients=[email],  # List of recipients
-                body=body,
-                subtype="html"
-            )
-            # Send the email
-            await self.fast_mail.send_message(message)
-        except Exception as e:
-            logger.error(e)
+        errors = await self.send_many([self.build_message(email, subject, body)])
+        if errors[0] is not None:
             raise HTTPException(
                 status_code=500,
                 detail=f"An error occurred while sending the email"
             )
-
-email_operations = EmailOperations()
\ No newline at end of file
@@ -0,0 +1,182 @@
+import datetime
+import logging
+import random
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from modules.user.models import EmailOutbox, EmailStatus
+
+logger = logging.getLogger("email_outbox_operations")
+logger.setLevel(logging.ERROR)
+
+# Added to a claim's lease, for the outcomes to be written after the last email went out
+LEASE_MARGIN_SECONDS = 60
+
+# Upper bound of the retry backoff
+MAX_RETRY_DELAY_SECONDS = 6 * 60 * 60
+
+# Longest error kept on a row, matches the last_error column
+ERROR_PREVIEW_LENGTH = 255
+
+
+class QueuedEmail(NamedTuple):
+    email_id: int
+    recipient: str
+    subject: str
+    body: str
+    attempts: int
+
+
+class DeliveryResult(NamedTuple):
+    email_id: int
+    attempts: int
+    error: Optional[str] = None
+    # Errors the server will give again on retry, such as an unknown mailbox
+    permanent: bool = False
+
+
+# Outbox timestamps are naive UTC
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# How long claimed emails are hidden from other dispatchers. A batch may time out one email
+# after the other, and the rest of a chunk is tried again on a fresh connection, so the lease
+# covers twice the batch at the send timeout and no other dispatcher can send them meanwhile
+def claim_lease_seconds(batch_size: int, send_timeout: float) -> float:
+    return 2 * batch_size * send_timeout + LEASE_MARGIN_SECONDS
+
+
+'''
+Reads and writes of the email_outbox table.
+
+Requests only add rows, in their own transaction, so an email is queued exactly when the
+change that caused it is committed. Dispatchers claim due rows with SELECT ... FOR UPDATE
+SKIP LOCKED and push their next_attempt_at past a lease before sending, so several workers
+can drain the queue without sending the same email twice. Each outcome is written as soon as
+it is known, a dispatcher stopped mid-batch only leaves the emails it had not sent yet.
+'''
+class EmailOutboxOperations:
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # Adds an email to the outbox without committing, it is sent once the caller commits
+    def add_email(self, recipient: str, subject: str, body: str, send_at: Optional[datetime.datetime] = None) -> EmailOutbox:
+        now = utc_now()
+        email = EmailOutbox(
+            recipient=recipient,
+            subject=subject,
+            body=body,
+            status=EmailStatus.pending,
+            attempts=0,
+            next_attempt_at=send_at or now,
+            created_at=now,
+        )
+        self.db.add(email)
+        return email
+
+    # Queues a single email in its own transaction and returns its id
+    async def enqueue_email(self, recipient: str, subject: str, body: str) -> int:
+        try:
+            email = self.add_email(recipient, subject, body)
+            await self.db.flush()
+            email_id = email.email_id
+            await self.db.commit()
+            return email_id
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            logger.error(e)
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred while queueing the email"
+            )
+
+    # Claims up to limit due emails for this dispatcher, oldest first, for lease_seconds
+    async def claim_due(self, limit: int, lease_seconds: float) -> List[QueuedEmail]:
+        now = utc_now()
+        result = await self.db.execute(
+            select(
+                EmailOutbox.email_id,
+                EmailOutbox.recipient,
+                EmailOutbox.subject,
+                EmailOutbox.body,
+                EmailOutbox.attempts,
+            )
+            .where(EmailOutbox.status == EmailStatus.pending, EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.email_id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        emails = [QueuedEmail(*row[:4], attempts=row.attempts + 1) for row in result.all()]
+
+        if emails:
+            await self.db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.email_id.in_([email.email_id for email in emails]))
+                .values(
+                    attempts=EmailOutbox.attempts + 1,
+                    next_attempt_at=now + datetime.timedelta(seconds=lease_seconds),
+                )
+            )
+        await self.db.commit()
+        return emails
+
+    # Marks delivered emails as sent and schedules the failed ones again with an exponential backoff
+    # Emails that failed permanently or ran out of attempts are marked failed
+    async def record_results(self, results: List[DeliveryResult], max_attempts: int, retry_delay: float):
+        now = utc_now()
+        updates = []
+        for result in results:
+            if result.error is None:
+                updates.append({
+                    "email_id": result.email_id,
+                    "status": EmailStatus.sent,
+                    "sent_at": now,
+                    "last_error": None,
+                })
+            elif result.permanent or result.attempts >= max_attempts:
+                updates.append({
+                    "email_id": result.email_id,
+                    "status": EmailStatus.failed,
+                    "last_error": result.error[:ERROR_PREVIEW_LENGTH],
+                })
+            else:
+                # Jitter keeps the retries of one failed batch from arriving together
+                delay = min(retry_delay * 2 ** (result.attempts - 1), MAX_RETRY_DELAY_SECONDS)
+                updates.append({
+                    "email_id": result.email_id,
+                    "next_attempt_at": now + datetime.timedelta(seconds=delay * random.uniform(0.8, 1.2)),
+                    "last_error": result.error[:ERROR_PREVIEW_LENGTH],
+                })
+
+        # Rows sharing the same keys are sent as one executemany
+        for keys in {tuple(values) for values in updates}:
+            await self.db.execute(update(EmailOutbox), [values for values in updates if tuple(values) == keys])
+        await self.db.commit()
+
+    # Queue depth for the metrics endpoint
+    async def queue_stats(self) -> dict:
+        now = utc_now()
+        pending = EmailOutbox.status == EmailStatus.pending
+        result = await self.db.execute(
+            select(
+                func.sum(case((pending, 1), else_=0)),
+                func.sum(case((pending & (EmailOutbox.next_attempt_at <= now), 1), else_=0)),
+                func.sum(case((EmailOutbox.status == EmailStatus.failed, 1), else_=0)),
+                func.min(case((pending, EmailOutbox.created_at))),
+            )
+            # Sent rows are left out so the count stays on the status index
+            .where(EmailOutbox.status.in_([EmailStatus.pending, EmailStatus.failed]))
+        )
+        pending_count, due_count, failed_count, oldest_pending = result.one()
+        return {
+            "pending": int(pending_count or 0),
+            "due": int(due_count or 0),
+            "failed": int(failed_count or 0),
+            "oldest_pending_age": (now - oldest_pending).total_seconds() if oldest_pending else None,
+        }
@@ -0,0 +1,33 @@
+from sqlalchemy.orm import joinedload, selectinload
+from modules.user.models import (
+    Appointment,
+    Appointment_TimeSlot,
+    Barber,
+    Schedule,
+)
+
+'''
+Named loader plans for the response schemas.
+Relationships are not eagerly loaded by default, so every query that builds a
+response asks for exactly the relationships that response needs with .options(*PLAN).
+'''
+
+# BarberResponse: the barber's user
+BARBER_RESPONSE = (
+    joinedload(Barber.user),
+)
+
+# ScheduleResponse: the schedule's time slots and its barber's user
+SCHEDULE_RESPONSE = (
+    selectinload(Schedule.time_slots),
+    joinedload(Schedule.barber).joinedload(Barber.user),
+)
+
+# AppointmentResponse: user, barber's user, booked time slots and the ids of its services.
+# The services themselves come from the service catalog, see AppointmentOperations.to_responses
+APPOINTMENT_RESPONSE = (
+    joinedload(Appointment.user),
+    joinedload(Appointment.barber).joinedload(Barber.user),
+    selectinload(Appointment.appointment_time_slots).joinedload(Appointment_TimeSlot.time_slot),
+    selectinload(Appointment.appointment_services),
+)
@@ -4,6 +4,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from modules.message_schema import MessageActiveUpdate, MessageCreate, MessageResponse
 from modules.user.models import Message, Thread
+from operations.cache_versions import THREADS_VERSION, bump_versions
 from sqlalchemy.exc import SQLAlchemyError
 
 logger = logging.getLogger("message_operations")
@@ -36,6 +37,7 @@ class MessageOperations:
             )
 
             self.db.add(new_message)
+            await bump_versions(self.db, THREADS_VERSION)
             await self.db.commit()
             await self.db.refresh(new_message)
 
@@ -64,6 +66,7 @@ class MessageOperations:
             
             # Update the boolean using boolean provided in message_update argument
             message_result.hasActiveMessage = message_update.hasActiveMessage
+            await bump_versions(self.db, THREADS_VERSION)
 
             await self.db.commit()
             await self.db.refresh(message_result)
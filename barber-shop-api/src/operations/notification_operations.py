@@ -0,0 +1,223 @@
+import datetime
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from core.config import settings
+from core.email_templates import email_templates
+from modules.user.models import (
+    Appointment,
+    AppointmentReminder,
+    AppointmentStatus,
+    Appointment_TimeSlot,
+    Barber,
+    ReminderStatus,
+    Schedule,
+    TimeSlot,
+    User,
+)
+from operations.email_outbox_operations import EmailOutboxOperations, utc_now
+
+logger = logging.getLogger("notification_operations")
+logger.setLevel(logging.ERROR)
+
+# Appointments that still get reminders and cancellation emails
+UPCOMING_STATUSES = frozenset({AppointmentStatus.pending, AppointmentStatus.confirmed})
+
+
+class AppointmentDetails(NamedTuple):
+    appointment_id: int
+    status: AppointmentStatus
+    recipient: str
+    first_name: str
+    barber_name: str
+    # Start of the first booked slot, in the shop's timezone without a tzinfo, as schedules are stored
+    starts_at: datetime.datetime
+
+    # Schedules are kept in the configured shop timezone whatever the server's own timezone is
+    @property
+    def starts_at_utc(self) -> datetime.datetime:
+        local = self.starts_at.replace(tzinfo=settings.get_config().shop_timezone)
+        return local.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+'''
+Appointment emails.
+
+The emails are rendered from the appointment_* email templates. Confirmation, change and
+cancellation emails are written to the email outbox in the same transaction as the
+appointment change. Reminders are kept in the appointment_reminder table until they are
+due, then the notification scheduler moves them to the outbox.
+'''
+class NotificationOperations:
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # Loads what the emails of the appointments need in one query, appointments without slots are left out
+    async def load_details(self, appointment_ids: Iterable[int]) -> Dict[int, AppointmentDetails]:
+        appointment_ids = sorted(set(appointment_ids))
+        if not appointment_ids:
+            return {}
+
+        barber_user = aliased(User)
+        result = await self.db.execute(
+            select(
+                Appointment.appointment_id,
+                Appointment.status,
+                Appointment.appointment_date,
+                User.email,
+                User.firstName,
+                barber_user.firstName,
+                barber_user.lastName,
+                func.min(TimeSlot.start_time),
+            )
+            .join(User, User.user_id == Appointment.user_id)
+            .join(Barber, Barber.barber_id == Appointment.barber_id)
+            .join(barber_user, barber_user.user_id == Barber.user_id)
+            .join(Appointment_TimeSlot, Appointment_TimeSlot.appointment_id == Appointment.appointment_id)
+            .join(TimeSlot, TimeSlot.slot_id == Appointment_TimeSlot.slot_id)
+            # The appointment date is the date of its first slot
+            .join(Schedule, and_(Schedule.schedule_id == TimeSlot.schedule_id, Schedule.date == Appointment.appointment_date))
+            .where(Appointment.appointment_id.in_(appointment_ids))
+            .group_by(
+                Appointment.appointment_id,
+                Appointment.status,
+                Appointment.appointment_date,
+                User.email,
+                User.firstName,
+                barber_user.firstName,
+                barber_user.lastName,
+            )
+        )
+        return {
+            row[0]: AppointmentDetails(
+                appointment_id=row[0],
+                status=row[1],
+                recipient=row[3],
+                first_name=row[4],
+                barber_name=f"{row[5]} {row[6]}",
+                starts_at=datetime.datetime.combine(row[2], row[7]),
+            )
+            for row in result.all()
+        }
+
+    # Renders the appointment_<kind> email template for each appointment and queues the emails
+    # in the outbox, they are sent once the caller commits
+    def queue_emails(self, kind: str, appointments: List[AppointmentDetails]):
+        emails = email_templates.render_many(
+            f"appointment_{kind}", [appointment._asdict() for appointment in appointments]
+        )
+        outbox_ops = EmailOutboxOperations(self.db)
+        for appointment, email in zip(appointments, emails):
+            outbox_ops.add_email(appointment.recipient, email.subject, email.body)
+
+    def queue_email(self, kind: str, details: AppointmentDetails):
+        self.queue_emails(kind, [details])
+
+    # Queues the confirmation of a new appointment and schedules its reminder
+    # Returns when the reminder is due, if one was scheduled
+    async def appointment_booked(self, appointment_id: int) -> Optional[datetime.datetime]:
+        details = (await self.load_details([appointment_id])).get(appointment_id)
+        if details is None:
+            return None
+
+        self.queue_email("booked", details)
+        return await self.schedule_reminder(details)
+
+    # Queues the email of a changed appointment and keeps its reminder in step
+    # Returns when the rescheduled reminder is due, if one was scheduled
+    async def appointment_changed(self, appointment_id: int, status_changed: bool, rescheduled: bool) -> Optional[datetime.datetime]:
+        details = (await self.load_details([appointment_id])).get(appointment_id)
+        if details is None:
+            return None
+
+        if details.status not in UPCOMING_STATUSES:
+            await self.cancel_reminders(appointment_id)
+            if status_changed and details.status == AppointmentStatus.canceled:
+                self.queue_email("cancelled", details)
+            return None
+
+        if rescheduled:
+            self.queue_email("rescheduled", details)
+            return await self.schedule_reminder(details)
+        if status_changed and details.status == AppointmentStatus.confirmed:
+            self.queue_email("confirmed", details)
+        return None
+
+    # Queues the cancellation of an appointment about to be deleted and drops its reminders
+    async def appointment_deleted(self, appointment_id: int):
+        details = (await self.load_details([appointment_id])).get(appointment_id)
+        await self.cancel_reminders(appointment_id)
+        if details is not None and details.status in UPCOMING_STATUSES and details.starts_at_utc > utc_now():
+            self.queue_email("cancelled", details)
+
+    # Replaces the pending reminder of an appointment, none is kept when the appointment
+    # already starts within the reminder window, its confirmation is enough
+    async def schedule_reminder(self, details: AppointmentDetails) -> Optional[datetime.datetime]:
+        await self.cancel_reminders(details.appointment_id)
+
+        send_at = details.starts_at_utc - datetime.timedelta(hours=settings.get_config().appointment_reminder_hours)
+        if send_at <= utc_now():
+            return None
+
+        self.db.add(AppointmentReminder(
+            appointment_id=details.appointment_id,
+            send_at=send_at,
+            status=ReminderStatus.pending,
+        ))
+        return send_at
+
+    async def cancel_reminders(self, appointment_id: int):
+        await self.db.execute(
+            delete(AppointmentReminder).where(
+                AppointmentReminder.appointment_id == appointment_id,
+                AppointmentReminder.status == ReminderStatus.pending,
+            )
+        )
+
+    # Due times of the next pending reminders, including overdue ones
+    async def upcoming_send_times(self, limit: int) -> List[datetime.datetime]:
+        result = await self.db.execute(
+            select(AppointmentReminder.send_at)
+            .where(AppointmentReminder.status == ReminderStatus.pending)
+            .order_by(AppointmentReminder.send_at)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    # Moves up to limit due reminders to the email outbox in one transaction, returns how many were claimed
+    # Reminders locked by another worker are skipped, so workers can share the load without duplicates
+    async def enqueue_due_reminders(self, limit: int) -> int:
+        now = utc_now()
+        result = await self.db.execute(
+            select(AppointmentReminder.reminder_id, AppointmentReminder.appointment_id)
+            .where(AppointmentReminder.status == ReminderStatus.pending, AppointmentReminder.send_at <= now)
+            .order_by(AppointmentReminder.send_at, AppointmentReminder.reminder_id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        reminders = result.all()
+        if not reminders:
+            await self.db.commit()
+            return 0
+
+        details = await self.load_details(reminder.appointment_id for reminder in reminders)
+        updates = []
+        upcoming = []
+        for reminder in reminders:
+            appointment = details.get(reminder.appointment_id)
+            if appointment is not None and appointment.status in UPCOMING_STATUSES and appointment.starts_at_utc > now:
+                upcoming.append(appointment)
+                updates.append({"reminder_id": reminder.reminder_id, "status": ReminderStatus.sent})
+            else:
+                updates.append({"reminder_id": reminder.reminder_id, "status": ReminderStatus.skipped})
+
+        if upcoming:
+            self.queue_emails("reminder", upcoming)
+        await self.db.execute(update(AppointmentReminder), updates)
+        await self.db.commit()
+        return len(reminders)
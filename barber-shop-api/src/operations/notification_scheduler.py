@@ -0,0 +1,130 @@
+import asyncio
+import contextlib
+import datetime
+import heapq
+import logging
+import time
+from typing import List, Optional
+
+from core.db import async_session_manager
+from operations.email_dispatcher import email_dispatcher
+from operations.email_outbox_operations import utc_now
+from operations.notification_operations import NotificationOperations
+
+logger = logging.getLogger("notification_scheduler")
+logger.setLevel(logging.ERROR)
+
+# Reminders moved to the outbox per transaction
+CLAIM_BATCH_SIZE = 200
+
+# How many of the next due times are kept in memory
+HEAP_SIZE = 1000
+
+# How often the due times are reloaded, to pick up reminders scheduled by other workers
+REFRESH_INTERVAL_SECONDS = 60.0
+
+# Shortest sleep between two passes
+MIN_WAIT_SECONDS = 1.0
+
+'''
+Sends appointment reminders when they are due.
+
+Each worker keeps a heap of the next reminder due times, reloaded from the database every
+refresh interval and extended by the reminders this worker schedules itself. It sleeps until
+the earliest one, then claims every due reminder from the database in batches. The claim
+skips rows other workers have locked, so the heap only decides when to look, never what to send.
+'''
+class NotificationScheduler:
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._heap: List[datetime.datetime] = []
+        self._refreshed_at: Optional[float] = None
+
+        self.refreshes = 0
+        self.batches = 0
+        self.claimed = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    # Adds the due time of a reminder written by this worker, once its transaction is committed
+    def schedule(self, send_at: Optional[datetime.datetime]):
+        if send_at is None:
+            return
+        earliest = not self._heap or send_at < self._heap[0]
+        heapq.heappush(self._heap, send_at)
+        if earliest:
+            self._wakeup.set()
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= REFRESH_INTERVAL_SECONDS:
+                    await self.refresh()
+                if self._heap and self._heap[0] <= utc_now():
+                    await self.dispatch_due()
+            except Exception as e:
+                logger.error(e)
+                self.last_error = str(e)
+
+            timeout = REFRESH_INTERVAL_SECONDS - (time.monotonic() - (self._refreshed_at or time.monotonic()))
+            if self._heap:
+                timeout = min(timeout, (self._heap[0] - utc_now()).total_seconds())
+            # Due times another worker is still sending stay in the heap until the next reload,
+            # the floor keeps them from spinning this loop
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, MIN_WAIT_SECONDS))
+
+    async def refresh(self):
+        async with async_session_manager.session() as session:
+            send_times = await NotificationOperations(session).upcoming_send_times(HEAP_SIZE)
+        # Sorted, so already a heap
+        self._heap = send_times
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+
+    # Moves every due reminder to the email outbox
+    async def dispatch_due(self):
+        now = utc_now()
+        while self._heap and self._heap[0] <= now:
+            heapq.heappop(self._heap)
+
+        claimed = CLAIM_BATCH_SIZE
+        while claimed == CLAIM_BATCH_SIZE:
+            async with async_session_manager.session() as session:
+                claimed = await NotificationOperations(session).enqueue_due_reminders(CLAIM_BATCH_SIZE)
+            self.batches += 1
+            self.claimed += claimed
+            if claimed:
+                email_dispatcher.notify()
+
+        # The heap held at most HEAP_SIZE times, reload once it runs dry
+        if not self._heap:
+            await self.refresh()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "heap_size": len(self._heap),
+            "next_due": self._heap[0].isoformat() if self._heap else None,
+            "refreshes": self.refreshes,
+            "batches": self.batches,
+            "claimed": self.claimed,
+            "last_error": self.last_error,
+        }
+
+
+notification_scheduler = NotificationScheduler()
@@ -1,19 +1,39 @@
 import datetime
 
+from sqlalchemy import delete, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
-from modules.user.models import Schedule, TimeSlot
+from modules.user.models import Barber, Schedule, TimeSlot
 from modules.schedule_schema import ScheduleCreate, ScheduleUpdate
+from modules.roster_schema import RosterCreate, RosterResponse
 from modules.time_slot_schema import TimeSlotUpdate
 from typing import List, Optional
 from fastapi import HTTPException
 from datetime import time
 import logging
+from operations.loader_options import SCHEDULE_RESPONSE
+from core.pagination import after_key
+from operations.barber_operations import barber_list_cache
+from operations.availability_operations import AvailabilityOperations
 
 
 logger = logging.getLogger("schedule_operations")
 logger.setLevel(logging.ERROR)
+
+# Most schedules a single roster request may expand to
+MAX_ROSTER_SCHEDULES = 20000
+
+
+# Parses the "H:MM" or "HH:MM:SS" strings the time slot endpoints accept
+def parse_time(value: str) -> time:
+    for time_format in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.datetime.strptime(value, time_format).time()
+        except ValueError:
+            continue
+    raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+
 """
 CRUD operations for interacting with the schedule database table
 """
@@ -26,26 +46,35 @@ class ScheduleOperations:
     # Create a new schedule block
     async def create_schedule(self, schedule_data: ScheduleCreate) -> Schedule:
         try:
+            # The schedule, its slots and the summary refresh share one transaction.
+            # The schedule row is locked by its own insert before any slot is written, see AvailabilityOperations
             new_schedule = Schedule(**schedule_data.model_dump(exclude={"time_slots"}))
             self.db.add(new_schedule)
-            await self.db.commit()
-            await self.db.refresh(new_schedule)
+            await self.db.flush()
 
-            # Create time slots for the schedule, each 30 minutes
-            # starting from 9:00 AM to 5:00 PM
             for time_slot in schedule_data.time_slots:
                 self.db.add(
                     TimeSlot(
                         schedule_id=new_schedule.schedule_id,
-                        start_time=time_slot.start_time,
-                        end_time=time_slot.end_time,
+                        start_time=parse_time(time_slot.start_time),
+                        end_time=parse_time(time_slot.end_time),
                         is_available=time_slot.is_available,
                     )
                 )
+            schedule_id = new_schedule.schedule_id
+            await self.db.flush()
+            await AvailabilityOperations(self.db).refresh_days(
+                [(new_schedule.barber_id, new_schedule.date)]
+            )
             await self.db.commit()
-            await self.db.refresh(new_schedule)
 
-            return new_schedule
+            # Barber listings filtered by date depend on the schedules
+            barber_list_cache.invalidate()
+
+            return await self.get_schedule_by_id(schedule_id)
+        except HTTPException:
+            await self.db.rollback()
+            raise
         except SQLAlchemyError as e:
             logger.error(e)
             await self.db.rollback()
@@ -55,11 +84,31 @@ class ScheduleOperations:
             )
 
     # Get all schedule blocks
-    async def get_all_schedules(self, page: int, limit: int, schedule_date: datetime.date = None, barber_id: int = None) -> List[Schedule]:
+    async def get_all_schedules(
+        self,
+        page: int,
+        limit: int,
+        schedule_date: datetime.date = None,
+        barber_id: int = None,
+        after: Optional[list] = None,
+    ) -> List[Schedule]:
         try:
-            # Calculate offset for SQL query
-            offset = (page - 1) * limit
-            select_query = select(Schedule).limit(limit).offset(offset)
+            select_query = (
+                select(Schedule)
+                .options(*SCHEDULE_RESPONSE)
+                .order_by(Schedule.date, Schedule.schedule_id)
+                .limit(limit)
+            )
+
+            # Continue after the (date, schedule_id) of the cursor when given,
+            # otherwise calculate offset for SQL query. Schedule dates are never NULL
+            if after:
+                last_date, last_id = after
+                select_query = select_query.filter(
+                    after_key((Schedule.date, Schedule.schedule_id), (datetime.date.fromisoformat(last_date), last_id))
+                )
+            else:
+                select_query = select_query.offset((page - 1) * limit)
             if schedule_date:
                 select_query = select_query.filter(Schedule.date == schedule_date)
             if barber_id:
@@ -78,8 +127,9 @@ class ScheduleOperations:
         try:
             result = await self.db.execute(
                 select(Schedule)
-                .join(TimeSlot)
                 .filter(Schedule.schedule_id == schedule_id)
+                .options(*SCHEDULE_RESPONSE)
+                .execution_options(populate_existing=True)
             )
             return result.scalars().first()
         except SQLAlchemyError as e:
@@ -90,49 +140,39 @@ class ScheduleOperations:
             )
 
     # Update an existing schedule block
+    # When time_slots is given it is the schedule's full slot list: listed slots of this schedule
+    # are updated, the others listed are created and the schedule's unlisted slots are deleted
     async def update_schedule(
         self, schedule_id: int, schedule_data: ScheduleUpdate
     ) -> Optional[Schedule]:
         try:
+            # Locked before its slots, see AvailabilityOperations
             result = await self.db.execute(
-                select(Schedule).filter(Schedule.schedule_id == schedule_id)
+                select(Schedule).filter(Schedule.schedule_id == schedule_id).with_for_update()
             )
             schedule = result.scalars().first()
             if not schedule:
                 return None
 
-            for key, value in schedule_data.model_dump(exclude_unset=True).items():
-                if key == "time_slots":
-                    # Update time slots if provided
-                    for time_slot in value:
-                        time_slot = TimeSlotUpdate(**time_slot)
-                        existing_time_slot = (
-                            await self.db.execute(
-                                select(TimeSlot)
-                                .filter(
-                                    TimeSlot.slot_id == time_slot.slot_id,
-                                    TimeSlot.schedule_id == schedule_id,
-                                )
-                            )
-                        ).scalars().first()
-                        if existing_time_slot:
-                            existing_time_slot.start_time = time_slot.start_time
-                            existing_time_slot.end_time = time_slot.end_time
-                            existing_time_slot.is_available = time_slot.is_available
-                        else:
-                            new_time_slot = TimeSlot(
-                                schedule_id=schedule.schedule_id,
-                                start_time=time_slot.start_time,
-                                end_time=time_slot.end_time,
-                                is_available=time_slot.is_available,
-                            )
-                            self.db.add(new_time_slot)
-                else:
-                    setattr(schedule, key, value)
+            # The day the schedule covered before the update needs its summary refreshed too
+            days = {(schedule.barber_id, schedule.date)}
+
+            for key, value in schedule_data.model_dump(exclude_unset=True, exclude={"time_slots"}).items():
+                setattr(schedule, key, value)
+
+            if schedule_data.time_slots is not None:
+                await self.reconcile_time_slots(schedule_id, schedule_data.time_slots)
+
+            await self.db.flush()
+            days.add((schedule.barber_id, schedule.date))
+            await AvailabilityOperations(self.db).refresh_days(days)
 
             await self.db.commit()
-            await self.db.refresh(schedule)
-            return schedule
+            barber_list_cache.invalidate()
+            return await self.get_schedule_by_id(schedule_id)
+        except HTTPException:
+            await self.db.rollback()
+            raise
         except SQLAlchemyError as e:
             logger.error(e)
             await self.db.rollback()
@@ -141,21 +181,281 @@ class ScheduleOperations:
                 detail="An unexpected error occurred while updating the desired schedule block",
             )
 
+    # Brings the schedule's slots in line with the submitted list, in a fixed number of statements.
+    # The existing slots are read once and the inserts, updates and deletes are worked out in memory.
+    async def reconcile_time_slots(self, schedule_id: int, time_slots: List[TimeSlotUpdate]):
+        result = await self.db.execute(
+            select(
+                TimeSlot.slot_id,
+                TimeSlot.start_time,
+                TimeSlot.end_time,
+                TimeSlot.is_available,
+                TimeSlot.is_booked,
+            ).filter(TimeSlot.schedule_id == schedule_id)
+        )
+        existing = {row.slot_id: row for row in result.all()}
+
+        inserts = []
+        updates = []
+        listed_ids = set()
+        final_times = {}
+
+        for time_slot in time_slots:
+            fields = time_slot.model_dump(exclude_unset=True, exclude={"slot_id", "schedule_id"})
+            for key in ("start_time", "end_time"):
+                if key in fields:
+                    fields[key] = parse_time(fields[key])
+
+            if time_slot.slot_id is None:
+                # Slots without an ID are new ones
+                if "start_time" not in fields or "end_time" not in fields:
+                    raise HTTPException(status_code=400, detail="New time slots need a start_time and end_time")
+                if fields.get("is_available") is None:
+                    fields["is_available"] = True
+                inserts.append({"schedule_id": schedule_id, "is_booked": False, **fields})
+                times = (fields["start_time"], fields["end_time"])
+            else:
+                current = existing.get(time_slot.slot_id)
+                if current is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Time slot {time_slot.slot_id} does not belong to schedule {schedule_id}",
+                    )
+                if time_slot.slot_id in listed_ids:
+                    raise HTTPException(status_code=400, detail=f"Time slot {time_slot.slot_id} is listed more than once")
+                listed_ids.add(time_slot.slot_id)
+
+                changes = {
+                    key: value for key, value in fields.items()
+                    if value is not None and value != getattr(current, key)
+                }
+                if changes and current.is_booked:
+                    raise HTTPException(status_code=409, detail=f"Time slot {current.slot_id} is booked and cannot be modified")
+                if changes:
+                    updates.append({"slot_id": current.slot_id, **changes})
+                times = (changes.get("start_time", current.start_time), changes.get("end_time", current.end_time))
+
+            if times[1] <= times[0]:
+                raise HTTPException(status_code=400, detail="A time slot's end_time must be after its start_time")
+            if times in final_times:
+                raise HTTPException(status_code=400, detail=f"More than one time slot from {times[0]} to {times[1]}")
+            final_times[times] = True
+
+        deletes = [slot_id for slot_id in existing if slot_id not in listed_ids]
+        booked = [slot_id for slot_id in deletes if existing[slot_id].is_booked]
+        if booked:
+            raise HTTPException(status_code=409, detail=f"Booked time slots cannot be removed: {booked}")
+
+        # Deletes go first so a slot can be replaced by a new one with the same times
+        if deletes:
+            await self.db.execute(delete(TimeSlot).where(TimeSlot.slot_id.in_(deletes)))
+        if updates:
+            await self.db.execute(update(TimeSlot), updates)
+        if inserts:
+            await self.db.execute(insert(TimeSlot), inserts)
+
     # Delete a schedule block by id
     async def delete_schedule(self, schedule_id: int) -> bool:
         try:
+            day = (
+                await self.db.execute(
+                    select(Schedule.barber_id, Schedule.date)
+                    .filter(Schedule.schedule_id == schedule_id)
+                    .with_for_update()
+                )
+            ).first()
+            if day is None:
+                return False
+
+            # Time slots and their appointment links are removed by the database's ON DELETE CASCADE
             result = await self.db.execute(
-                select(Schedule).filter(Schedule.schedule_id == schedule_id)
+                delete(Schedule).where(Schedule.schedule_id == schedule_id)
             )
-            schedule = result.scalars().first()
-            if not schedule:
-                return False
-            await self.db.delete(schedule)
+            await AvailabilityOperations(self.db).refresh_days([tuple(day)])
             await self.db.commit()
-            return True
+            barber_list_cache.invalidate()
+            return result.rowcount > 0
         except SQLAlchemyError as e:
             logger.error(e)
             raise HTTPException(
                 status_code=500,
                 detail="An unexpected error occurred while deleting the desired schedule block",
             )
+
+    # Expand roster rules into schedules and time slots and insert the missing ones in bulk.
+    # Schedules and slots that already exist are skipped, so posting the same roster twice is a no-op.
+    async def generate_roster(self, roster: RosterCreate) -> RosterResponse:
+        days = self.expand_roster(roster)
+        if len(days) > MAX_ROSTER_SCHEDULES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A roster may create at most {MAX_ROSTER_SCHEDULES} schedules",
+            )
+        if not days:
+            return RosterResponse(schedules_inserted=0, schedules_skipped=0, time_slots_inserted=0, time_slots_skipped=0)
+
+        barber_ids = {barber_id for barber_id, _ in days}
+        first_date = min(date for _, date in days)
+        last_date = max(date for _, date in days)
+
+        try:
+            found = await self.db.execute(select(Barber.barber_id).filter(Barber.barber_id.in_(barber_ids)))
+            missing = barber_ids - set(found.scalars().all())
+            if missing:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"No barber found with IDs: {sorted(missing)}",
+                )
+
+            def in_roster_range(query):
+                return query.filter(
+                    Schedule.barber_id.in_(barber_ids),
+                    Schedule.date.between(first_date, last_date),
+                )
+
+            # Insert the schedules the roster adds, IGNORE keeps concurrent requests from failing on uq_barber_date
+            # The existing schedules are locked before their slots are read and the summary refreshed,
+            # see AvailabilityOperations
+            existing = await self.db.execute(
+                in_roster_range(select(Schedule.barber_id, Schedule.date))
+                .order_by(Schedule.schedule_id)
+                .with_for_update()
+            )
+            existing_days = {tuple(row) for row in existing.all()}
+            new_schedules = [
+                {"barber_id": barber_id, "date": date, "is_working": True}
+                for barber_id, date in days
+                if (barber_id, date) not in existing_days
+            ]
+            # IGNORE drops the rows a concurrent roster inserted first, so the counts come from the database.
+            # The inserts go through the tables, ORM bulk inserts do not report a rowcount
+            schedules_inserted = 0
+            if new_schedules:
+                result = await self.db.execute(insert(Schedule.__table__).prefix_with("IGNORE", dialect="mysql"), new_schedules)
+                schedules_inserted = result.rowcount
+
+            # Read back the ids of every schedule of the roster and the slots they already have
+            schedules = await self.db.execute(
+                in_roster_range(select(Schedule.schedule_id, Schedule.barber_id, Schedule.date, Schedule.is_working))
+            )
+            schedule_ids = {}
+            days_off = set()
+            for schedule_id, barber_id, date, is_working in schedules.all():
+                schedule_ids[(barber_id, date)] = schedule_id
+                if not is_working:
+                    days_off.add(schedule_id)
+
+            slots = await self.db.execute(
+                in_roster_range(
+                    select(TimeSlot.schedule_id, TimeSlot.start_time, TimeSlot.end_time)
+                    .join(Schedule, Schedule.schedule_id == TimeSlot.schedule_id)
+                )
+            )
+            existing_slots: dict[int, list[tuple[time, time]]] = {}
+            for schedule_id, start_time, end_time in slots.all():
+                existing_slots.setdefault(schedule_id, []).append((start_time, end_time))
+
+            # Days already marked off keep no slots, and slots overlapping one the schedule already has are skipped
+            new_slots = []
+            slots_skipped = 0
+            for key, day_slots in days.items():
+                schedule_id = schedule_ids[key]
+                if schedule_id in days_off:
+                    slots_skipped += len(day_slots)
+                    continue
+                taken = existing_slots.get(schedule_id, [])
+                for start_time, end_time in day_slots:
+                    if any(start_time < taken_end and taken_start < end_time for taken_start, taken_end in taken):
+                        slots_skipped += 1
+                        continue
+                    new_slots.append({
+                        "schedule_id": schedule_id,
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "is_available": True,
+                        "is_booked": False,
+                    })
+            time_slots_inserted = 0
+            if new_slots:
+                result = await self.db.execute(insert(TimeSlot.__table__).prefix_with("IGNORE", dialect="mysql"), new_slots)
+                time_slots_inserted = result.rowcount
+
+            await AvailabilityOperations(self.db).refresh_range(first_date, last_date, barber_ids)
+            await self.db.commit()
+            barber_list_cache.invalidate()
+
+            return RosterResponse(
+                schedules_inserted=schedules_inserted,
+                schedules_skipped=len(days) - schedules_inserted,
+                time_slots_inserted=time_slots_inserted,
+                time_slots_skipped=slots_skipped + len(new_slots) - time_slots_inserted,
+            )
+        except HTTPException:
+            await self.db.rollback()
+            raise
+        except SQLAlchemyError as e:
+            logger.error(e)
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred during roster generation",
+            )
+
+    # Expands the roster into the slots of each (barber_id, date) to work, later rules overriding earlier ones
+    @staticmethod
+    def expand_roster(roster: RosterCreate) -> dict[tuple[int, datetime.date], list[tuple[time, time]]]:
+        hours: dict[tuple[int, datetime.date], tuple[time, time, int]] = {}
+
+        for rule in roster.rules:
+            if rule.end_date < rule.start_date:
+                raise HTTPException(status_code=400, detail="A roster rule's end_date must not be before its start_date")
+            if rule.close_time <= rule.open_time:
+                raise HTTPException(status_code=400, detail="A roster rule's close_time must be after its open_time")
+
+            weekdays = set(rule.weekdays)
+            for offset in range((rule.end_date - rule.start_date).days + 1):
+                date = rule.start_date + datetime.timedelta(days=offset)
+                if date.weekday() in weekdays:
+                    for barber_id in rule.barber_ids:
+                        hours[(barber_id, date)] = (rule.open_time, rule.close_time, rule.slot_minutes)
+
+                if len(hours) > MAX_ROSTER_SCHEDULES:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"A roster may create at most {MAX_ROSTER_SCHEDULES} schedules",
+                    )
+
+        for exception in roster.exceptions:
+            if (exception.open_time is None) != (exception.close_time is None):
+                raise HTTPException(status_code=400, detail="A roster exception needs both open_time and close_time, or neither")
+            if exception.open_time is not None and exception.close_time <= exception.open_time:
+                raise HTTPException(status_code=400, detail="A roster exception's close_time must be after its open_time")
+
+            keys = [
+                key for key in hours
+                if key[1] == exception.date and exception.barber_id in (None, key[0])
+            ]
+            for key in keys:
+                if exception.open_time is None:
+                    del hours[key]
+                else:
+                    hours[key] = (exception.open_time, exception.close_time, hours[key][2])
+
+        return {
+            key: ScheduleOperations.split_into_slots(open_time, close_time, slot_minutes)
+            for key, (open_time, close_time, slot_minutes) in hours.items()
+        }
+
+    # Splits opening hours into back-to-back slots, dropping a trailing slot that would run past closing
+    @staticmethod
+    def split_into_slots(open_time: time, close_time: time, slot_minutes: int) -> list[tuple[time, time]]:
+        day = datetime.date.min
+        start = datetime.datetime.combine(day, open_time)
+        close = datetime.datetime.combine(day, close_time)
+        length = datetime.timedelta(minutes=slot_minutes)
+
+        slots = []
+        while start + length <= close:
+            slots.append((start.time(), (start + length).time()))
+            start += length
+        return slots
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from modules.user.models import Service
+from modules.user.service_schema import ServiceResponse
+from operations.cache_versions import bump_versions, read_versions
+
+# Name of the catalog's row in the cache_version table
+CATALOG_VERSION_NAME = "service_catalog"
+
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    services: tuple[ServiceResponse, ...]
+    by_id: dict[int, ServiceResponse]
+
+
+'''
+In-process copy of the service catalog.
+
+The catalog is a handful of rows read on every booking page, so each worker keeps the
+whole list in memory. Writers bump the catalog's counter in the cache_version table in
+the same transaction as their change. Workers compare their copy against that counter at
+most every check_interval seconds, and reload the list when it moved, so all workers
+converge on a change within that interval.
+'''
+class ServiceCatalog:
+
+    def __init__(self, check_interval: float = 2.0):
+        self.check_interval = check_interval
+
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+        self.version_checks = 0
+        self.reloads = 0
+
+    # Returns the current catalog, reloading it when another write moved its version
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot and time.monotonic() - self._checked_at < self.check_interval:
+                return snapshot
+
+            version = await self.read_version(db)
+            self.version_checks += 1
+            if snapshot is None or snapshot.version != version:
+                result = await db.execute(select(Service).order_by(Service.service_id))
+                services = tuple(service.to_response_schema() for service in result.scalars().all())
+                snapshot = CatalogSnapshot(
+                    version=version,
+                    services=services,
+                    by_id={service.service_id: service for service in services},
+                )
+                self._snapshot = snapshot
+                self.reloads += 1
+
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    # Moves the catalog version forward, in the caller's transaction
+    async def bump(self, db: AsyncSession):
+        await bump_versions(db, CATALOG_VERSION_NAME)
+
+    # Forces the next read to check the version, for the worker that made the write
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    @staticmethod
+    async def read_version(db: AsyncSession) -> int:
+        (version,) = await read_versions(db, CATALOG_VERSION_NAME)
+        return version
+
+    def stats(self) -> dict:
+        return {
+            "version": self._snapshot.version if self._snapshot else None,
+            "services": len(self._snapshot.services) if self._snapshot else 0,
+            "version_checks": self.version_checks,
+            "reloads": self.reloads,
+        }
+
+
+service_catalog = ServiceCatalog()
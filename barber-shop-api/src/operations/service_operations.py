@@ -1,10 +1,12 @@
-from typing import List
+import bisect
+from typing import List, Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from modules.user.models import Service
 from modules.user.service_schema import ServiceBase, ServiceResponse, ServiceUpdate
 from fastapi import HTTPException
+from operations.service_catalog import CatalogSnapshot, service_catalog
 import logging
 
 logger = logging.getLogger("service_operations")
@@ -22,7 +24,9 @@ class ServiceOperations:
         try:
             new_service = Service(**service.model_dump())
             self.db.add(new_service)
+            await service_catalog.bump(self.db)
             await self.db.commit()
+            service_catalog.invalidate()
             await self.db.refresh(new_service)
             return new_service
 
@@ -33,19 +37,27 @@ class ServiceOperations:
                 detail="An unexpected error occurred"
             )
         
-    async def get_all_services(self, page: int, limit: int) -> List[ServiceResponse]:
+    # Returns the service catalog, served from memory while its version has not moved
+    async def get_catalog(self) -> CatalogSnapshot:
         try:
-            # Calculate offset for pagination
-            offset = (page - 1) * limit
-
-            services = await self.db.execute(select(Service).limit(limit).offset(offset))
-            return services.scalars().all()
+            return await service_catalog.get(self.db)
         except SQLAlchemyError as e:
             logger.error(e)
             raise HTTPException(
                 status_code=500,
                 detail="An unexpected error occurred"
             )
+
+    async def get_all_services(self, page: int, limit: int, after: Optional[list] = None) -> List[ServiceResponse]:
+        services = (await self.get_catalog()).services
+
+        # Continue after the cursor when given, otherwise calculate offset for pagination
+        if after:
+            last_id = after[0]
+            start = bisect.bisect_right(services, last_id, key=lambda service: service.service_id)
+        else:
+            start = (page - 1) * limit
+        return list(services[start:start + limit])
     
     async def update_service(self, service_id: int, service_details: ServiceUpdate) -> ServiceResponse:
         try:
@@ -62,7 +74,9 @@ class ServiceOperations:
             for key, value in service_details.model_dump(exclude_unset=True).items():
                 setattr(service_to_update, key, value)
 
+            await service_catalog.bump(self.db)
             await self.db.commit()
+            service_catalog.invalidate()
             await self.db.refresh(service_to_update)
 
             return service_to_update
@@ -83,7 +97,9 @@ class ServiceOperations:
                 return False
 
             await self.db.delete(service_to_delete)
+            await service_catalog.bump(self.db)
             await self.db.commit()
+            service_catalog.invalidate()
             return True
         
         except SQLAlchemyError as e:
@@ -1,12 +1,15 @@
-from typing import List
+from typing import List, Optional
 from fastapi import HTTPException
-from sqlalchemy import or_, select
+from sqlalchemy import func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from modules.thread_schema import ThreadCreate, ThreadResponse
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 from modules.user.models import Message, Thread, User
 from modules.message_schema import MessageResponse
+from core.pagination import after_key
+from operations.cache_versions import THREADS_VERSION, bump_versions
 
 logger = logging.getLogger("thread_operations")
 logger.setLevel(logging.ERROR)
@@ -47,6 +50,7 @@ class ThreadOperations:
                 sendingUser=thread.sendingUser,
             )
             self.db.add(new_thread)
+            await bump_versions(self.db, THREADS_VERSION)
             await self.db.commit()
             await self.db.refresh(new_thread)
 
@@ -67,8 +71,10 @@ class ThreadOperations:
             )
     
     # Return threads were the user is both 'sendingUser' and 'recievingUser'
-    # in order to properly display both sides of the conversation
-    async def get_threads_by_user_id(self, logged_user_id: int, other_user_id: int, page: int, limit: int) -> List[ThreadResponse]:
+    # in order to properly display both sides of the conversation, each with its latest message_limit messages
+    async def get_threads_by_user_id(
+        self, logged_user_id: int, other_user_id: int, page: int, limit: int, message_limit: int, after: Optional[list] = None
+    ) -> List[ThreadResponse]:
         try:
             
             #Check to make sure both users IDs are valid
@@ -85,54 +91,30 @@ class ThreadOperations:
             other_user = await self.db.execute(select(User).filter(User.user_id == other_user_id))
             other_user_result = other_user.scalars().first()
 
-            if not other_user:
+            if not other_user_result:
                 raise HTTPException(
                     status_code=400,
                     detail=f"No user found with ID: {other_user_id}"
                 )
             
-            # Set offset based off page requested by client
-            offset = (page - 1) * limit
-            
             # Retrieve threads from DB for both users
 
-            threads = await self.db.execute(
-            select(Thread).filter(
-                    (
-                        (Thread.receivingUser == logged_user_id) & (Thread.sendingUser == other_user_id) |
-                        (Thread.receivingUser == other_user_id) & (Thread.sendingUser == logged_user_id)
-                    )
-                ).limit(limit).offset(offset)
-            )
-        
-            threads_results = threads.scalars().all()
-
-            thread_responses = []
-            
-            # Retrieve all messages from each threads
-
-            for thread in threads_results:
-           
-                messages = await self.db.execute(
-                    select(Message).filter(Message.thread_id == thread.thread_id)
+            query = select(Thread).filter(
+                (
+                    (Thread.receivingUser == logged_user_id) & (Thread.sendingUser == other_user_id) |
+                    (Thread.receivingUser == other_user_id) & (Thread.sendingUser == logged_user_id)
                 )
-                messages_results = messages.scalars().all()
-
+            ).order_by(Thread.thread_id).limit(limit)
 
-                 # Craft response, including thread details and all messages for each associated thread
+            # Continue after the cursor when given, otherwise set offset based off page requested by client
+            query = self.paginate_threads(query, page, limit, after)
+            threads = await self.db.execute(query)
+        
+            threads_results = threads.scalars().all()
 
-                thread_response = ThreadResponse(
-                    thread_id=thread.thread_id,
-                    receivingUser=thread.receivingUser,
-                    sendingUser=thread.sendingUser,
-                    messages=[MessageResponse.model_validate(message) for message in messages_results]
-                )
-                thread_responses.append(thread_response)
-            
-            return thread_responses
-            
+            # Retrieve the latest messages of every thread in a single query
+            return await self.build_thread_responses(threads_results, message_limit)
 
-        
         except SQLAlchemyError as e:
             logger.error(e)
             raise HTTPException(
@@ -140,7 +122,10 @@ class ThreadOperations:
                 detail="An unexpected error occurred during retrieval"
             )
     
-    async def get_all_threads_by_user_id(self, user_id: int, page: int, limit: int) -> List[ThreadResponse]:
+    # Returns a page of the user's threads, each with its latest message_limit messages
+    async def get_all_threads_by_user_id(
+        self, user_id: int, page: int, limit: int, message_limit: int, after: Optional[list] = None
+    ) -> List[ThreadResponse]:
         try:
             # Make sure user_id links to a valid user
             user = await self.db.execute(select(User).filter(User.user_id == user_id))
@@ -151,37 +136,16 @@ class ThreadOperations:
                     status_code=400,
                     detail=f"No user found with ID: {user_id}"
                 )
-            
-            threads = await self.db.execute(select(Thread).filter(
-                (Thread.receivingUser == user_id) | (Thread.sendingUser == user_id)
-            ))
 
-            thread_results = threads.scalars().all()
-            
-            thread_responses = []
-
-            # Set offset based off page requested by client
-            offset = (page - 1) * limit
-
-            for thread in thread_results:
-           
-                messages = await self.db.execute(
-                    select(Message).filter(Message.thread_id == thread.thread_id).limit(limit).offset(offset)
-                )
-                messages_results = messages.scalars().all()
-
-
-                 # Craft response, including thread details and all messages for each associated thread
+            query = (
+                select(Thread)
+                .filter((Thread.receivingUser == user_id) | (Thread.sendingUser == user_id))
+                .order_by(Thread.thread_id)
+                .limit(limit)
+            )
+            threads = await self.db.execute(self.paginate_threads(query, page, limit, after))
 
-                thread_response = ThreadResponse(
-                    thread_id=thread.thread_id,
-                    receivingUser=thread.receivingUser,
-                    sendingUser=thread.sendingUser,
-                    messages=[MessageResponse.model_validate(message) for message in messages_results]
-                )
-                thread_responses.append(thread_response)
-            
-            return thread_responses
+            return await self.build_thread_responses(threads.scalars().all(), message_limit)
 
         except SQLAlchemyError as e:
             logger.error(e)
@@ -189,3 +153,53 @@ class ThreadOperations:
                 status_code=500,
                 detail="An unexpected error occurred during retrieval"
             )
+
+    # Applies either the cursor or the page offset to a thread query ordered by thread_id
+    @staticmethod
+    def paginate_threads(query, page: int, limit: int, after: Optional[list]):
+        if after:
+            return query.filter(after_key((Thread.thread_id,), after))
+        return query.offset((page - 1) * limit)
+
+    # Builds the responses for a page of threads, fetching the messages of all of them in one query.
+    # Only the latest message_limit messages of each thread are kept, ranked in SQL with
+    # ROW_NUMBER() so threads with long histories are never loaded in full.
+    async def build_thread_responses(self, threads: List[Thread], message_limit: int) -> List[ThreadResponse]:
+        if not threads:
+            return []
+
+        thread_ids = [thread.thread_id for thread in threads]
+
+        ranked = (
+            select(
+                Message,
+                func.row_number().over(
+                    partition_by=Message.thread_id,
+                    order_by=Message.message_id.desc(),
+                ).label("position"),
+            )
+            .filter(Message.thread_id.in_(thread_ids))
+            .subquery()
+        )
+        latest_message = aliased(Message, ranked)
+        query = (
+            select(latest_message)
+            .filter(ranked.c.position <= message_limit)
+            .order_by(ranked.c.thread_id, ranked.c.message_id)
+        )
+
+        messages_by_thread: dict[int, list[MessageResponse]] = {thread_id: [] for thread_id in thread_ids}
+        messages = await self.db.execute(query)
+        for message in messages.scalars():
+            messages_by_thread[message.thread_id].append(MessageResponse.model_validate(message))
+
+        # Craft response, including thread details and the messages of each thread
+        return [
+            ThreadResponse(
+                thread_id=thread.thread_id,
+                receivingUser=thread.receivingUser,
+                sendingUser=thread.sendingUser,
+                messages=messages_by_thread[thread.thread_id],
+            )
+            for thread in threads
+        ]
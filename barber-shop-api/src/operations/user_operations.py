@@ -1,17 +1,153 @@
+import asyncio
+import csv
+import json
+from sqlalchemy import insert, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from modules.user.models import User
-from modules.user.user_schema import UserCreate
-from typing import List, Optional
+from modules.user.user_schema import UserCreate, UserImportError, UserImportResponse
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from fastapi import HTTPException
+from pydantic import ValidationError
 
 from auth.service import AuthService
+from core.config import settings
+from core.pagination import after_key
+from operations.barber_operations import barber_list_cache
+from operations.cache_versions import BARBERS_VERSION, SCHEDULES_VERSION, THREADS_VERSION, bump_versions
 import logging
 
 logger = logging.getLogger("user_operations")
 logger.setLevel(logging.ERROR)
 
+DUPLICATE_EMAIL_DETAIL = "A user already exists with the provided email"
+DUPLICATE_PHONE_DETAIL = "A user already exists with the provided phone number"
+
+# Users validated, registered and inserted together by the bulk import
+IMPORT_BATCH_SIZE = 500
+
+# Errors returned by the bulk import, the rest are only counted
+MAX_IMPORT_ERRORS = 100
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# Maps a unique constraint violation on the user table to the message of the duplicated column
+def integrity_error_response(error: IntegrityError) -> HTTPException:
+    # MySQL reports "Duplicate entry '<value>' for key '<index>'", only the index names the column
+    message = str(error.orig).rsplit(" for key ", 1)[-1]
+    if "phoneNumber" in message:
+        return HTTPException(status_code=400, detail=DUPLICATE_PHONE_DETAIL)
+    if "email" in message:
+        return HTTPException(status_code=400, detail=DUPLICATE_EMAIL_DETAIL)
+    logger.error(error)
+    return HTTPException(status_code=400, detail="The user conflicts with an existing user")
+
+# Splits streamed text into lines, each line keeps its "\n"
+async def iter_lines(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    pending = ""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+class MoreInputNeeded(Exception):
+    pass
+
+# The lines of the stream csv.reader has not consumed yet, appended as they arrive.
+# Running out in the middle of a record raises MoreInputNeeded rather than ending the input,
+# the record is parsed again from its first line once the next line is in
+class LineFeed:
+    def __init__(self):
+        self.lines: List[str] = []
+        self.position = 0
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.position == len(self.lines):
+            if self.finished:
+                raise StopIteration
+            raise MoreInputNeeded()
+        self.position += 1
+        return self.lines[self.position - 1]
+
+# Reads CSV records from the stream with one csv.reader, quoted fields may span lines
+# Yields the number of each record's first line with either its values or the reason it was rejected
+async def iter_csv_records(chunks: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[List[str]], Optional[str]]]:
+    feed = LineFeed()
+    reader = csv.reader(feed)
+    lines = iter_lines(chunks)
+    line_number = 1
+    while True:
+        feed.position = 0
+        try:
+            values, error = next(reader), None
+        except MoreInputNeeded:
+            try:
+                feed.lines.append(await anext(lines))
+            except StopAsyncIteration:
+                feed.finished = True
+            continue
+        except StopIteration:
+            return
+        except csv.Error as e:
+            values, error = None, f"Malformed line: {str(e)}"
+
+        # Blank lines are skipped
+        if error is not None or "".join(values).strip():
+            yield line_number, values, error
+        line_number += feed.position
+        del feed.lines[:feed.position]
+
+# Reads the objects of a JSON Lines stream
+# Yields the line number with either the object or the reason the line was rejected
+async def iter_json_records(chunks: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Malformed line: {str(e)}"
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, "Expected a JSON object"
+        else:
+            yield line_number, data, None
+
+# Parses a CSV (with a header line) or JSON Lines import, streamed as text, into users
+# Yields the line number with either the user or the reason the line was rejected
+async def parse_import(chunks: AsyncIterator[str], format: str) -> AsyncIterator[Tuple[int, Optional[UserCreate], Optional[str]]]:
+    header = None
+    records = iter_csv_records(chunks) if format == "csv" else iter_json_records(chunks)
+    async for line_number, data, error in records:
+        if error is None and format == "csv":
+            if header is None:
+                header = [name.strip() for name in data]
+                continue
+            if len(data) != len(header):
+                error = f"Expected {len(header)} columns, got {len(data)}"
+            else:
+                data = dict(zip(header, data))
+        if error is not None:
+            yield line_number, None, error
+            continue
+
+        try:
+            yield line_number, UserCreate.model_validate(data), None
+        except ValidationError as e:
+            yield line_number, None, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+
 '''
 CRUD operations for interacting with users database table
 '''
@@ -21,41 +157,29 @@ class UserOperations:
 
     # Create a user
     async def create_user(self, user_data: UserCreate) -> User:
-        
-        '''
-        Checking for three most common errors:
-        A phone number or email already exists, or phone number is greater than 10 digits
-        '''
-        existing_user_email = await self.db.execute(select(User).filter(User.email == user_data.email))
 
-        if existing_user_email.scalars().first():
-            raise HTTPException(
-                status_code=400,
-                detail="A user already exists with the provided email"
-            )
-        
-        existing_user_phone = await self.db.execute(select(User).filter(User.phoneNumber == user_data.phoneNumber))
-
-        if existing_user_phone.scalars().first():
-            raise HTTPException(
-                status_code=400,
-                detail="A user already exists with the provided phone number"
-            )
-        
         if len(user_data.phoneNumber) > 10:
             raise HTTPException(
                 status_code=400,
                 detail="Phone number must be 10 digits or less"
             )
 
+        # Checked before registering with Keycloak, the unique constraints catch any user created since
+        await self.check_unique(user_data.email, user_data.phoneNumber)
+        # Ends the read so the connection goes back to the pool while Keycloak is called
+        await self.db.commit()
+
         try:
             # Creates a new user
             new_user = User(**user_data.model_dump())
             try:
-                kc_id = AuthService.register_kc_user(new_user)
+                kc_id = await AuthService.register_kc_user(new_user)
                 if not kc_id:
                     raise HTTPException(status_code=400, detail="Keycloak user creation has failed")
                 new_user.kc_id = kc_id
+            # Keeps the status AuthService chose, a 504 when Keycloak timed out
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(
                     status_code=400,
@@ -66,6 +190,11 @@ class UserOperations:
             await self.db.refresh(new_user)
             
             return new_user
+        except IntegrityError as e:
+            await self.db.rollback()
+            # The Keycloak user would be left without a user row
+            await self.delete_orphaned_kc_users([user_data.email])
+            raise integrity_error_response(e)
         # If another error is returned that was somehow not caught above, return generic error message.
         except SQLAlchemyError as e:
             logger.error(e)
@@ -75,14 +204,196 @@ class UserOperations:
                 detail=f"An unexpected error occurred: {str(e)}"
             )
 
+    # Raises a 400 if another user has the email or phone number, in one query
+    # The user being updated is excluded, so keeping their own email or phone number is not a conflict
+    async def check_unique(self, email: Optional[str], phone_number: Optional[str], exclude_user_id: Optional[int] = None):
+        conditions = []
+        if email:
+            conditions.append(User.email == email)
+        if phone_number:
+            conditions.append(User.phoneNumber == phone_number)
+        if not conditions:
+            return
+
+        query = select(User.email, User.phoneNumber).filter(or_(*conditions)).limit(2)
+        if exclude_user_id is not None:
+            query = query.filter(User.user_id != exclude_user_id)
+
+        try:
+            result = await self.db.execute(query)
+            conflicts = result.all()
+        except SQLAlchemyError as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred"
+            )
+
+        # Emails are compared by the database collation, so a row that did not match on the
+        # phone number matched on the email
+        if email and any(
+            conflict.email.lower() == email.lower() or conflict.phoneNumber != phone_number
+            for conflict in conflicts
+        ):
+            raise HTTPException(status_code=400, detail=DUPLICATE_EMAIL_DETAIL)
+        if conflicts:
+            raise HTTPException(status_code=400, detail=DUPLICATE_PHONE_DETAIL)
+
+    # Best effort removal of Keycloak users whose user rows could not be written
+    async def delete_orphaned_kc_users(self, emails: List[str]):
+        results = await asyncio.gather(
+            *(AuthService.delete_kc_user(email) for email in emails), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(result)
+
+    # Imports users in batches, returns how many were created and why the others were rejected
+    # A rejected user does not stop the import, every batch that was written stays committed
+    async def import_users(self, chunks: AsyncIterator[str], format: str) -> UserImportResponse:
+        response = UserImportResponse(created=0, failed=0, errors=[])
+
+        def reject(line: int, detail: str):
+            response.failed += 1
+            if len(response.errors) < MAX_IMPORT_ERRORS:
+                response.errors.append(UserImportError(line=line, detail=detail))
+
+        batch: List[Tuple[int, UserCreate]] = []
+        async for line, user, error in parse_import(chunks, format):
+            if error is not None:
+                reject(line, error)
+                continue
+            batch.append((line, user))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                response.created += await self.import_batch(batch, reject)
+                batch = []
+        if batch:
+            response.created += await self.import_batch(batch, reject)
+
+        if response.created:
+            barber_list_cache.invalidate()
+        response.errors.sort(key=lambda error: error.line)
+        return response
+
+    # Checks, registers and inserts one batch of the import, returns how many users were created
+    async def import_batch(self, batch: List[Tuple[int, UserCreate]], reject) -> int:
+        # Duplicates within the batch, then against the stored users in one query
+        candidates: List[Tuple[int, UserCreate]] = []
+        emails: Dict[str, int] = {}
+        phones: Dict[str, int] = {}
+        for line, user in batch:
+            email = user.email.lower()
+            if len(user.phoneNumber) > 10:
+                reject(line, "Phone number must be 10 digits or less")
+            elif email in emails:
+                reject(line, f"Duplicate of the email on line {emails[email]}")
+            elif user.phoneNumber in phones:
+                reject(line, f"Duplicate of the phone number on line {phones[user.phoneNumber]}")
+            else:
+                emails[email] = line
+                phones[user.phoneNumber] = line
+                candidates.append((line, user))
+        if not candidates:
+            return 0
+
+        try:
+            result = await self.db.execute(
+                select(User.email, User.phoneNumber).filter(or_(
+                    User.email.in_(list(emails)),
+                    User.phoneNumber.in_(list(phones)),
+                ))
+            )
+            existing = result.all()
+            # Ends the read so the connection goes back to the pool while Keycloak is called
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            logger.error(e)
+            raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+        taken_emails = {row.email.lower() for row in existing}
+        taken_phones = {row.phoneNumber for row in existing}
+        new_users: List[Tuple[int, UserCreate]] = []
+        for line, user in candidates:
+            if user.email.lower() in taken_emails:
+                reject(line, DUPLICATE_EMAIL_DETAIL)
+            elif user.phoneNumber in taken_phones:
+                reject(line, DUPLICATE_PHONE_DETAIL)
+            else:
+                new_users.append((line, user))
+
+        # Keycloak registrations run concurrently, bounded by the admin executor so none
+        # of them spends its timeout waiting in the executor queue
+        slots = asyncio.Semaphore(settings.get_config().keycloak_admin_max_workers)
+
+        async def register(user: UserCreate) -> str:
+            async with slots:
+                kc_id = await AuthService.register_kc_user(user)
+            if not kc_id:
+                raise HTTPException(status_code=400, detail="Keycloak user creation has failed")
+            return kc_id
+
+        kc_ids = await asyncio.gather(*(register(user) for _, user in new_users), return_exceptions=True)
+        registered: List[Tuple[int, UserCreate, str]] = []
+        for (line, user), kc_id in zip(new_users, kc_ids):
+            if isinstance(kc_id, Exception):
+                detail = kc_id.detail if isinstance(kc_id, HTTPException) else str(kc_id)
+                reject(line, f"Error creating Keycloak user: {detail}")
+            else:
+                registered.append((line, user, kc_id))
+        if not registered:
+            return 0
+
+        try:
+            # One multi-row insert for the batch
+            await self.db.execute(
+                insert(User),
+                [{**user.model_dump(), "kc_id": kc_id} for _, user, kc_id in registered],
+            )
+            await self.db.commit()
+            return len(registered)
+        except IntegrityError:
+            # A user created since the lookup, insert the batch row by row to find it
+            await self.db.rollback()
+        except SQLAlchemyError as e:
+            logger.error(e)
+            await self.db.rollback()
+            await self.delete_orphaned_kc_users([user.email for _, user, _ in registered])
+            raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+        created = 0
+        orphaned: List[str] = []
+        try:
+            for line, user, kc_id in registered:
+                try:
+                    async with self.db.begin_nested():
+                        await self.db.execute(insert(User), [{**user.model_dump(), "kc_id": kc_id}])
+                    created += 1
+                except IntegrityError as e:
+                    reject(line, integrity_error_response(e).detail)
+                    orphaned.append(user.email)
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            logger.error(e)
+            await self.db.rollback()
+            await self.delete_orphaned_kc_users([user.email for _, user, _ in registered])
+            raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+        await self.delete_orphaned_kc_users(orphaned)
+        return created
+
     # Get all users
-    async def get_all_users(self, page: int, limit: int) -> List[User]:
+    async def get_all_users(self, page: int, limit: int, after: Optional[list] = None) -> List[User]:
         try:
+            query = select(User).order_by(User.user_id).limit(limit)
 
-            # Calculate offset based on page/limit provided by client
-            offset = (page - 1) * limit
+            # A cursor continues after the last user of the previous page,
+            # otherwise calculate offset based on page/limit provided by client
+            if after:
+                query = query.filter(after_key((User.user_id,), after))
+            else:
+                query = query.offset((page - 1) * limit)
 
-            result = await self.db.execute(select(User).limit(limit).offset(offset))
+            result = await self.db.execute(query)
             return result.scalars().all()
         # Not anticipating many errors here, but just in case
         except SQLAlchemyError as e:
@@ -125,35 +436,38 @@ class UserOperations:
     # Update user by their ID
     async def update_user(self, user_id: int, user_data) -> Optional[User]:
         try:
-            if user_data.email:
-                existing_user_email = await self.db.execute(select(User).filter(User.email == user_data.email))
-                if existing_user_email.scalars().first():
-                    raise HTTPException(status_code=400, detail="A user already exists with the provided email")
-
-            if user_data.phoneNumber:
-                existing_user_phone = await self.db.execute(select(User).filter(User.phoneNumber == user_data.phoneNumber))
-                if existing_user_phone.scalars().first():
-                    raise HTTPException(status_code=400, detail="A user already exists with the provided phone number")
-
-                if len(user_data.phoneNumber) > 10:
-                    raise HTTPException(status_code=400, detail="Phone number must be 10 digits or less")
-
-        
             result = await self.db.execute(select(User).filter(User.user_id == user_id))
             user = result.scalars().first()
             if not user:
                 return None
 
+            if user_data.phoneNumber and len(user_data.phoneNumber) > 10:
+                raise HTTPException(status_code=400, detail="Phone number must be 10 digits or less")
+
+            await self.check_unique(user_data.email, user_data.phoneNumber, exclude_user_id=user_id)
+
             for key, value in user_data.dict(exclude_unset=True).items():
                 setattr(user, key, value)
 
             # Update database user data
-            await self.db.commit()
+            try:
+                # Barber responses embed the user details
+                await bump_versions(self.db, BARBERS_VERSION)
+                await self.db.commit()
+            except IntegrityError as e:
+                await self.db.rollback()
+                raise integrity_error_response(e)
             await self.db.refresh(user)
 
+            # Barber listings embed the user details
+            barber_list_cache.invalidate()
+
             # Update Keycloak user data# Update user in Keycloak
             try:
-                AuthService.update_kc_user(user_data)
+                await AuthService.update_kc_user(user_data)
+            except HTTPException:
+                await self.db.rollback()
+                raise
             except Exception as e:
                 logger.error(e)
                 # Rollback database changes if Keycloak update fails
@@ -172,7 +486,6 @@ class UserOperations:
                 detail="An unexpected error occurred"
                 )
 
-
     # Delete a user by their ID
     async def delete_user(self, user_id: int) -> bool:
         try:
@@ -183,11 +496,14 @@ class UserOperations:
                 return False
             
             # Delete user from Keycloak server
-            AuthService.delete_kc_user(user.email)
+            await AuthService.delete_kc_user(user.email)
 
             # Delete user from database
             await self.db.delete(user)
+            # The user's barber, schedules and threads go with it
+            await bump_versions(self.db, BARBERS_VERSION, SCHEDULES_VERSION, THREADS_VERSION)
             await self.db.commit()
+            barber_list_cache.invalidate()
             return True
         
         # Handle generic exceptions, wrong ID provided error already handled in router
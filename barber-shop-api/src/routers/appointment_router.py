@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import datetime
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
 from core.dependencies import DBSessionDep
 from operations.appointment_operations import AppointmentOperations
-from modules.appointment_schema import AppointmentResponse, AppointmentCreate, AppointmentUpdate
+from modules.appointment_schema import AppointmentResponse, AppointmentCreate, AppointmentUpdate, AppointmentStatus
 from modules.user.error_response_schema import ErrorResponse
+from core.pagination import decode_cursor, set_next_cursor
 import logging
 
 '''
@@ -29,15 +32,35 @@ async def create_appointment(appointment: AppointmentCreate, db_session: DBSessi
 
 #Get endpoint to get all appointments from the database
 @appointment_router.get("", response_model=List[AppointmentResponse], responses = {
+    400: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
 })
 async def get_appointments(
     db_session: DBSessionDep,
-    page: int,
-    limit: int
+    request: Request,
+    response: Response,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    # Optional query parameters
+    user_id: Optional[int] = Query(None, description="User ID to filter appointments by"),
+    barber_id: Optional[int] = Query(None, description="Barber ID to filter appointments by"),
+    status: Optional[AppointmentStatus] = Query(None, description="Appointment status to filter by"),
+    date_from: Optional[datetime.date] = Query(None, description="Earliest appointment date, inclusive"),
+    date_to: Optional[datetime.date] = Query(None, description="Latest appointment date, inclusive"),
 ):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+
     appointment_ops = AppointmentOperations(db_session)
-    return await appointment_ops.get_all_appointments(page, limit)
+    appointments = await appointment_ops.get_all_appointments(
+        page, limit, user_id, barber_id, decode_cursor(request, cursor, 2), status, date_from, date_to
+    )
+    set_next_cursor(
+        request, response, appointments, limit,
+        lambda appointment: (appointment.appointment_date, appointment.appointment_id),
+    )
+    return appointments
 
 # GET endpoint to retrieve a specific appointment from the database by the appointment_id
 @appointment_router.get("/{appointment_id}", response_model=AppointmentResponse, responses = {
@@ -1,14 +1,20 @@
 import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from operations.barber_operations import BarberOperations
 from core.dependencies import DBSessionDep
 from modules.user.barber_schema import BarberResponse, BarberCreate
+from modules.availability_schema import BarberAvailability, DailyAvailability
+from operations.availability_operations import AvailabilityOperations
 from typing import List
 from auth.controller import AuthController
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from modules.user.error_response_schema import ErrorResponse
+from core.pagination import decode_cursor, set_next_cursor
+from core.http_cache import PRIVATE_REVALIDATE, revalidate, versioned_etag
+from operations.cache_versions import BARBERS_VERSION, SCHEDULES_VERSION, read_versions
+from operations.service_catalog import service_catalog
 
 barber_router = APIRouter(
     prefix="/api/v1/barbers",
@@ -24,7 +30,7 @@ bearer_scheme = HTTPBearer()
 })
 async def create_barber(user: BarberCreate, db_session: DBSessionDep, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     # Checks for barber role
-    AuthController.protected_endpoint(credentials, required_role="barber")
+    await AuthController.protected_endpoint(credentials, required_role="barber")
     
     barber_ops = BarberOperations(db_session)
     response = await barber_ops.create_barber(user)
@@ -32,33 +38,99 @@ async def create_barber(user: BarberCreate, db_session: DBSessionDep, credential
     return response.to_response_schema()
 
 # GET endpoint to retrieve all barbers
-@barber_router.get("", response_model=List[BarberResponse], responses = {
+# Answers 304 Not Modified while no barber or schedule changed since the client's copy
+@barber_router.get("", response_model=List[BarberResponse], dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
     500: {"model": ErrorResponse}
 })
 async def get_all_barbers(
     db_session: DBSessionDep, 
+    request: Request,
+    http_response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     page: int = Query(1, ge=1),
     limit: int = Query(10, le=100),
     # Optional query parameters
     schedule_date: Optional[datetime.date] = Query(None, description="Date to filter barbers by schedule"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ):
-    AuthController.protected_endpoint(credentials)
-    barber_ops = BarberOperations(db_session)
-    response = await barber_ops.get_all_barbers(page, limit)
-    if schedule_date:
-        response = await barber_ops.list_barbers_by_schedule_date(schedule_date, page, limit)
+    await AuthController.protected_endpoint(credentials)
+    # Listings filtered by schedule_date depend on the schedules too
+    versions = await read_versions(db_session, BARBERS_VERSION, SCHEDULES_VERSION)
+    cached = revalidate(request, http_response, versioned_etag(request, "barbers", *versions))
+    if cached:
+        return cached
 
-    barbers: List[BarberResponse] = []
-    for barber in response:
-        barbers.append(barber.to_response_schema())
+    barber_ops = BarberOperations(db_session)
+    barbers = await barber_ops.list_barbers(page, limit, decode_cursor(request, cursor, 1), schedule_date)
+    set_next_cursor(request, http_response, barbers, limit, lambda barber: (barber.barber_id,))
     return barbers
 
+# GET endpoint to search the barbers with free time on a date or date range
+# Returns the contiguous free windows long enough for the given services and number of slots
+@barber_router.get("/availability", response_model=List[BarberAvailability], dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
+    400: {"model": ErrorResponse},
+    500: {"model": ErrorResponse}
+})
+async def get_barber_availability(
+    db_session: DBSessionDep,
+    request: Request,
+    http_response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    date_from: datetime.date = Query(..., description="First date to search"),
+    date_to: Optional[datetime.date] = Query(None, description="Last date to search, defaults to date_from"),
+    service_ids: List[int] = Query([], description="Services the window must be long enough for"),
+    slot_count: int = Query(1, ge=1, description="Minimum number of contiguous free slots"),
+    barber_id: Optional[int] = Query(None, description="Barber ID to restrict the search to"),
+):
+    await AuthController.protected_endpoint(credentials)
+    # The windows depend on the schedules and on the durations of the services
+    (schedules_version,) = await read_versions(db_session, SCHEDULES_VERSION)
+    catalog = await service_catalog.get(db_session)
+    etag = versioned_etag(request, "availability", schedules_version, catalog.version)
+    cached = revalidate(request, http_response, etag)
+    if cached:
+        return cached
+
+    availability_ops = AvailabilityOperations(db_session)
+    return await availability_ops.find_availability(date_from, date_to, service_ids, slot_count, barber_id)
+
+# GET endpoint for calendar views, the free slot count and first/last free slot of each barber's days
+@barber_router.get("/availability/calendar", response_model=List[DailyAvailability], dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
+    400: {"model": ErrorResponse},
+    500: {"model": ErrorResponse}
+})
+async def get_availability_calendar(
+    db_session: DBSessionDep,
+    request: Request,
+    http_response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    date_from: datetime.date = Query(..., description="First date of the calendar"),
+    date_to: datetime.date = Query(..., description="Last date of the calendar"),
+    barber_id: Optional[int] = Query(None, description="Barber ID to restrict the calendar to"),
+):
+    await AuthController.protected_endpoint(credentials)
+    (version,) = await read_versions(db_session, SCHEDULES_VERSION)
+    cached = revalidate(request, http_response, versioned_etag(request, "calendar", version))
+    if cached:
+        return cached
+
+    availability_ops = AvailabilityOperations(db_session)
+    return await availability_ops.get_daily_availability(date_from, date_to, barber_id)
+
 # GET endpoint to retrieve a specific barber by their ID number
-@barber_router.get("/{barber_id}", response_model=BarberResponse, responses = {
+@barber_router.get("/{barber_id}", response_model=BarberResponse, dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
     500: {"model": ErrorResponse}
 })
-async def get_barber_by_id(barber_id: int, db_session: DBSessionDep):
+async def get_barber_by_id(barber_id: int, db_session: DBSessionDep, request: Request, http_response: Response):
+    (version,) = await read_versions(db_session, BARBERS_VERSION)
+    cached = revalidate(request, http_response, versioned_etag(request, "barber", version))
+    if cached:
+        return cached
+
     barber_ops = BarberOperations(db_session)
     response = await barber_ops.get_barber_by_id(barber_id)
 
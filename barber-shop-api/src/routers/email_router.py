@@ -1,5 +1,7 @@
 from fastapi import FastAPI, APIRouter, Depends, HTTPException
-from operations.email_operations import email_operations
+from core.dependencies import DBSessionDep
+from operations.email_outbox_operations import EmailOutboxOperations
+from operations.email_dispatcher import email_dispatcher
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from modules.user.email_schema import EmailSchema
 from modules.user.error_response_schema import ErrorResponse
@@ -13,28 +15,26 @@ email_router = APIRouter(
 )
 
 
-# Endpoint to send emails with error handling
+# Endpoint to queue emails, they are delivered in the background by the email dispatcher
 @email_router.post("/send",
+    status_code=202,
     responses={
-        200: {"description": "Email has been sent successfully."},
-        500: {"model": ErrorResponse, "description": "An error occurred while sending the email."}
+        202: {"description": "Email has been queued for delivery."},
+        500: {"model": ErrorResponse, "description": "An error occurred while queueing the email."}
     }
 )
 async def send_email(
-    email_data: EmailSchema,  
+    email_data: EmailSchema,
+    db_session: DBSessionDep,
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
 ):
-    try:
-        # Send the email
-        await email_operations.send_email(
-            email_data.email,
-            email_data.subject,
-            email_data.body
-        )
+    outbox_ops = EmailOutboxOperations(db_session)
+    email_id = await outbox_ops.enqueue_email(
+        email_data.email,
+        email_data.subject,
+        email_data.body
+    )
+    email_dispatcher.notify()
 
-        # Successful response
-        return {"message": "Email has been sent successfully."}
-
-    except Exception as e:
-        # Handle any unexpected exceptions
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
\ No newline at end of file
+    # Accepted response, delivery happens after the request
+    return {"message": "Email has been queued for delivery.", "email_id": email_id}
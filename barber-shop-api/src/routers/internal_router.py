@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from auth.controller import AuthController
+from auth.service import AuthService
+from core.db import async_session_manager
+from core.dependencies import DBSessionDep
+from core.smtp import smtp_pool
+from core.email_templates import email_templates
+from core.metrics import metrics
+from operations.barber_operations import barber_list_cache
+from operations.service_catalog import service_catalog
+from operations.email_dispatcher import email_dispatcher
+from operations.email_outbox_operations import EmailOutboxOperations
+from operations.notification_scheduler import notification_scheduler
+
+'''
+Internal endpoints for operational telemetry, not part of the public API schema.
+They expose SQL statements, error text and queue state, so every endpoint requires the admin role.
+'''
+
+# Initialize the HTTPBearer scheme for authentication
+bearer_scheme = HTTPBearer()
+
+# Guards every internal endpoint
+async def require_admin(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    await AuthController.protected_endpoint(credentials, required_role="admin")
+
+internal_router = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_admin)],
+)
+
+# GET endpoint to report database connection pool usage
+@internal_router.get("/db/pool", response_model=dict)
+async def get_db_pool_status():
+    return async_session_manager.pool_status()
+
+# GET endpoint to scrape per-route request and query metrics
+@internal_router.get("/metrics", response_model=dict)
+async def get_metrics(db_session: DBSessionDep):
+    return {
+        "routes": metrics.snapshot(),
+        "db_pool": async_session_manager.pool_status(),
+        "token_verifier": AuthService.token_verifier.stats(),
+        "realm_roles": AuthService.realm_roles.stats(),
+        "barber_list_cache": barber_list_cache.stats(),
+        "service_catalog": service_catalog.stats(),
+        "email_outbox": {
+            **email_dispatcher.stats(),
+            "queue": await EmailOutboxOperations(db_session).queue_stats(),
+        },
+        "smtp_pool": smtp_pool.stats(),
+        "email_templates": email_templates.stats(),
+        "notification_scheduler": notification_scheduler.stats(),
+    }
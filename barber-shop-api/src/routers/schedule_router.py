@@ -1,17 +1,20 @@
 import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from core.db import get_db_session
 from core.dependencies import DBSessionDep
 from operations.schedule_operations import ScheduleOperations
 from modules.schedule_schema import ScheduleResponse, ScheduleCreate, ScheduleUpdate, TimeSlotChildResponse
+from modules.roster_schema import RosterCreate, RosterResponse
 from auth.controller import AuthController
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import logging
 from modules.user.error_response_schema import ErrorResponse
+from core.pagination import decode_cursor, set_next_cursor
+from core.http_cache import PRIVATE_REVALIDATE, revalidate, versioned_etag
+from operations.cache_versions import SCHEDULES_VERSION, read_versions
 
 '''
 Endpoints for interactions with schedule table
@@ -29,7 +32,7 @@ bearer_scheme = HTTPBearer()
     500: {"model": ErrorResponse}
 })
 async def create_schedule(schedule: ScheduleCreate, db_session: DBSessionDep, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    AuthController.protected_endpoint(credentials, required_role="barber")
+    await AuthController.protected_endpoint(credentials, required_role="barber")
     # try:
     schedule_ops = ScheduleOperations(db_session)
     created_schedule = await schedule_ops.create_schedule(schedule)
@@ -41,32 +44,60 @@ async def create_schedule(schedule: ScheduleCreate, db_session: DBSessionDep, cr
     #     logging.error(e)
     #     raise HTTPException(status_code=500, detail="An unexpected error occurred during schedule block creation")
 
+# POST endpoint to publish a roster, creating the schedules and time slots of many barbers and days at once
+# Existing schedules and slots are skipped, the response counts what was inserted and skipped
+@schedule_router.post("/roster", response_model=RosterResponse, responses = {
+    400: {"model": ErrorResponse},
+    500: {"model": ErrorResponse}
+})
+async def create_roster(roster: RosterCreate, db_session: DBSessionDep, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    await AuthController.protected_endpoint(credentials, required_role="barber")
+
+    schedule_ops = ScheduleOperations(db_session)
+    return await schedule_ops.generate_roster(roster)
+
 # GET endpoint to get all schedule blocks from the database
-@schedule_router.get("", response_model=List[ScheduleResponse], responses = {
+@schedule_router.get("", response_model=List[ScheduleResponse], dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
     500: {"model": ErrorResponse}
 })
 async def get_schedules(
     db_session: DBSessionDep, 
+    request: Request,
+    response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     page : int = Query(1, ge=1),
     limit: int = Query(10, le=100),
     # Optional query parameters
     schedule_date: Optional[datetime.date] = Query(None, description="Date to filter barbers by schedule"),
     barber_id: Optional[int] = Query(None, description="Barber ID to filter schedules by"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ):
-    AuthController.protected_endpoint(credentials)
+    await AuthController.protected_endpoint(credentials)
+    (version,) = await read_versions(db_session, SCHEDULES_VERSION)
+    cached = revalidate(request, response, versioned_etag(request, "schedules", version))
+    if cached:
+        return cached
 
     schedule_ops = ScheduleOperations(db_session)
-    results = await schedule_ops.get_all_schedules(page, limit, schedule_date, barber_id)
+    results = await schedule_ops.get_all_schedules(
+        page, limit, schedule_date, barber_id, decode_cursor(request, cursor, 2)
+    )
+    set_next_cursor(request, response, results, limit, lambda schedule: (schedule.date, schedule.schedule_id))
     return [schedule.to_response_schema() for schedule in results]
 
 # GET endpoint to retrieve a specific schedule block from the database by the schedule_id
-@schedule_router.get("/{schedule_id}", response_model=ScheduleResponse, responses = {
+@schedule_router.get("/{schedule_id}", response_model=ScheduleResponse, dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
     404: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
 })
-async def get_schedule(schedule_id: int, db_session: DBSessionDep):
-    
+async def get_schedule(schedule_id: int, db_session: DBSessionDep, request: Request, response: Response):
+    (version,) = await read_versions(db_session, SCHEDULES_VERSION)
+    cached = revalidate(request, response, versioned_etag(request, "schedule", version))
+    if cached:
+        return cached
+
     schedule_ops = ScheduleOperations(db_session)
     schedule = await schedule_ops.get_schedule_by_id(schedule_id)
 
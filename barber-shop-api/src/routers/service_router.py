@@ -1,5 +1,5 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 
 from core.dependencies import DBSessionDep
 from modules.user.service_schema import ServiceBase, ServiceResponse, ServiceUpdate
@@ -7,6 +7,8 @@ from operations.service_operations import ServiceOperations
 from modules.user.error_response_schema import ErrorResponse
 from auth.controller import AuthController
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from core.pagination import decode_cursor, set_next_cursor
+from core.http_cache import CachePolicy, revalidate, versioned_etag
 
 service_router = APIRouter(
     prefix="/api/v1/services",
@@ -21,7 +23,7 @@ bearer_scheme = HTTPBearer()
 })
 async def create_service(service: ServiceBase, db_session: DBSessionDep, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     # Checks for barber role
-    AuthController.protected_endpoint(credentials, required_role="barber")
+    await AuthController.protected_endpoint(credentials, required_role="barber")
     
     service_ops = ServiceOperations(db_session)
     response = await service_ops.create_service(service)
@@ -30,16 +32,29 @@ async def create_service(service: ServiceBase, db_session: DBSessionDep, credent
 
 
 # GET endpoint to get all available services
-@service_router.get("", response_model=List[ServiceResponse], responses = {
+# Answers 304 Not Modified while the catalog version and the requested page are unchanged
+@service_router.get("", response_model=List[ServiceResponse], dependencies=[Depends(CachePolicy(max_age=30, private=False))], responses = {
+    304: {"description": "Not Modified"},
     500: {"model": ErrorResponse}
 })
 async def get_all_services(
     db_session: DBSessionDep,
+    request: Request,
+    http_response: Response,
     page: int = Query(1, ge=1),
-    limit: int = Query(10, le=100)
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ):
+    after = decode_cursor(request, cursor, 1)
     service_ops = ServiceOperations(db_session)
-    response = await service_ops.get_all_services(page, limit)
+    catalog = await service_ops.get_catalog()
+
+    cached = revalidate(request, http_response, versioned_etag(request, "services", catalog.version))
+    if cached:
+        return cached
+
+    response = await service_ops.get_all_services(page, limit, after)
+    set_next_cursor(request, http_response, response, limit, lambda service: (service.service_id,))
     
     return response
 
@@ -50,7 +65,7 @@ async def get_all_services(
 })
 async def update_service(db_session: DBSessionDep, service_id: int, service_details: ServiceUpdate, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     # Checks for barber role
-    AuthController.protected_endpoint(credentials, required_role="barber")
+    await AuthController.protected_endpoint(credentials, required_role="barber")
     
     service_ops = ServiceOperations(db_session)
     response = await service_ops.update_service(service_id, service_details)
@@ -64,7 +79,7 @@ async def update_service(db_session: DBSessionDep, service_id: int, service_deta
 })
 async def delete_service(db_session: DBSessionDep, service_id: int, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     # Checks for barber role
-    AuthController.protected_endpoint(credentials, required_role="barber")
+    await AuthController.protected_endpoint(credentials, required_role="barber")
     
     
     service_ops = ServiceOperations(db_session)
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from modules.thread_schema import ThreadCreate, ThreadResponse
 from modules.user.error_response_schema import ErrorResponse
 from core.dependencies import DBSessionDep
 from operations.thread_operations import ThreadOperations
-from typing import List
+from typing import List, Optional
+from core.pagination import decode_cursor, set_next_cursor
+from core.http_cache import PRIVATE_REVALIDATE, revalidate, versioned_etag
+from operations.cache_versions import THREADS_VERSION, read_versions
 
 thread_router = APIRouter(
     prefix="/api/v1/threads",
@@ -21,8 +24,9 @@ async def create_thread(thread: ThreadCreate, db_session: DBSessionDep) -> Threa
 
 # GET endpoint to retrieve threads for a particular logged in user and the user they are conversing with
 # This will return threads were the user is both 'sendingUser' and 'recievingUser'
-# in order to properly display both sides of the conversation 
-@thread_router.get("/{logged_user_id}/and/{other_user_id}", response_model=List[ThreadResponse], responses = {
+# in order to properly display both sides of the conversation, with each thread's latest messages
+@thread_router.get("/{logged_user_id}/and/{other_user_id}", response_model=List[ThreadResponse], dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
     400: {"model": ErrorResponse},
     404: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
@@ -31,21 +35,34 @@ async def get_threads_by_user_id(
     logged_user_id: int, 
     other_user_id: int, 
     db_session: DBSessionDep,
+    request: Request,
+    http_response: Response,
     page: int = Query(1, ge=1),
-    limit: int = Query(10, le=100)
+    limit: int = Query(10, le=100),
+    message_limit: int = Query(20, ge=1, le=100, description="Latest messages to return per thread"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ) -> List[ThreadResponse]:
+    (version,) = await read_versions(db_session, THREADS_VERSION)
+    cached = revalidate(request, http_response, versioned_etag(request, "threads", version))
+    if cached:
+        return cached
+
     thread_ops = ThreadOperations(db_session)
-    response = await thread_ops.get_threads_by_user_id(logged_user_id, other_user_id, page, limit)
+    response = await thread_ops.get_threads_by_user_id(
+        logged_user_id, other_user_id, page, limit, message_limit, decode_cursor(request, cursor, 1)
+    )
     if not response:
         raise HTTPException(
             status_code=404,
             detail=f"No threads found between users with IDs: {logged_user_id} and {other_user_id}"
         )
+    set_next_cursor(request, http_response, response, limit, lambda thread: (thread.thread_id,))
     return response
 
-# GET endpoint to retrieve ALL threads for a particular user, where the user is both 'sendingUser'
-# and 'receivingUser' (for displaying all of a user's conversations)
-@thread_router.get("/{user_id}", response_model=List[ThreadResponse], responses = {
+# GET endpoint to retrieve a page of threads for a particular user, where the user is both 'sendingUser'
+# and 'receivingUser' (for displaying all of a user's conversations), with each thread's latest messages
+@thread_router.get("/{user_id}", response_model=List[ThreadResponse], dependencies=[Depends(PRIVATE_REVALIDATE)], responses = {
+    304: {"description": "Not Modified"},
     400: {"model": ErrorResponse},
     404: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
@@ -53,15 +70,26 @@ async def get_threads_by_user_id(
 async def get_all_threads_by_user_id(
     user_id: int,
     db_session: DBSessionDep,
+    request: Request,
+    http_response: Response,
     page: int = Query(1, ge=1),
-    limit: int = Query(10, le=100)
+    limit: int = Query(10, le=100),
+    message_limit: int = Query(20, ge=1, le=100, description="Latest messages to return per thread"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ) -> List[ThreadResponse]:
-    
+    (version,) = await read_versions(db_session, THREADS_VERSION)
+    cached = revalidate(request, http_response, versioned_etag(request, "threads", version))
+    if cached:
+        return cached
+
     thread_ops = ThreadOperations(db_session)
-    response = await thread_ops.get_all_threads_by_user_id(user_id, page, limit)
+    response = await thread_ops.get_all_threads_by_user_id(
+        user_id, page, limit, message_limit, decode_cursor(request, cursor, 1)
+    )
     if not response:
         raise HTTPException(
             status_code=404,
             detail=f"No threads found for user with ID: {user_id}"
         )
+    set_next_cursor(request, http_response, response, limit, lambda thread: (thread.thread_id,))
     return response
\ No newline at end of file
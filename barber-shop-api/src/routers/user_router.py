@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List
+import codecs
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import AsyncIterator, List, Optional
 from core.dependencies import DBSessionDep
-from operations.user_operations import UserOperations
-from modules.user.user_schema import UserResponse, UserCreate, UserUpdate
+from operations.user_operations import IMPORT_FORMATS, UserOperations
+from modules.user.user_schema import UserResponse, UserCreate, UserUpdate, UserImportResponse
 from auth.controller import AuthController
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from modules.user.error_response_schema import ErrorResponse
+from core.pagination import decode_cursor, set_next_cursor
 
 
 '''
@@ -34,20 +36,59 @@ async def create_user(user: UserCreate, db_session: DBSessionDep):
     
     return created_user
 
+# Decodes the streamed request body without reading it all into memory, the importer
+# splits it into records, so CSV fields may hold line breaks
+async def iter_body_text(request: Request) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async for chunk in request.stream():
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+# POST endpoint to import users in bulk from a CSV file with a header line, or from JSON Lines
+@user_router.post("/import", response_model=UserImportResponse, responses = {
+    400: {"model": ErrorResponse},
+    500: {"model": ErrorResponse}
+})
+async def import_users(
+    request: Request,
+    db_session: DBSessionDep,
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    format: Optional[str] = Query(None, description="csv or jsonl, taken from the Content-Type header when left out"),
+):
+    await AuthController.protected_endpoint(credentials, required_role="barber")
+
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "jsonl" if "json" in content_type else None
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Import format must be csv or jsonl")
+
+    user_ops = UserOperations(db_session)
+    return await user_ops.import_users(iter_body_text(request), format)
+
 # GET endpoint to get all users from the database
 @user_router.get("", response_model=List[UserResponse], responses = {
     500: {"model": ErrorResponse}
 })
 async def get_users(
     db_session: DBSessionDep, 
+    request: Request,
+    response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     page: int = Query(1, ge=1),
-    limit: int = Query(10, le=100)
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ):
-    AuthController.protected_endpoint(credentials, required_role="barber")
+    await AuthController.protected_endpoint(credentials, required_role="barber")
     
     user_ops = UserOperations(db_session)
-    return await user_ops.get_all_users(page, limit)
+    users = await user_ops.get_all_users(page, limit, decode_cursor(request, cursor, 1))
+    set_next_cursor(request, response, users, limit, lambda user: (user.user_id,))
+    return users
 
 @user_router.get("/me", response_model=UserResponse, responses = {
     400: {"model": ErrorResponse},
@@ -55,7 +96,7 @@ async def get_users(
 })
 async def get_current_user(db_session: DBSessionDep, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     # Get the current user from the token
-    user_info = AuthController.protected_endpoint(credentials)
+    user_info = await AuthController.protected_endpoint(credentials)
     
     if not user_info:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -0,0 +1,109 @@
+'''
+Helpers shared by the benchmarks.
+
+Benchmarks are deselected from the normal test run, run them with
+
+    python -m pytest -m benchmark -s tests/benchmarks
+
+They build their datasets at the sizes the work orders asked for. BENCHMARK_SCALE scales
+every dataset, BENCHMARK_SCALE=0.01 gives a quick smoke run of the same code paths.
+Timings are printed, the assertions only cover what does not depend on the machine,
+such as statement counts.
+'''
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Iterable
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.metrics import QueryStats, current_query_stats
+
+SCALE = float(os.environ.get("BENCHMARK_SCALE", "1"))
+
+# Rows sent per executemany when seeding
+SEED_BATCH_SIZE = 5000
+
+
+# A dataset size scaled by BENCHMARK_SCALE
+def scaled(count: int, minimum: int = 1) -> int:
+    return max(minimum, int(count * SCALE))
+
+
+class Timings:
+
+    def __init__(self):
+        self.samples: list[float] = []
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    @property
+    def total(self) -> float:
+        return sum(self.samples)
+
+    def percentile(self, percent: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def summary(self) -> dict:
+        return {
+            "n": len(self.samples),
+            "median_ms": statistics.median(self.samples) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "per_sec": len(self.samples) / self.total if self.total else 0.0,
+        }
+
+
+# Statements issued inside the block, counted by the same engine hooks as a request's
+@contextmanager
+def count_queries():
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+# Prints a table of results, one row per dict
+def report(title: str, rows: Iterable[dict]):
+    rows = list(rows)
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    cells = [[format_cell(row.get(column, "")) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(columns)]
+    print(f"\n{title} (BENCHMARK_SCALE={SCALE:g})")
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+def format_cell(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+# Inserts rows in executemany batches and commits, returns how many were inserted
+async def bulk_insert(session: AsyncSession, model, rows: Iterable[dict]) -> int:
+    table = model.__table__
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == SEED_BATCH_SIZE:
+            await session.execute(insert(table), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        await session.execute(insert(table), batch)
+        inserted += len(batch)
+    await session.commit()
+    return inserted
@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+from sqlalchemy import select, text
+
+from bench import Timings, bulk_insert, report, scaled
+from conftest import capture_statements, explain_query_plan
+from modules.user.models import Appointment, AppointmentStatus, Barber, User
+
+pytestmark = pytest.mark.benchmark
+
+APPOINTMENTS = 1_000_000
+CUSTOMERS = 2000
+BARBERS = 50
+DAYS = 1000
+ROUNDS = 20
+FILTER_INDEXES = ["ix_appointment_barber_date", "ix_appointment_user_date", "ix_appointment_status_date"]
+
+
+# Seeds customers, barbers and appointments spread over DAYS days, returns the new user and barber ids
+async def seed(db) -> tuple[list[int], list[int]]:
+    customers, barbers = scaled(CUSTOMERS, minimum=10), scaled(BARBERS, minimum=5)
+    await bulk_insert(db, User, (
+        {"kc_id": f"kc-bench-{i}", "firstName": "Bench", "lastName": str(i), "email": f"bench{i}@example.com",
+         "password": "test", "phoneNumber": f"{7000000000 + i}"}
+        for i in range(customers + barbers)
+    ))
+    user_ids = (await db.execute(
+        select(User.user_id).filter(User.kc_id.like("kc-bench-%")).order_by(User.user_id)
+    )).scalars().all()
+    await bulk_insert(db, Barber, ({"user_id": user_id} for user_id in user_ids[customers:]))
+    barber_ids = (await db.execute(
+        select(Barber.barber_id).filter(Barber.user_id.in_(user_ids[customers:])).order_by(Barber.barber_id)
+    )).scalars().all()
+
+    statuses = list(AppointmentStatus)
+    first_day = datetime.date(2023, 1, 1)
+    await bulk_insert(db, Appointment, (
+        {
+            "appointment_date": first_day + datetime.timedelta(days=(i * 7 + i // customers) % DAYS),
+            "user_id": user_ids[(i * 31) % customers],
+            "barber_id": barber_ids[i % len(barber_ids)],
+            "status": statuses[(i // 3) % len(statuses)],
+        }
+        for i in range(scaled(APPOINTMENTS, minimum=1000))
+    ))
+    return user_ids[:customers], barber_ids
+
+
+# First pages of the appointment list per filter on a million rows, with and without the
+# filter indexes, each with the plan SQLite chose for its page query
+async def test_appointment_filters(client, db_engine, db_session):
+    user_ids, barber_ids = await seed(db_session)
+    month = {"date_from": "2024-03-01", "date_to": "2024-03-31"}
+    filters = {
+        "barber": {"barber_id": barber_ids[0]},
+        "barber, one month": {"barber_id": barber_ids[0], **month},
+        "customer": {"user_id": user_ids[0]},
+        "customer, one month": {"user_id": user_ids[0], **month},
+        "status, one month": {"status": "confirmed", **month},
+    }
+
+    rows = []
+    plans = {}
+    for indexed in (True, False):
+        if not indexed:
+            for index in FILTER_INDEXES:
+                await db_session.execute(text(f"DROP INDEX {index}"))
+            await db_session.commit()
+        for name, params in filters.items():
+            timings = Timings()
+            for _ in range(scaled(ROUNDS, minimum=3)):
+                with capture_statements(db_engine) as statements, timings.measure():
+                    response = await client.get("/api/v1/appointments", params={**params, "limit": 20})
+            assert response.status_code == 200, response.text
+            page_statement = next(s for s in statements if s[0].lstrip().startswith("SELECT appointment."))
+            plan = await explain_query_plan(db_session, *page_statement)
+            await db_session.commit()
+            plans[(name, indexed)] = plan
+            rows.append({"filter": name, "indexes": indexed, "rows": len(response.json()), **timings.summary()})
+
+    report(f"Appointment list filters, {scaled(APPOINTMENTS, minimum=1000)} appointments", rows)
+    for (name, indexed), plan in plans.items():
+        print(f"{name}, indexes={indexed}: {plan[0]}")
+
+    # With the indexes every filter reads its own one, and none has to sort
+    for name in filters:
+        plan = plans[(name, True)]
+        assert any(index in plan[0] for index in FILTER_INDEXES), plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
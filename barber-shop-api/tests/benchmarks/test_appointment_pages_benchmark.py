@@ -0,0 +1,72 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from bench import Timings, bulk_insert, report, scaled
+from core.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from modules.user.models import Appointment, AppointmentStatus
+
+pytestmark = pytest.mark.benchmark
+
+APPOINTMENTS = 1_000_000
+PAGE_SIZE = 20
+ROUNDS = 20
+# One appointment in NO_DATE_EVERY is stored without a date
+NO_DATE_EVERY = 20
+
+
+# The (appointment_date, appointment_id) of the row just before the given page of a barber's appointments
+async def key_before_page(db, barber_id: int, page: int) -> tuple:
+    result = await db.execute(
+        select(Appointment.appointment_date, Appointment.appointment_id)
+        .filter(Appointment.barber_id == barber_id)
+        .order_by(Appointment.appointment_date, Appointment.appointment_id)
+        .offset((page - 1) * PAGE_SIZE - 1)
+        .limit(1)
+    )
+    return tuple(result.one())
+
+
+# A million appointments, a barber's list read at increasing depths by page number and by cursor
+async def test_appointment_pages(client, shop, db_session):
+    appointments = scaled(APPOINTMENTS, minimum=PAGE_SIZE * 10)
+    first_day = datetime.date(2023, 1, 1)
+    await bulk_insert(db_session, Appointment, (
+        {
+            "appointment_date": None if i % NO_DATE_EVERY == 0 else first_day + datetime.timedelta(days=i % 1000),
+            "user_id": shop.customer_ids[i % len(shop.customer_ids)],
+            "barber_id": shop.barber_ids[i % len(shop.barber_ids)],
+            "status": AppointmentStatus.pending,
+        }
+        for i in range(appointments)
+    ))
+
+    barber_id = shop.barber_ids[0]
+    params = {"barber_id": barber_id, "limit": PAGE_SIZE}
+    scope = f"/api/v1/appointments?barber_id={barber_id}"
+    last_page = appointments // len(shop.barber_ids) // PAGE_SIZE
+
+    rows = []
+    for page in sorted({2, last_page // 100, last_page // 10, last_page // 2, last_page} - {0, 1}):
+        cursor = encode_cursor(scope, *await key_before_page(db_session, barber_id, page))
+        await db_session.commit()
+        pages = {}
+        for path, page_params in [
+            ("offset", {**params, "page": page}),
+            ("cursor", {**params, "cursor": cursor}),
+        ]:
+            timings = Timings()
+            for _ in range(scaled(ROUNDS, minimum=3)):
+                with timings.measure():
+                    response = await client.get("/api/v1/appointments", params=page_params)
+            assert response.status_code == 200, response.text
+            pages[path] = [appointment["appointment_id"] for appointment in response.json()]
+            rows.append({"page": page, "path": path, **timings.summary()})
+
+        # Both reach the same rows, and the cursor page links to the next one
+        assert pages["cursor"] == pages["offset"]
+        assert len(pages["cursor"]) == PAGE_SIZE
+        assert NEXT_CURSOR_HEADER in response.headers
+
+    report(f"Appointment list of {appointments} rows, {PAGE_SIZE} per page, filtered by barber", rows)
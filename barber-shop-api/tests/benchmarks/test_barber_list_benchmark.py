@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from bench import Timings, bulk_insert, count_queries, report, scaled
+from modules.user.models import Barber, Schedule, User
+from operations.barber_operations import BarberOperations, barber_list_cache
+from operations.loader_options import BARBER_RESPONSE
+
+pytestmark = pytest.mark.benchmark
+
+BARBERS = 500
+DAYS = 365
+PAGE_SIZE = 10
+ROUNDS = 20
+FIRST_DAY = datetime.date(2025, 1, 1)
+
+
+# The listing before the single query: a page of every barber, thrown away when a date is given,
+# then the day's schedules, every barber working that day, and a Python slice of them
+async def list_barbers_before(db, page: int, limit: int, schedule_date):
+    result = await db.execute(
+        select(Barber).options(*BARBER_RESPONSE).order_by(Barber.barber_id).limit(limit).offset((page - 1) * limit)
+    )
+    barbers = result.scalars().all()
+    if schedule_date:
+        schedules = (await db.execute(select(Schedule).filter(Schedule.date == schedule_date))).scalars().all()
+        result = await db.execute(
+            select(Barber)
+            .join(Schedule)
+            .filter(Schedule.schedule_id.in_([schedule.schedule_id for schedule in schedules]))
+            .distinct()
+            .options(*BARBER_RESPONSE)
+            .order_by(Barber.barber_id)
+        )
+        offset = (page - 1) * limit
+        barbers = result.scalars().all()[offset:offset + limit]
+    return [barber.to_response_schema() for barber in barbers]
+
+
+# 500 barbers with a schedule on every day of a year, listed with and without a schedule date
+async def test_barber_list(db_session):
+    barbers, days = scaled(BARBERS, minimum=PAGE_SIZE * 2), scaled(DAYS, minimum=2)
+    await bulk_insert(db_session, User, (
+        {"kc_id": f"kc-bench-{i}", "firstName": "Barber", "lastName": str(i), "email": f"bench{i}@example.com",
+         "password": "test", "phoneNumber": f"{7000000000 + i}"}
+        for i in range(barbers)
+    ))
+    user_ids = (await db_session.execute(select(User.user_id).order_by(User.user_id))).scalars().all()
+    await bulk_insert(db_session, Barber, ({"user_id": user_id} for user_id in user_ids))
+    barber_ids = (await db_session.execute(select(Barber.barber_id).order_by(Barber.barber_id))).scalars().all()
+    await bulk_insert(db_session, Schedule, (
+        {"barber_id": barber_id, "date": FIRST_DAY + datetime.timedelta(days=day), "is_working": True}
+        for barber_id in barber_ids
+        for day in range(days)
+    ))
+
+    barber_ops = BarberOperations(db_session)
+
+    async def cold(page, schedule_date):
+        barber_list_cache.invalidate()
+        return await barber_ops.list_barbers(page, PAGE_SIZE, None, schedule_date)
+
+    async def cached(page, schedule_date):
+        return await barber_ops.list_barbers(page, PAGE_SIZE, None, schedule_date)
+
+    rows = []
+    middle_day = FIRST_DAY + datetime.timedelta(days=days // 2)
+    for schedule_date in (None, middle_day):
+        for page in sorted({1, barbers // PAGE_SIZE // 2}):
+            pages = {}
+            for path, load in [
+                ("before", lambda: list_barbers_before(db_session, page, PAGE_SIZE, schedule_date)),
+                ("single query", lambda: cold(page, schedule_date)),
+                ("cached", lambda: cached(page, schedule_date)),
+            ]:
+                timings = Timings()
+                for _ in range(scaled(ROUNDS, minimum=3)):
+                    with count_queries() as queries, timings.measure():
+                        pages[path] = await load()
+                await db_session.commit()
+                rows.append({
+                    "schedule_date": schedule_date or "-",
+                    "page": page,
+                    "path": path,
+                    "queries": queries.count,
+                    **timings.summary(),
+                })
+
+            # Every path returns the same barbers
+            assert [barber.barber_id for barber in pages["before"]] == [barber.barber_id for barber in pages["cached"]]
+            assert [barber.barber_id for barber in pages["single query"]] == [barber.barber_id for barber in pages["cached"]]
+
+    report(f"Barber listing, {barbers} barbers x {days} schedules, {PAGE_SIZE} per page", rows)
+    assert {row["queries"] for row in rows if row["path"] == "single query"} == {1}
+    assert {row["queries"] for row in rows if row["path"] == "cached"} == {0}
+    assert {row["queries"] for row in rows if row["path"] == "before" and row["schedule_date"] != "-"} == {3}
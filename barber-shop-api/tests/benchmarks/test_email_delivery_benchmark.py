@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import aiosmtplib
+import pytest
+
+from bench import report, scaled
+from core.config import settings
+from core.smtp import smtp_pool
+from operations.email_operations import EmailOperations
+
+pytestmark = pytest.mark.benchmark
+
+EMAILS = 1000
+POOL_SIZE = 2
+# Connection setup of a server on localhost, and of one across a network with TLS and a login
+SETUP_DELAYS = [0.0, 0.02]
+
+
+# Delivery as it was with a mail client per email: connect, greet, send and quit every time,
+# as many at once as the pool has connections
+async def send_per_message(messages, concurrency: int):
+    config = settings.get_config()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(message):
+        async with slots:
+            await aiosmtplib.send(
+                message, hostname=config.mail_server, port=config.mail_port, timeout=config.email_send_timeout
+            )
+
+    await asyncio.gather(*(send(message) for message in messages))
+
+
+# 1000 emails delivered to the local SMTP sink over the pooled connections, against one connection per email
+async def test_email_delivery(fake_smtp, override_settings):
+    override_settings(EMAIL_POOL_SIZE=str(POOL_SIZE))
+    email_ops = EmailOperations()
+    count = scaled(EMAILS, minimum=POOL_SIZE)
+    messages = [
+        email_ops.build_message(f"customer{i}@example.com", "Appointment reminder", f"<p>See you soon, customer {i}</p>")
+        for i in range(count)
+    ]
+
+    rows = []
+    for setup_delay in SETUP_DELAYS:
+        fake_smtp.greeting_delay = setup_delay
+        for path in ("connection per email", "pooled connections"):
+            await smtp_pool.close()
+            fake_smtp.messages.clear()
+            connections = fake_smtp.connections
+
+            start = time.perf_counter()
+            if path == "pooled connections":
+                errors = await email_ops.send_many(messages)
+                assert errors == [None] * count
+            else:
+                await send_per_message(messages, POOL_SIZE)
+            elapsed = time.perf_counter() - start
+
+            assert len(fake_smtp.messages) == count
+            rows.append({
+                "setup_ms": setup_delay * 1000,
+                "path": path,
+                "emails": count,
+                "connections": fake_smtp.connections - connections,
+                "seconds": elapsed,
+                "emails_per_sec": count / elapsed,
+            })
+        # The pool never opens more connections than its size
+        assert rows[-1]["connections"] <= POOL_SIZE
+
+    report(f"Email delivery to a local SMTP sink, {POOL_SIZE} connections at a time", rows)
@@ -0,0 +1,76 @@
+import datetime
+import time
+
+import pytest
+
+from bench import report, scaled
+from core.email_templates import EmailTemplates
+
+pytestmark = pytest.mark.benchmark
+
+EMAILS = 10_000
+# Compiling for every email is slow enough that fewer emails give a stable rate
+COMPILED_EMAILS = 500
+TEMPLATES = ["appointment_booked", "appointment_reminder", "appointment_cancelled"]
+
+
+def context(i: int) -> dict:
+    return {
+        "appointment_id": i,
+        "first_name": f"Customer {i}",
+        "barber_name": f"Barber {i % 10}",
+        "starts_at": datetime.datetime(2025, 1, 1, 9) + datetime.timedelta(minutes=30 * i),
+    }
+
+
+# Render throughput of the appointment emails: templates compiled again for every email, as
+# without the cache, against the compiled templates rendered one call per email, in one batch
+# call, and in one batch call through the locale fallback
+def test_email_template_render():
+    count = scaled(EMAILS, minimum=10)
+    compiled_count = min(count, scaled(COMPILED_EMAILS, minimum=10))
+    contexts = [context(i) for i in range(count)]
+
+    rows = []
+    for name in TEMPLATES:
+        templates = EmailTemplates()
+        templates.load()
+        expected = templates.render_many(name, contexts)
+
+        start = time.perf_counter()
+        for i in range(compiled_count):
+            email = EmailTemplates().render(name, contexts[i])
+        compiled = time.perf_counter() - start
+        assert email == expected[compiled_count - 1]
+
+        paths = {
+            "compile per email": (compiled_count, compiled),
+        }
+        start = time.perf_counter()
+        emails = [templates.render(name, item) for item in contexts]
+        paths["cached, one call per email"] = (count, time.perf_counter() - start)
+        assert emails == expected
+
+        start = time.perf_counter()
+        emails = templates.render_many(name, contexts)
+        paths["cached, one batch"] = (count, time.perf_counter() - start)
+        assert emails == expected
+
+        # No pt-BR or pt variant ships, the lookup falls back to the default once and is remembered
+        start = time.perf_counter()
+        emails = templates.render_many(name, contexts, locale="pt-BR")
+        paths["cached, one batch, locale fallback"] = (count, time.perf_counter() - start)
+        assert emails == expected
+
+        for path, (rendered, elapsed) in paths.items():
+            rows.append({
+                "template": name,
+                "path": path,
+                "emails": rendered,
+                "seconds": elapsed,
+                "emails_per_sec": rendered / elapsed,
+            })
+        # Every template and the layout were compiled once
+        assert templates.stats()["compiled"] == len(templates.environment.list_templates(extensions=["html"]))
+
+    report("Appointment email rendering", rows)
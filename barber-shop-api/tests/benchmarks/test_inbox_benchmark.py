@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from bench import Timings, bulk_insert, count_queries, report, scaled
+from modules.message_schema import MessageResponse
+from modules.thread_schema import ThreadResponse
+from modules.user.models import Message, Thread
+from operations.thread_operations import ThreadOperations
+
+pytestmark = pytest.mark.benchmark
+
+THREADS = 1000
+MESSAGES_PER_THREAD = 100
+PAGE_SIZE = 20
+MESSAGE_LIMIT = 20
+ROUNDS = 20
+
+
+# The inbox load before the windowed query: the page of threads, then every message of each thread
+async def load_inbox_per_thread(db, user_id: int, page: int) -> list:
+    threads = await db.execute(
+        select(Thread)
+        .filter((Thread.receivingUser == user_id) | (Thread.sendingUser == user_id))
+        .order_by(Thread.thread_id)
+        .limit(PAGE_SIZE)
+        .offset((page - 1) * PAGE_SIZE)
+    )
+    responses = []
+    for thread in threads.scalars().all():
+        messages = await db.execute(select(Message).filter(Message.thread_id == thread.thread_id))
+        responses.append(ThreadResponse(
+            thread_id=thread.thread_id,
+            receivingUser=thread.receivingUser,
+            sendingUser=thread.sendingUser,
+            messages=[MessageResponse.model_validate(message) for message in messages.scalars()],
+        ))
+    return responses
+
+
+# A customer with 1k threads of 100 messages each, the inbox is loaded page by page
+async def test_inbox_load(shop, db_session):
+    user_id = shop.customer_ids[0]
+    others = shop.customer_ids[1:]
+    threads = scaled(THREADS, minimum=PAGE_SIZE)
+    messages_per_thread = scaled(MESSAGES_PER_THREAD, minimum=MESSAGE_LIMIT)
+
+    first_thread_id = (await db_session.execute(select(Thread.thread_id).order_by(Thread.thread_id.desc()))).scalar() or 0
+    await bulk_insert(db_session, Thread, (
+        {"receivingUser": user_id, "sendingUser": others[i % len(others)]} for i in range(threads)
+    ))
+    sent_at = datetime.datetime(2025, 1, 1)
+    await bulk_insert(db_session, Message, (
+        {"thread_id": first_thread_id + 1 + t, "hasActiveMessage": True, "text": f"message {m}",
+         "timeStamp": sent_at + datetime.timedelta(minutes=m)}
+        for t in range(threads)
+        for m in range(messages_per_thread)
+    ))
+
+    last_page = threads // PAGE_SIZE
+    thread_ops = ThreadOperations(db_session)
+    rows = []
+    for page in sorted({1, max(1, last_page // 2), last_page}):
+        for path, load in [
+            ("query per thread", lambda: load_inbox_per_thread(db_session, user_id, page)),
+            ("windowed", lambda: thread_ops.get_all_threads_by_user_id(user_id, page, PAGE_SIZE, MESSAGE_LIMIT)),
+        ]:
+            timings = Timings()
+            for _ in range(scaled(ROUNDS, minimum=3)):
+                with count_queries() as queries, timings.measure():
+                    inbox = await load()
+            rows.append({
+                "page": page,
+                "path": path,
+                "queries": queries.count,
+                "messages": sum(len(thread.messages) for thread in inbox),
+                **timings.summary(),
+            })
+            await db_session.commit()
+
+    report(f"Inbox of {threads} threads x {messages_per_thread} messages, {PAGE_SIZE} threads per page", rows)
+    windowed = [row for row in rows if row["path"] == "windowed"]
+    # The user lookup, the page of threads and one query for all their messages, on every page
+    assert {row["queries"] for row in windowed} == {3}
+    assert {row["messages"] for row in windowed} == {PAGE_SIZE * MESSAGE_LIMIT}
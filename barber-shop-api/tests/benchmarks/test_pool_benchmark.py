@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from bench import Timings, report, scaled
+from conftest import auth_headers
+from core.db import async_session_manager
+
+pytestmark = pytest.mark.benchmark
+
+REQUESTS = 2000
+# Requests in flight at once, a booking burst
+CONCURRENCY = 50
+
+# (pool_size, max_overflow) configurations swept
+POOL_CONFIGURATIONS = [(1, 0), (2, 0), (5, 0), (5, 10), (10, 10), (20, 0)]
+
+
+# Read throughput per pool configuration, on a SQLite file standing in for MySQL.
+# The seeded engine opens every transaction with BEGIN IMMEDIATE, which would serialize
+# readers regardless of the pool, so each configuration gets a plain engine of its own.
+async def test_pool_size_sweep(client, shop, monkeypatch):
+    headers = auth_headers("barber")
+    paths = [f"/api/v1/schedules/{shop.schedule_ids[0]}", "/api/v1/appointments?limit=20"]
+    requests = scaled(REQUESTS)
+    engine_kwargs = async_session_manager._engine_kwargs
+
+    rows = []
+    for pool_size, max_overflow in POOL_CONFIGURATIONS:
+        await async_session_manager.close()
+        monkeypatch.setattr(
+            async_session_manager,
+            "_engine_kwargs",
+            {**engine_kwargs, "pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": 30},
+        )
+        async_session_manager.init()
+
+        slots = asyncio.Semaphore(CONCURRENCY)
+        latencies = Timings()
+
+        async def get(path):
+            async with slots:
+                with latencies.measure():
+                    response = await client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(get(paths[i % len(paths)]) for i in range(requests)))
+        elapsed = loop.time() - start
+
+        pool = async_session_manager.pool_status()
+        summary = latencies.summary()
+        rows.append({
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "requests_per_sec": requests / elapsed,
+            "median_ms": summary["median_ms"],
+            "p99_ms": summary["p99_ms"],
+            "checkout_wait_avg_ms": pool["wait_time_avg"] * 1000,
+            "checkout_wait_max_ms": pool["wait_time_max"] * 1000,
+            "timeouts": pool["timeouts"],
+        })
+        assert pool["checkouts"] >= requests
+
+    report(f"Pool size sweep, {CONCURRENCY} concurrent readers", rows)
@@ -0,0 +1,127 @@
+import datetime
+import heapq
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from bench import Timings, bulk_insert, report, scaled
+from core.db import async_session_manager
+from modules.user.models import (
+    Appointment,
+    AppointmentReminder,
+    AppointmentStatus,
+    Appointment_TimeSlot,
+    EmailOutbox,
+    ReminderStatus,
+)
+from operations import notification_scheduler as scheduler_module
+from operations.email_outbox_operations import utc_now
+from operations.notification_operations import NotificationOperations
+from operations.notification_scheduler import NotificationScheduler
+
+pytestmark = pytest.mark.benchmark
+
+REMINDERS = 100_000
+CLAIM_BATCH_SIZES = [50, 200, 1000]
+ROUNDS = 20
+
+
+async def count_rows(db, column) -> int:
+    count = (await db.execute(select(func.count(column)))).scalar()
+    await db.commit()
+    return count
+
+
+# 100k reminders of appointments on the shop's day, all of them due
+async def seed_reminders(db, shop, count: int, send_at: datetime.datetime):
+    await bulk_insert(db, Appointment, (
+        {
+            "appointment_id": i,
+            "appointment_date": shop.date,
+            "user_id": shop.customer_ids[i % len(shop.customer_ids)],
+            "barber_id": shop.barber_ids[i % len(shop.barber_ids)],
+            "status": AppointmentStatus.confirmed,
+        }
+        for i in range(1, count + 1)
+    ))
+    await bulk_insert(db, Appointment_TimeSlot, (
+        {
+            "appointment_id": i,
+            "slot_id": shop.slot_ids[shop.barber_ids[i % len(shop.barber_ids)]][i % 8],
+        }
+        for i in range(1, count + 1)
+    ))
+    await bulk_insert(db, AppointmentReminder, (
+        {"appointment_id": i, "send_at": send_at, "status": ReminderStatus.pending}
+        for i in range(1, count + 1)
+    ))
+
+
+# 100k scheduled reminders: keeping their due times in the scheduler's heap, reloading the
+# heap from the table, then moving all of them to the email outbox in claimed batches,
+# at several batch sizes
+async def test_reminder_throughput(shop, db_session, monkeypatch):
+    count = scaled(REMINDERS, minimum=max(CLAIM_BATCH_SIZES))
+    rounds = scaled(ROUNDS, minimum=3)
+
+    # Due times pushed by the workers that schedule them, one at a time
+    now = utc_now()
+    send_times = [now + datetime.timedelta(seconds=(i * 7919) % count) for i in range(count)]
+    scheduler = NotificationScheduler()
+    start = time.perf_counter()
+    for send_at in send_times:
+        scheduler.schedule(send_at)
+    pushed = time.perf_counter() - start
+    assert scheduler._heap[0] == min(send_times)
+    popped = [heapq.heappop(scheduler._heap) for _ in range(len(scheduler._heap))]
+    assert popped == sorted(send_times)
+
+    rows = [{
+        "step": "schedule in heap",
+        "batch_size": "",
+        "reminders": count,
+        "seconds": pushed,
+        "reminders_per_sec": count / pushed,
+    }]
+
+    for batch_size in CLAIM_BATCH_SIZES:
+        await seed_reminders(db_session, shop, count, utc_now() - datetime.timedelta(minutes=1))
+
+        refresh = Timings()
+        for _ in range(rounds):
+            with refresh.measure():
+                await scheduler.refresh()
+        assert len(scheduler._heap) == scheduler_module.HEAP_SIZE
+        rows.append({
+            "step": "reload heap",
+            "batch_size": "",
+            "reminders": scheduler_module.HEAP_SIZE,
+            "seconds": refresh.summary()["median_ms"] / 1000,
+        })
+
+        monkeypatch.setattr(scheduler_module, "CLAIM_BATCH_SIZE", batch_size)
+        scheduler.batches = scheduler.claimed = 0
+        start = time.perf_counter()
+        await scheduler.dispatch_due()
+        elapsed = time.perf_counter() - start
+
+        # Every reminder went to the outbox once, in as many transactions as there are batches
+        assert scheduler.claimed == count
+        assert scheduler.batches == count // batch_size + 1
+        assert await count_rows(db_session, EmailOutbox.email_id) == count
+        async with async_session_manager.session() as session:
+            assert await NotificationOperations(session).upcoming_send_times(1) == []
+        rows.append({
+            "step": "claim and enqueue",
+            "batch_size": batch_size,
+            "reminders": count,
+            "seconds": elapsed,
+            "reminders_per_sec": count / elapsed,
+        })
+
+        for model in (EmailOutbox, AppointmentReminder, Appointment_TimeSlot, Appointment):
+            await db_session.execute(model.__table__.delete())
+        await db_session.commit()
+
+    report(f"{count} scheduled reminders", rows)
@@ -0,0 +1,105 @@
+import datetime
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from bench import bulk_insert, count_queries, report, scaled
+from modules.roster_schema import RosterCreate, RosterRule
+from modules.user.models import Barber, Schedule, TimeSlot, User
+from operations.schedule_operations import ScheduleOperations
+
+pytestmark = pytest.mark.benchmark
+
+BARBERS = 50
+DAYS = 90
+OPEN = datetime.time(9)
+CLOSE = datetime.time(17)
+SLOT_MINUTES = 30
+FIRST_DAY = datetime.date(2025, 1, 6)
+
+
+async def seed_barbers(db, count: int, prefix: str) -> list[int]:
+    await bulk_insert(db, User, (
+        {"kc_id": f"kc-{prefix}-{i}", "firstName": "Barber", "lastName": str(i), "email": f"{prefix}{i}@example.com",
+         "password": "test", "phoneNumber": f"{7000000000 + i}" if prefix == "a" else f"{8000000000 + i}"}
+        for i in range(count)
+    ))
+    user_ids = (await db.execute(select(User.user_id).filter(User.kc_id.like(f"kc-{prefix}-%")))).scalars().all()
+    await bulk_insert(db, Barber, ({"user_id": user_id} for user_id in user_ids))
+    return (await db.execute(select(Barber.barber_id).filter(Barber.user_id.in_(user_ids)))).scalars().all()
+
+
+def day_slots() -> list[tuple[datetime.time, datetime.time]]:
+    slots = []
+    start = datetime.datetime.combine(FIRST_DAY, OPEN)
+    while start.time() < CLOSE:
+        end = start + datetime.timedelta(minutes=SLOT_MINUTES)
+        slots.append((start.time(), end.time()))
+        start = end
+    return slots
+
+
+# Publishing a day before the roster endpoint: the schedule is committed, then its slots are added one by one
+async def create_schedule_per_call(db, barber_id: int, date: datetime.date, slots):
+    schedule = Schedule(barber_id=barber_id, date=date, is_working=True)
+    db.add(schedule)
+    await db.commit()
+    await db.refresh(schedule)
+    for start_time, end_time in slots:
+        db.add(TimeSlot(schedule_id=schedule.schedule_id, start_time=start_time, end_time=end_time, is_available=True))
+    await db.commit()
+
+
+async def row_counts(db, barber_ids) -> tuple[int, int]:
+    schedules = (await db.execute(
+        select(func.count()).select_from(Schedule).filter(Schedule.barber_id.in_(barber_ids))
+    )).scalar()
+    slots = (await db.execute(
+        select(func.count()).select_from(TimeSlot).join(Schedule).filter(Schedule.barber_id.in_(barber_ids))
+    )).scalar()
+    await db.commit()
+    return schedules, slots
+
+
+# A 50 barber x 90 day roster, published one schedule per call and as one roster
+async def test_roster_generation(db_session):
+    barbers, days = scaled(BARBERS, minimum=2), scaled(DAYS, minimum=7)
+    per_call_barbers = await seed_barbers(db_session, barbers, "a")
+    roster_barbers = await seed_barbers(db_session, barbers, "b")
+    schedule_ops = ScheduleOperations(db_session)
+    slots = day_slots()
+
+    rows = []
+    start = time.perf_counter()
+    with count_queries() as queries:
+        for barber_id in per_call_barbers:
+            for day in range(days):
+                await create_schedule_per_call(db_session, barber_id, FIRST_DAY + datetime.timedelta(days=day), slots)
+    rows.append({"path": "one call per schedule", "seconds": time.perf_counter() - start, "queries": queries.count})
+    per_call_rows = await row_counts(db_session, per_call_barbers)
+
+    roster = RosterCreate(rules=[RosterRule(
+        barber_ids=roster_barbers,
+        start_date=FIRST_DAY,
+        end_date=FIRST_DAY + datetime.timedelta(days=days - 1),
+        weekdays=list(range(7)),
+        open_time=OPEN,
+        close_time=CLOSE,
+        slot_minutes=SLOT_MINUTES,
+    )])
+    results = {}
+    for path in ("roster", "roster posted again"):
+        start = time.perf_counter()
+        with count_queries() as queries:
+            results[path] = await schedule_ops.generate_roster(roster)
+        rows.append({"path": path, "seconds": time.perf_counter() - start, "queries": queries.count})
+
+    report(f"Roster of {barbers} barbers x {days} days, {len(slots)} slots a day", rows)
+    expected_schedules = barbers * days
+    assert per_call_rows == (expected_schedules, expected_schedules * len(slots))
+    assert await row_counts(db_session, roster_barbers) == per_call_rows
+    assert results["roster"].schedules_inserted == expected_schedules
+    assert results["roster"].time_slots_inserted == expected_schedules * len(slots)
+    assert results["roster posted again"].schedules_inserted == 0
+    assert results["roster posted again"].time_slots_inserted == 0
@@ -0,0 +1,83 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from bench import Timings, bulk_insert, report, scaled
+from conftest import auth_headers
+from modules.user.models import Schedule, TimeSlot
+
+pytestmark = pytest.mark.benchmark
+
+SLOT_COUNTS = [8, 32, 128, 512]
+ROUNDS = 20
+FIRST_DAY = datetime.date(2025, 1, 1)
+NEW_SLOTS_FROM = datetime.datetime.combine(FIRST_DAY, datetime.time(12))
+
+
+def minutes_after(start: datetime.datetime, minutes: int) -> str:
+    return (start + datetime.timedelta(minutes=minutes)).time().isoformat()
+
+
+# A schedule of one minute slots from midnight, returns its id and slot ids in time order
+async def seed_schedule(db, barber_id: int, date: datetime.date, slots: int) -> tuple[int, list[int]]:
+    schedule = Schedule(barber_id=barber_id, date=date, is_working=True)
+    db.add(schedule)
+    await db.flush()
+    schedule_id = schedule.schedule_id
+    midnight = datetime.datetime.combine(date, datetime.time(0))
+    await bulk_insert(db, TimeSlot, (
+        {"schedule_id": schedule_id, "start_time": (midnight + datetime.timedelta(minutes=i)).time(),
+         "end_time": (midnight + datetime.timedelta(minutes=i + 1)).time(), "is_available": True, "is_booked": False}
+        for i in range(slots)
+    ))
+    slot_ids = (await db.execute(
+        select(TimeSlot.slot_id).filter(TimeSlot.schedule_id == schedule_id).order_by(TimeSlot.start_time)
+    )).scalars().all()
+    await db.commit()
+    return schedule_id, slot_ids
+
+
+# An edit of the whole day: a quarter of the slots removed, a quarter closed, the rest kept,
+# and a quarter as many new slots added in the afternoon
+def edit(slot_ids: list[int]) -> list[dict]:
+    time_slots = []
+    for i, slot_id in enumerate(slot_ids):
+        if i % 4 == 0:
+            continue
+        time_slots.append({"slot_id": slot_id, "is_available": i % 4 != 1})
+    for i in range(len(slot_ids) // 4):
+        time_slots.append({
+            "start_time": minutes_after(NEW_SLOTS_FROM, i),
+            "end_time": minutes_after(NEW_SLOTS_FROM, i + 1),
+        })
+    return time_slots
+
+
+# PUT /schedules/{id} with a full day's edit, at growing slot counts
+async def test_schedule_slot_edit(client, shop, db_session):
+    headers = auth_headers("barber")
+    barber_id = shop.barber_ids[0]
+    rows = []
+    day = 0
+    for slots in SLOT_COUNTS:
+        timings = Timings()
+        counts = set()
+        for _ in range(scaled(ROUNDS, minimum=3)):
+            day += 1
+            schedule_id, slot_ids = await seed_schedule(
+                db_session, barber_id, FIRST_DAY + datetime.timedelta(days=day), slots
+            )
+            with timings.measure():
+                response = await client.put(
+                    f"/api/v1/schedules/{schedule_id}", json={"time_slots": edit(slot_ids)}, headers=headers
+                )
+            assert response.status_code == 200, response.text
+            # As many slots added as removed
+            assert len(response.json()["time_slots"]) == slots
+            counts.add(int(response.headers["X-DB-Query-Count"]))
+        rows.append({"slots": slots, "queries": ",".join(map(str, sorted(counts))), **timings.summary()})
+
+    report("Schedule edit, a quarter of the slots each removed, closed and added", rows)
+    # The same statements whatever the number of slots
+    assert len({row["queries"] for row in rows}) == 1
@@ -0,0 +1,110 @@
+import datetime
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from bench import Timings, report, scaled
+from modules.user.models import Barber, BarberDailyAvailability, Schedule, Service, TimeSlot, User
+from routers.barber_router import barber_router
+from routers.schedule_router import schedule_router
+from routers.service_router import service_router
+from routers.user_router import user_router
+
+pytestmark = pytest.mark.benchmark
+
+ITEM_COUNTS = [10, 100, 1000]
+ROUNDS = 20
+SLOTS_PER_SCHEDULE = 8
+DAY = datetime.date(2025, 1, 1)
+
+
+def user(i: int) -> User:
+    return User(user_id=i, kc_id=f"kc-{i}", firstName="First", lastName=f"Last {i}",
+                email=f"user{i}@example.com", password="test", phoneNumber=f"{i:010d}", is_admin=False)
+
+
+def barber(i: int) -> Barber:
+    return Barber(barber_id=i, user_id=i, user=user(i))
+
+
+def schedule(i: int) -> Schedule:
+    start = datetime.datetime.combine(DAY, datetime.time(9))
+    time_slots = [
+        TimeSlot(slot_id=i * SLOTS_PER_SCHEDULE + n, schedule_id=i,
+                 start_time=(start + datetime.timedelta(minutes=30 * n)).time(),
+                 end_time=(start + datetime.timedelta(minutes=30 * (n + 1))).time(),
+                 is_available=True, is_booked=n % 3 == 0)
+        for n in range(SLOTS_PER_SCHEDULE)
+    ]
+    return Schedule(schedule_id=i, barber_id=i, date=DAY, is_working=True, barber=barber(i), time_slots=time_slots)
+
+
+def daily_availability(i: int) -> BarberDailyAvailability:
+    return BarberDailyAvailability(barber_id=i, date=DAY, free_slots=5,
+                                   first_free=datetime.time(9), last_free=datetime.time(15))
+
+
+def service(i: int) -> Service:
+    return Service(service_id=i, name=f"Service {i}", duration=30, price=20.0, category="Hair",
+                   description=f"Service number {i}", popularity_score=i)
+
+
+# List endpoints and the rows their operations return, built in memory so only serialization is timed
+ENDPOINTS = {
+    "/api/v1/users": user,
+    "/api/v1/barbers": barber,
+    "/api/v1/schedules": schedule,
+    "/api/v1/barbers/availability/calendar": daily_availability,
+    "/api/v1/services": service,
+}
+
+
+# The schemas as they were built before model_construct, validated field by field from the row
+def validate_rows(rows, schemas) -> list:
+    return [type(schema).model_validate(row, from_attributes=True) for row, schema in zip(rows, schemas)]
+
+
+# Serialization cost of each list endpoint at 10, 100 and 1000 items: building the response
+# schemas validated or constructed, then FastAPI's response_model check and JSON rendering,
+# by pydantic-core (the default path) or by the stdlib json module of JSONResponse
+async def test_list_serialization():
+    fields = {
+        route.path: route.response_field
+        for router in (user_router, barber_router, schedule_router, service_router)
+        for route in router.routes
+        if getattr(route, "response_field", None) is not None and "GET" in route.methods
+    }
+    rounds = scaled(ROUNDS, minimum=3)
+    rows = []
+    for path, make_row in ENDPOINTS.items():
+        field = fields[path]
+        for count in ITEM_COUNTS:
+            items = [make_row(i) for i in range(1, count + 1)]
+            validated, constructed, dump_json, stdlib_json = Timings(), Timings(), Timings(), Timings()
+            for _ in range(rounds):
+                with constructed.measure():
+                    schemas = [item.to_response_schema() for item in items]
+                with validated.measure():
+                    validate_rows(items, schemas)
+                with dump_json.measure():
+                    body = await serialize_response(field=field, response_content=schemas, dump_json=True)
+                with stdlib_json.measure():
+                    content = await serialize_response(field=field, response_content=schemas)
+                    JSONResponse(content)
+
+            # Constructed and validated schemas render the same JSON
+            assert body == await serialize_response(
+                field=field, response_content=validate_rows(items, schemas), dump_json=True
+            ), path
+            rows.append({
+                "endpoint": path,
+                "items": count,
+                "build_validated_ms": validated.summary()["median_ms"],
+                "build_constructed_ms": constructed.summary()["median_ms"],
+                "render_pydantic_core_ms": dump_json.summary()["median_ms"],
+                "render_stdlib_json_ms": stdlib_json.summary()["median_ms"],
+                "bytes": len(body),
+            })
+
+    report(f"List response serialization, median of {rounds} rounds", rows)
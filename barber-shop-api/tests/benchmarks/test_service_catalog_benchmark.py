@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from bench import Timings, bulk_insert, report, scaled
+from core.db import async_session_manager
+from modules.user.models import Service
+from operations.service_catalog import CatalogSnapshot, service_catalog
+
+pytestmark = pytest.mark.benchmark
+
+REQUESTS = 5000
+# Clients polling the catalog at once
+CONCURRENCY = 20
+SERVICES = 40
+
+
+# The catalog as it was read before the cache: every request selects the whole service table
+async def load_every_time(db) -> CatalogSnapshot:
+    result = await db.execute(select(Service).order_by(Service.service_id))
+    services = tuple(service.to_response_schema() for service in result.scalars().all())
+    return CatalogSnapshot(version=1, services=services, by_id={service.service_id: service for service in services})
+
+
+# Requests/sec of GET /api/v1/services with the catalog read per request, from the cache, and revalidated by ETag.
+# As in the pool sweep, the reads run on a plain engine: the seeded one opens every transaction
+# with BEGIN IMMEDIATE, and concurrent readers would fail on a locked database
+async def test_service_catalog_load(client, shop, db_session, monkeypatch):
+    await bulk_insert(db_session, Service, (
+        {"name": f"Service {i}", "duration": 30, "price": 20.0, "category": "Hair",
+         "description": f"Service number {i}", "popularity_score": i}
+        for i in range(SERVICES)
+    ))
+    await async_session_manager.close()
+    async_session_manager.init()
+    requests = scaled(REQUESTS, minimum=CONCURRENCY)
+    params = {"limit": 100}
+
+    async def load(headers: dict, expected_status: int) -> dict:
+        slots = asyncio.Semaphore(CONCURRENCY)
+        latencies = Timings()
+
+        async def get():
+            async with slots:
+                with latencies.measure():
+                    response = await client.get("/api/v1/services", params=params, headers=headers)
+            assert response.status_code == expected_status, response.text
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(get() for _ in range(requests)))
+        elapsed = loop.time() - start
+        summary = latencies.summary()
+        return {"requests_per_sec": requests / elapsed, "median_ms": summary["median_ms"], "p99_ms": summary["p99_ms"]}
+
+    rows = []
+    with monkeypatch.context() as patch:
+        patch.setattr(service_catalog, "get", load_every_time)
+        rows.append({"path": "table read per request", **await load({}, 200)})
+
+    etag = (await client.get("/api/v1/services", params=params)).headers["ETag"]
+    reloads = service_catalog.reloads
+    rows.append({"path": "cached catalog", **await load({}, 200)})
+    rows.append({"path": "cached catalog, If-None-Match", **await load({"If-None-Match": etag}, 304)})
+
+    report(f"GET /api/v1/services, {SERVICES + len(shop.service_ids)} services, {CONCURRENCY} concurrent clients", rows)
+    # The catalog is never reloaded while it does not change
+    assert service_catalog.reloads == reloads
@@ -0,0 +1,40 @@
+import pytest
+
+from auth.service import AuthService
+from bench import Timings, report, scaled
+from conftest import make_token
+
+pytestmark = pytest.mark.benchmark
+
+TOKENS = 2000
+
+
+# Token verification through KeycloakOpenID.decode_token, which fetches the realm keys on every
+# call, against the local verifier on first sight of each token and on repeat requests
+async def test_token_verification(fake_keycloak):
+    tokens = [make_token("barber", subject=f"user-{i}") for i in range(scaled(TOKENS))]
+    verifier = AuthService.token_verifier
+
+    decode_token = Timings()
+    for token in tokens:
+        with decode_token.measure():
+            AuthService.keycloak_openid.decode_token(token, validate=True)
+
+    first_sight = Timings()
+    for token in tokens:
+        with first_sight.measure():
+            await AuthService.verify_token(token)
+
+    hits_before = verifier.hits
+    repeated = Timings()
+    for token in tokens:
+        with repeated.measure():
+            await AuthService.verify_token(token)
+
+    report("Access token verification", [
+        {"path": "decode_token(validate=True)", **decode_token.summary()},
+        {"path": "verifier, new token", **first_sight.summary()},
+        {"path": "verifier, cached token", **repeated.summary()},
+    ])
+    assert fake_keycloak.count("certs") == len(tokens)
+    assert verifier.hits - hits_before == len(tokens)
@@ -0,0 +1,159 @@
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from bench import Timings, bulk_insert, count_queries, report, scaled
+from conftest import auth_headers
+from modules.user.models import User
+from operations.user_operations import IMPORT_BATCH_SIZE, UserOperations
+
+pytestmark = pytest.mark.benchmark
+
+STORED_USERS = 100_000
+IMPORTED_USERS = 5000
+ROUNDS = 500
+
+
+def user_row(i: int) -> dict:
+    return {
+        "kc_id": f"kc-{i}",
+        "firstName": "Stored",
+        "lastName": f"User {i}",
+        "email": f"stored{i}@example.com",
+        "password": "secret",
+        "phoneNumber": f"{i:010d}",
+        "is_admin": False,
+    }
+
+
+def new_user(i: int) -> dict:
+    return {
+        "firstName": "New",
+        "lastName": f"User {i}",
+        "email": f"new{i}@example.com",
+        "phoneNumber": f"9{i:09d}",
+        "password": "secret",
+    }
+
+
+def as_csv(users: list[dict]) -> str:
+    columns = list(users[0])
+    return "\n".join([",".join(columns)] + [",".join(user[column] for column in columns) for user in users]) + "\n"
+
+
+def as_jsonl(users: list[dict]) -> str:
+    return "".join(json.dumps(user) + "\n" for user in users)
+
+
+# The lookups as they were before the combined check, one SELECT per column
+async def check_unique_per_column(db, email: str, phone_number: str):
+    if (await db.execute(select(User).filter(User.email == email))).scalars().first():
+        raise HTTPException(status_code=400)
+    if (await db.execute(select(User).filter(User.phoneNumber == phone_number))).scalars().first():
+        raise HTTPException(status_code=400)
+
+
+async def user_count(db) -> int:
+    count = (await db.execute(select(func.count()).select_from(User))).scalar()
+    await db.commit()
+    return count
+
+
+# Uniqueness checks against 100k stored users, one SELECT per column against the combined
+# lookup, for a free email and phone number, for taken ones, and for an update keeping its own
+async def test_user_uniqueness_check(db_session):
+    stored = scaled(STORED_USERS, minimum=100)
+    await bulk_insert(db_session, User, (user_row(i) for i in range(stored)))
+    rounds = scaled(ROUNDS, minimum=10)
+    user_ops = UserOperations(db_session)
+    own = (await db_session.execute(select(User.user_id).filter(User.email == "stored0@example.com"))).scalar()
+
+    cases = {
+        "free": lambda i: (f"free{i}@example.com", f"8{i:09d}", None),
+        "email taken": lambda i: (f"stored{i % stored}@example.com", f"8{i:09d}", None),
+        "phone taken": lambda i: (f"free{i}@example.com", f"{i % stored:010d}", None),
+        "update keeping its own": lambda i: ("stored0@example.com", f"{0:010d}", own),
+    }
+    rows = []
+    for case, values in cases.items():
+        for path in ("query per column", "combined query"):
+            if path == "query per column" and values(0)[2] is not None:
+                # The old checks treated a user's own email as taken, nothing comparable to time
+                continue
+            timings = Timings()
+            conflicts = 0
+            with count_queries() as stats:
+                for i in range(rounds):
+                    email, phone_number, exclude_user_id = values(i)
+                    with timings.measure():
+                        try:
+                            if path == "combined query":
+                                await user_ops.check_unique(email, phone_number, exclude_user_id)
+                            else:
+                                await check_unique_per_column(db_session, email, phone_number)
+                        except HTTPException:
+                            conflicts += 1
+            await db_session.commit()
+            assert conflicts == (0 if case in ("free", "update keeping its own") else rounds)
+            rows.append({
+                "case": case,
+                "path": path,
+                "queries_per_check": stats.count / rounds,
+                **timings.summary(),
+            })
+
+    report(f"User uniqueness checks against {stored} stored users", rows)
+
+
+# Creating users one request at a time against the bulk import, as CSV and as JSON Lines.
+# Keycloak is the local stand-in, so registrations cost a local HTTP call each
+async def test_user_import(client, db_session, fake_keycloak):
+    count = scaled(IMPORTED_USERS, minimum=10)
+    headers = auth_headers("barber")
+    users = [new_user(i) for i in range(count * 3)]
+
+    rows = []
+    start = time.perf_counter()
+    queries = 0
+    for user in users[:count]:
+        response = await client.post("/api/v1/users", json=user)
+        assert response.status_code == 200, response.text
+        queries += int(response.headers["X-DB-Query-Count"])
+    elapsed = time.perf_counter() - start
+    rows.append({
+        "path": "one request per user",
+        "users": count,
+        "requests": count,
+        "queries": queries,
+        "seconds": elapsed,
+        "users_per_sec": count / elapsed,
+    })
+
+    for path, batch, format, body in [
+        ("bulk import, csv", users[count:count * 2], "csv", as_csv),
+        ("bulk import, jsonl", users[count * 2:], "jsonl", as_jsonl),
+    ]:
+        start = time.perf_counter()
+        response = await client.post(f"/api/v1/users/import?format={format}", content=body(batch), headers=headers)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.text
+        assert response.json() == {"created": count, "failed": 0, "errors": []}
+        rows.append({
+            "path": path,
+            "users": count,
+            "requests": 1,
+            "queries": int(response.headers["X-DB-Query-Count"]),
+            "seconds": elapsed,
+            "users_per_sec": count / elapsed,
+        })
+
+    # Each import batch costs one lookup and one multi-row insert
+    batches = -(-count // IMPORT_BATCH_SIZE)
+    assert [row["queries"] for row in rows[1:]] == [2 * batches] * 2
+    assert await user_count(db_session) == count * 3
+    assert len(fake_keycloak.users) == count * 3
+
+    report(f"Creating {count} users, Keycloak on localhost", rows)
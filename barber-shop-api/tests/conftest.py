@@ -0,0 +1,275 @@
+'''
+Shared fixtures for the API tests.
+
+Every test runs the app against its own SQLite file through aiosqlite, Keycloak and SMTP are
+never contacted, local fakes stand in for them where a test needs one. Transactions open with BEGIN IMMEDIATE, so concurrent requests queue for the
+database one transaction at a time, the way they queue for row locks on MySQL. Tokens are
+signed with a test key that is loaded into the token verifier in place of the realm keys.
+'''
+import asyncio
+import datetime
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+# Settings are parsed when core.config is imported, so the environment is filled in first
+TEST_ENVIRONMENT = {
+    "SECRET_KEY": "test",
+    "MYSQL_USER": "test",
+    "MYSQL_PASSWORD": "test",
+    "MYSQL_DB": "test",
+    "MYSQL_HOST": "127.0.0.1",
+    "MYSQL_PORT": "3306",
+    "MYSQL_ECHO": "false",
+    "DEBUG": "true",
+    "BACKEND_CORS_ORIGINS": "http://localhost:5173",
+    "FRONTEND_HOST": "http://localhost:5173",
+    "KEYCLOAK_SERVER_URL": "http://127.0.0.1:9/",
+    "KEYCLOAK_REALM": "test",
+    "KEYCLOAK_API_CLIENT_ID": "test",
+    "KEYCLOAK_FRONT_END_CLIENT_ID": "test",
+    "KEYCLOAK_API_SECRET": "test",
+    "KEYCLOAK_FRONT_END_SECRET": "test",
+    "KEYCLOAK_ADMIN_USERNAME": "test",
+    "KEYCLOAK_ADMIN_PASSWORD": "test",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "shop@example.com",
+    "MAIL_PORT": "25",
+    "MAIL_SERVER": "127.0.0.1",
+    "MAIL_TLS": "false",
+    "MAIL_SSL": "false",
+    "USE_CREDENTIALS": "false",
+}
+for name, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+import pytest
+from jwcrypto import jwk, jwt
+from keycloak import KeycloakAdmin, KeycloakOpenID, KeycloakOpenIDConnection
+from sqlalchemy import event
+
+from auth.service import AuthService
+from fake_keycloak import FakeKeycloak
+from fake_smtp import FakeSMTP
+from core.config import settings
+from core.db import async_session_manager
+from core.smtp import smtp_pool
+from modules.user.models import Barber, Base, Schedule, Service, TimeSlot, User
+from operations.barber_operations import barber_list_cache
+from operations.service_catalog import service_catalog
+
+SIGNING_KEY_ID = "test-key"
+SIGNING_KEY = jwk.JWK.generate(kty="RSA", size=2048, kid=SIGNING_KEY_ID)
+
+# Day the seeded schedules are on, far enough ahead that every slot is in the future
+SHOP_DATE = datetime.date.today() + datetime.timedelta(days=7)
+
+
+# Signs an access token carrying the given realm roles
+def make_token(*roles: str, subject: str = "test-user") -> str:
+    token = jwt.JWT(
+        header={"alg": "RS256", "kid": SIGNING_KEY_ID},
+        claims={
+            "sub": subject,
+            "preferred_username": subject,
+            "email": f"{subject}@example.com",
+            "name": "Test User",
+            "given_name": "Test",
+            "family_name": "User",
+            "exp": int(time.time()) + 600,
+            "realm_access": {"roles": list(roles)},
+        },
+    )
+    token.make_signed_token(SIGNING_KEY)
+    return token.serialize()
+
+
+def auth_headers(*roles: str) -> dict:
+    return {"Authorization": f"Bearer {make_token(*roles)}"}
+
+
+EXPLAIN_CALLS = itertools.count()
+
+
+# Statements sent to the database inside the block, as (sql, parameters) pairs
+@contextmanager
+def capture_statements(engine):
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+# SQLite's plan for a captured statement, one detail line per step.
+# sqlite3 reuses prepared statements by their text and a reused EXPLAIN is not planned again
+# after the schema changes, so every call is made a new statement with a numbered comment
+async def explain_query_plan(session, statement: str, parameters) -> list[str]:
+    connection = await session.connection()
+    result = await connection.exec_driver_sql(
+        f"EXPLAIN QUERY PLAN /* {next(EXPLAIN_CALLS)} */ {statement}", parameters
+    )
+    return [row[-1] for row in result]
+
+
+# Each test starts from empty in-process caches, its database is a new one
+@pytest.fixture(autouse=True)
+def reset_process_state(monkeypatch):
+    monkeypatch.setattr(AuthService.token_verifier, "_keys", {SIGNING_KEY_ID: SIGNING_KEY})
+    monkeypatch.setattr(AuthService.token_verifier, "_refresh_lock", asyncio.Lock())
+    AuthService.token_verifier.clear()
+    monkeypatch.setattr(service_catalog, "_snapshot", None)
+    service_catalog.invalidate()
+    barber_list_cache.invalidate()
+
+
+# Reloads the settings with some variables changed, the test environment is restored afterwards
+@pytest.fixture
+def override_settings():
+    saved = dict(os.environ)
+
+    def override(**environment: str):
+        os.environ.update(environment)
+        settings.reload()
+
+    yield override
+    os.environ.clear()
+    os.environ.update(saved)
+    settings.reload()
+
+
+# A local Keycloak serving the test signing key and the admin API, AuthService talks to it
+@pytest.fixture
+def fake_keycloak(monkeypatch):
+    keycloak = FakeKeycloak(TEST_ENVIRONMENT["KEYCLOAK_REALM"], [SIGNING_KEY])
+    keycloak.start()
+    keycloak_openid = KeycloakOpenID(
+        server_url=keycloak.url,
+        realm_name=keycloak.realm,
+        client_id=TEST_ENVIRONMENT["KEYCLOAK_API_CLIENT_ID"],
+    )
+    keycloak_admin = KeycloakAdmin(connection=KeycloakOpenIDConnection(
+        server_url=keycloak.url,
+        username=TEST_ENVIRONMENT["KEYCLOAK_ADMIN_USERNAME"],
+        password=TEST_ENVIRONMENT["KEYCLOAK_ADMIN_PASSWORD"],
+        realm_name=keycloak.realm,
+        client_id=TEST_ENVIRONMENT["KEYCLOAK_API_CLIENT_ID"],
+        client_secret_key=TEST_ENVIRONMENT["KEYCLOAK_API_SECRET"],
+    ))
+    monkeypatch.setattr(AuthService, "keycloak_openid", keycloak_openid)
+    monkeypatch.setattr(AuthService.token_verifier, "keycloak_openid", keycloak_openid)
+    monkeypatch.setattr(AuthService, "keycloak_admin", keycloak_admin)
+    yield keycloak
+    keycloak.stop()
+
+
+# A local SMTP server the pooled connections deliver to, the pool is emptied afterwards
+@pytest.fixture
+async def fake_smtp(override_settings):
+    server = FakeSMTP()
+    await server.start()
+    override_settings(MAIL_SERVER="127.0.0.1", MAIL_PORT=str(server.port))
+    yield server
+    await smtp_pool.close()
+    await server.stop()
+
+
+@pytest.fixture
+async def db_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_session_manager, "_host", f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    engine = async_session_manager.engine
+
+    # The driver's own transaction handling is turned off so BEGIN IMMEDIATE can be issued instead
+    @event.listens_for(engine.sync_engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    # Sent on the driver connection, so it does not count as one of the request's statements
+    @event.listens_for(engine.sync_engine, "begin")
+    def begin_immediate(connection):
+        connection.connection.cursor().execute("BEGIN IMMEDIATE")
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    await async_session_manager.close()
+
+
+@pytest.fixture
+async def db_session(db_engine):
+    async with async_session_manager.session() as session:
+        yield session
+
+
+@pytest.fixture
+async def client(db_engine):
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+# Two barbers with a working day of eight 30 minute slots each, three customers and two services
+@pytest.fixture
+async def shop(db_session):
+    customers = [
+        User(kc_id=f"kc-customer-{i}", firstName="Customer", lastName=str(i), email=f"customer{i}@example.com",
+             password="test", phoneNumber=f"55500000{i}")
+        for i in range(3)
+    ]
+    barber_users = [
+        User(kc_id=f"kc-barber-{i}", firstName="Barber", lastName=str(i), email=f"barber{i}@example.com",
+             password="test", phoneNumber=f"55500010{i}")
+        for i in range(2)
+    ]
+    db_session.add_all(customers + barber_users)
+    await db_session.flush()
+
+    barbers = [Barber(user_id=user.user_id) for user in barber_users]
+    services = [
+        Service(name="Haircut", duration=30, price=25.0, category="Hair", description="Classic haircut", popularity_score=10),
+        Service(name="Beard trim", duration=30, price=15.0, category="Beard", description="Beard shaping", popularity_score=5),
+    ]
+    db_session.add_all(barbers + services)
+    await db_session.flush()
+
+    schedules = [Schedule(barber_id=barber.barber_id, date=SHOP_DATE, is_working=True) for barber in barbers]
+    db_session.add_all(schedules)
+    await db_session.flush()
+
+    slots = {}
+    for schedule in schedules:
+        start = datetime.datetime.combine(SHOP_DATE, datetime.time(9))
+        day_slots = []
+        for i in range(8):
+            slot_start = start + datetime.timedelta(minutes=30 * i)
+            day_slots.append(TimeSlot(
+                schedule_id=schedule.schedule_id,
+                start_time=slot_start.time(),
+                end_time=(slot_start + datetime.timedelta(minutes=30)).time(),
+                is_available=True,
+                is_booked=False,
+            ))
+        db_session.add_all(day_slots)
+        slots[schedule.barber_id] = day_slots
+    await db_session.flush()
+
+    shop = SimpleNamespace(
+        customer_ids=[user.user_id for user in customers],
+        barber_ids=[barber.barber_id for barber in barbers],
+        service_ids=[service.service_id for service in services],
+        schedule_ids=[schedule.schedule_id for schedule in schedules],
+        slot_ids={barber_id: [slot.slot_id for slot in day_slots] for barber_id, day_slots in slots.items()},
+        date=SHOP_DATE,
+    )
+    await db_session.commit()
+    return shop
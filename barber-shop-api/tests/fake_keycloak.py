@@ -0,0 +1,138 @@
+'''
+A local stand-in for the parts of Keycloak the API talks to.
+
+It serves the realm signing keys, hands out admin tokens and keeps users created through
+the admin API in memory. Delays can be set per endpoint to play a slow Keycloak, the server
+answers every request on its own thread so slow calls do not hold each other up.
+'''
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeKeycloak:
+
+    def __init__(self, realm: str, signing_keys):
+        self.realm = realm
+        self.signing_keys = list(signing_keys)
+
+        # Seconds each kind of request waits before answering
+        self.certs_delay = 0.0
+        self.admin_delay = 0.0
+
+        self.users: dict[str, dict] = {}
+        self.requests: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self.requests.get(kind, 0)
+
+    def _record(self, kind: str):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def _handler(self):
+        fake = self
+        realm = re.escape(self.realm)
+        routes = [
+            ("GET", rf"/realms/{realm}/protocol/openid-connect/certs", "certs"),
+            ("POST", rf"/realms/{realm}/protocol/openid-connect/token", "token"),
+            ("POST", rf"/admin/realms/{realm}/users", "create_user"),
+            ("GET", rf"/admin/realms/{realm}/users", "list_users"),
+            ("DELETE", rf"/admin/realms/{realm}/users/(?P<id>[^/]+)", "delete_user"),
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                self.route("GET")
+
+            def do_POST(self):
+                self.route("POST")
+
+            def do_DELETE(self):
+                self.route("DELETE")
+
+            def route(self, method: str):
+                path = self.path.split("?", 1)[0]
+                for route_method, pattern, kind in routes:
+                    match = re.fullmatch(pattern, path)
+                    if route_method == method and match:
+                        fake._record(kind)
+                        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                        getattr(self, kind)(body, **match.groupdict())
+                        return
+                self.answer(404, {"error": "not found"})
+
+            def certs(self, body):
+                time.sleep(fake.certs_delay)
+                keys = [json.loads(key.export_public()) | {"use": "sig"} for key in fake.signing_keys]
+                self.answer(200, {"keys": keys})
+
+            def token(self, body):
+                self.answer(200, {
+                    "access_token": "admin-token",
+                    "expires_in": 300,
+                    "refresh_token": "admin-refresh-token",
+                    "refresh_expires_in": 1800,
+                    "token_type": "Bearer",
+                })
+
+            def create_user(self, body):
+                time.sleep(fake.admin_delay)
+                payload = json.loads(body)
+                with fake._lock:
+                    if any(user["username"] == payload["username"] for user in fake.users.values()):
+                        conflict = True
+                    else:
+                        conflict = False
+                        user_id = str(uuid.uuid4())
+                        fake.users[user_id] = payload | {"id": user_id}
+                if conflict:
+                    self.answer(409, {"errorMessage": "User exists with same username"})
+                    return
+                self.answer(201, None, {"Location": f"{fake.url}admin/realms/{fake.realm}/users/{user_id}"})
+
+            def list_users(self, body):
+                with fake._lock:
+                    self.answer(200, list(fake.users.values()))
+
+            def delete_user(self, body, id):
+                time.sleep(fake.admin_delay)
+                with fake._lock:
+                    found = fake.users.pop(id, None)
+                self.answer(204 if found else 404, None)
+
+            def answer(self, status: int, payload, headers: dict = None):
+                content = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,122 @@
+'''
+A local stand-in for the SMTP server the dispatcher delivers to.
+
+It speaks enough ESMTP for aiosmtplib (EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) and keeps
+every accepted message in memory. Recipients can be refused with a given reply, greetings and
+answers to DATA can be delayed, and the server can stop answering after a number of messages
+to play a server that hangs mid-batch. It runs on the test's event loop.
+'''
+import asyncio
+from typing import NamedTuple, Optional
+
+
+class ReceivedMessage(NamedTuple):
+    sender: str
+    recipients: list[str]
+    data: bytes
+
+
+class FakeSMTP:
+
+    def __init__(self):
+        # Replies given to RCPT TO for these addresses instead of 250, e.g. "550 No such user"
+        self.refused: dict[str, str] = {}
+        # Seconds before the greeting, the setup cost (TCP, TLS, login) of a remote server
+        self.greeting_delay = 0.0
+        # Seconds each DATA waits before it is accepted
+        self.data_delay = 0.0
+        # Messages accepted before the server stops answering, None to answer forever
+        self.hang_after: Optional[int] = None
+
+        self.messages: list[ReceivedMessage] = []
+        self.connections = 0
+        self.received = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._sessions: set[asyncio.Task] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._session, "127.0.0.1", 0)
+
+    async def stop(self):
+        self._stopping.set()
+        self._server.close()
+        for session in self._sessions:
+            session.cancel()
+        await asyncio.gather(*self._sessions, return_exceptions=True)
+        await self._server.wait_closed()
+
+    # Waits until count messages were accepted in all
+    async def wait_for(self, count: int, timeout: float = 5.0):
+        async def wait():
+            while len(self.messages) < count:
+                self.received.clear()
+                await self.received.wait()
+        await asyncio.wait_for(wait(), timeout)
+
+    def recipients(self) -> list[str]:
+        return [recipient for message in self.messages for recipient in message.recipients]
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        session = asyncio.current_task()
+        self._sessions.add(session)
+
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        sender, recipients = "", []
+        try:
+            if self.greeting_delay:
+                await asyncio.sleep(self.greeting_delay)
+            await reply("220 fake-smtp ESMTP")
+            while line := await reader.readline():
+                command = line.decode().strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    await reply("250-fake-smtp\r\n250-8BITMIME\r\n250 SMTPUTF8")
+                elif verb == "HELO":
+                    await reply("250 fake-smtp")
+                elif verb == "MAIL":
+                    sender, recipients = address(command), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipient = address(command)
+                    if recipient in self.refused:
+                        await reply(self.refused[recipient])
+                    else:
+                        recipients.append(recipient)
+                        await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    if self.hang_after is not None and len(self.messages) >= self.hang_after:
+                        await self._stopping.wait()
+                        break
+                    if self.data_delay:
+                        await asyncio.sleep(self.data_delay)
+                    self.messages.append(ReceivedMessage(sender, recipients, data[:-5]))
+                    self.received.set()
+                    await reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._sessions.discard(session)
+
+
+# The address of a MAIL FROM:<...> or RCPT TO:<...> command
+def address(command: str) -> str:
+    return command.partition(":")[2].strip().split(" ")[0].strip("<>")
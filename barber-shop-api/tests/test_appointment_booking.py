@@ -0,0 +1,69 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from modules.user.models import Appointment_TimeSlot, BarberDailyAvailability, TimeSlot
+
+# Requests fired at the same time in each test
+CONCURRENT_BOOKINGS = 20
+
+
+def booking(shop, barber_id, slot_ids, customer=0):
+    return {
+        "user_id": shop.customer_ids[customer % len(shop.customer_ids)],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": slot_ids,
+        "service_id": [shop.service_ids[0]],
+    }
+
+
+async def test_concurrent_bookings_of_one_slot_book_it_once(client, shop, db_session):
+    barber_id = shop.barber_ids[0]
+    slot_id = shop.slot_ids[barber_id][0]
+
+    responses = await asyncio.gather(*(
+        client.post("/api/v1/appointments", json=booking(shop, barber_id, [slot_id], customer))
+        for customer in range(CONCURRENT_BOOKINGS)
+    ))
+
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(200) == 1
+    assert statuses.count(409) == CONCURRENT_BOOKINGS - 1
+
+    links = await db_session.execute(
+        select(func.count()).select_from(Appointment_TimeSlot).where(Appointment_TimeSlot.slot_id == slot_id)
+    )
+    assert links.scalar() == 1
+    assert (await db_session.execute(select(TimeSlot.is_booked).where(TimeSlot.slot_id == slot_id))).scalar() is True
+
+
+async def test_concurrent_overlapping_bookings_never_share_a_slot(client, shop, db_session):
+    barber_id = shop.barber_ids[0]
+    slot_ids = shop.slot_ids[barber_id]
+    # Every request wants two back-to-back slots, each pair overlaps its neighbours
+    pairs = [slot_ids[i:i + 2] for i in range(len(slot_ids) - 1)]
+
+    responses = await asyncio.gather(*(
+        client.post("/api/v1/appointments", json=booking(shop, barber_id, pairs[i % len(pairs)], i))
+        for i in range(CONCURRENT_BOOKINGS)
+    ))
+    assert {response.status_code for response in responses} <= {200, 409}
+
+    booked_pairs = [response.json()["time_slots"] for response in responses if response.status_code == 200]
+    booked_ids = [slot["slot_id"] for pair in booked_pairs for slot in pair]
+    assert len(booked_ids) == len(set(booked_ids))
+
+    links = await db_session.execute(select(Appointment_TimeSlot.slot_id))
+    assert sorted(links.scalars().all()) == sorted(booked_ids)
+    flagged = await db_session.execute(select(TimeSlot.slot_id).where(TimeSlot.is_booked.is_(True)))
+    assert sorted(flagged.scalars().all()) == sorted(booked_ids)
+
+    # The calendar summary agrees with the slots once every booking is in
+    summary = await db_session.execute(
+        select(BarberDailyAvailability.free_slots).where(
+            BarberDailyAvailability.barber_id == barber_id,
+            BarberDailyAvailability.date == shop.date,
+        )
+    )
+    assert summary.scalar() == len(slot_ids) - len(booked_ids)
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import update
+
+from conftest import capture_statements, explain_query_plan
+from modules.user.models import Appointment, AppointmentStatus
+
+
+async def book(client, shop, slot_index):
+    barber_id = shop.barber_ids[0]
+    response = await client.post("/api/v1/appointments", json={
+        "user_id": shop.customer_ids[0],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": [shop.slot_ids[barber_id][slot_index]],
+        "service_id": [shop.service_ids[0]],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["appointment_id"]
+
+
+async def test_status_filter_uses_the_api_spelling_of_cancelled(client, shop, db_session):
+    kept_id = await book(client, shop, 0)
+    cancelled_id = await book(client, shop, 1)
+    await db_session.execute(
+        update(Appointment)
+        .where(Appointment.appointment_id == cancelled_id)
+        .values(status=AppointmentStatus.canceled)
+    )
+    await db_session.commit()
+
+    response = await client.get("/api/v1/appointments", params={"status": "cancelled"})
+    assert response.status_code == 200, response.text
+    assert [(a["appointment_id"], a["status"]) for a in response.json()] == [(cancelled_id, "cancelled")]
+
+    response = await client.get("/api/v1/appointments", params={"status": "pending"})
+    assert [a["appointment_id"] for a in response.json()] == [kept_id]
+
+    # The table's spelling is not part of the API
+    response = await client.get("/api/v1/appointments", params={"status": "canceled"})
+    assert response.status_code == 422
+
+
+# The page query of each filter reads its (x, appointment_date) index in list order, without sorting
+@pytest.mark.parametrize("filter_name, index", [
+    ("user_id", "ix_appointment_user_date"),
+    ("barber_id", "ix_appointment_barber_date"),
+    ("status", "ix_appointment_status_date"),
+])
+async def test_filters_are_served_by_their_index(client, shop, db_engine, db_session, filter_name, index):
+    await book(client, shop, 0)
+    value = {"user_id": shop.customer_ids[0], "barber_id": shop.barber_ids[0], "status": "pending"}[filter_name]
+
+    with capture_statements(db_engine) as statements:
+        response = await client.get("/api/v1/appointments", params={filter_name: value, "date_from": str(shop.date)})
+    assert response.status_code == 200, response.text
+
+    page_statement = next(statement for statement in statements if statement[0].lstrip().startswith("SELECT appointment."))
+    plan = await explain_query_plan(db_session, *page_statement)
+    assert any(index in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
@@ -0,0 +1,98 @@
+import datetime
+import time
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy import select
+
+from modules.user.models import Appointment, AppointmentReminder, AppointmentStatus, EmailOutbox
+from operations.notification_operations import AppointmentDetails
+
+CANCELLED_SUBJECT = "Your appointment has been cancelled"
+
+
+# Ends its transaction, the test session would otherwise hold the database lock the requests need
+async def read_state(db_session, appointment_id):
+    status = (await db_session.execute(
+        select(Appointment.status).where(Appointment.appointment_id == appointment_id)
+    )).scalar()
+    reminders = (await db_session.execute(
+        select(AppointmentReminder.reminder_id).where(AppointmentReminder.appointment_id == appointment_id)
+    )).scalars().all()
+    subjects = (await db_session.execute(select(EmailOutbox.subject).order_by(EmailOutbox.email_id))).scalars().all()
+    await db_session.commit()
+    return status, reminders, subjects
+
+
+async def test_cancelling_an_appointment_emails_the_customer_and_drops_its_reminder(client, shop, db_session):
+    barber_id = shop.barber_ids[0]
+    response = await client.post("/api/v1/appointments", json={
+        "user_id": shop.customer_ids[0],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": [shop.slot_ids[barber_id][0]],
+        "service_id": [shop.service_ids[0]],
+    })
+    assert response.status_code == 200, response.text
+    appointment_id = response.json()["appointment_id"]
+
+    status, reminders, subjects = await read_state(db_session, appointment_id)
+    assert len(reminders) == 1
+    assert CANCELLED_SUBJECT not in subjects
+
+    response = await client.put(f"/api/v1/appointments/{appointment_id}", json={"status": "cancelled"})
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "cancelled"
+
+    status, reminders, subjects = await read_state(db_session, appointment_id)
+    assert status == AppointmentStatus.canceled
+    assert reminders == []
+    assert subjects.count(CANCELLED_SUBJECT) == 1
+
+    # Sending the same status again is not a change, no second email goes out
+    response = await client.put(f"/api/v1/appointments/{appointment_id}", json={"status": "cancelled"})
+    assert response.status_code == 200, response.text
+    status, reminders, subjects = await read_state(db_session, appointment_id)
+    assert subjects.count(CANCELLED_SUBJECT) == 1
+
+
+# The server's own timezone, set to one that is neither UTC nor the shop's for the test
+@pytest.fixture
+def server_timezone(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+# Slot times are read in the configured shop timezone, not in the server's
+async def test_reminders_are_due_in_the_shop_timezone(client, shop, db_session, override_settings, server_timezone):
+    override_settings(SHOP_TIMEZONE="America/New_York", APPOINTMENT_REMINDER_HOURS="24")
+    barber_id = shop.barber_ids[0]
+    response = await client.post("/api/v1/appointments", json={
+        "user_id": shop.customer_ids[0],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": [shop.slot_ids[barber_id][0]],
+        "service_id": [shop.service_ids[0]],
+    })
+    assert response.status_code == 200, response.text
+
+    send_at = (await db_session.execute(select(AppointmentReminder.send_at))).scalar_one()
+    await db_session.commit()
+    # The first slot starts at 9:00 in New York
+    starts_at = datetime.datetime.combine(shop.date, datetime.time(9), tzinfo=ZoneInfo("America/New_York"))
+    expected = starts_at.astimezone(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=24)
+    assert send_at == expected
+
+
+def test_start_times_follow_daylight_saving_time(override_settings):
+    override_settings(SHOP_TIMEZONE="Europe/Athens")
+    details = AppointmentDetails(
+        appointment_id=1, status=AppointmentStatus.pending, recipient="customer@example.com",
+        first_name="Customer", barber_name="Barber 0", starts_at=datetime.datetime(2025, 1, 15, 9),
+    )
+    # UTC+2 in winter, UTC+3 in summer
+    assert details.starts_at_utc == datetime.datetime(2025, 1, 15, 7)
+    assert details._replace(starts_at=datetime.datetime(2025, 7, 15, 9)).starts_at_utc == datetime.datetime(2025, 7, 15, 6)
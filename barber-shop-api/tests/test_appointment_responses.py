@@ -0,0 +1,62 @@
+from sqlalchemy import delete
+
+from modules.user.models import Service
+from operations.service_catalog import service_catalog
+
+
+async def test_appointment_services_come_from_a_current_catalog(client, shop, db_session, monkeypatch):
+    # The worker's catalog is loaded and would not be checked again on its own
+    monkeypatch.setattr(service_catalog, "check_interval", 3600)
+    await service_catalog.get(db_session)
+
+    # Another worker adds a service after this worker's copy was taken
+    service = Service(name="Shave", duration=30, price=20.0, category="Beard", description="Hot towel shave", popularity_score=1)
+    db_session.add(service)
+    await db_session.flush()
+    service_id = service.service_id
+    await service_catalog.bump(db_session)
+    await db_session.commit()
+
+    barber_id = shop.barber_ids[0]
+    response = await client.post("/api/v1/appointments", json={
+        "user_id": shop.customer_ids[0],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": [shop.slot_ids[barber_id][0]],
+        "service_id": [shop.service_ids[0], service_id],
+    })
+    assert response.status_code == 200, response.text
+    assert sorted((s["service_id"], s["name"]) for s in response.json()["services"]) == [
+        (shop.service_ids[0], "Haircut"),
+        (service_id, "Shave"),
+    ]
+
+
+async def test_services_deleted_after_booking_are_left_out(client, shop, db_session):
+    barber_id = shop.barber_ids[0]
+    response = await client.post("/api/v1/appointments", json={
+        "user_id": shop.customer_ids[0],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": [shop.slot_ids[barber_id][0]],
+        "service_id": shop.service_ids,
+    })
+    assert response.status_code == 200, response.text
+    appointment_id = response.json()["appointment_id"]
+
+    # The link outlives the service, as when the service is deleted between reading the links and the catalog
+    await db_session.execute(delete(Service).where(Service.service_id == shop.service_ids[1]))
+    await service_catalog.bump(db_session)
+    await db_session.commit()
+    service_catalog.invalidate()
+
+    response = await client.get(f"/api/v1/appointments/{appointment_id}")
+    assert response.status_code == 200, response.text
+    assert [s["service_id"] for s in response.json()["services"]] == [shop.service_ids[0]]
+
+
+async def test_catalog_version_starts_and_moves_with_bumps(db_session):
+    assert await service_catalog.read_version(db_session) == 1
+    for expected in (2, 3):
+        await service_catalog.bump(db_session)
+        assert await service_catalog.read_version(db_session) == expected
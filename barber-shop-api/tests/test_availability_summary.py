@@ -0,0 +1,60 @@
+import datetime
+
+from sqlalchemy import func, select
+
+from conftest import auth_headers
+from modules.user.models import BarberDailyAvailability, Schedule
+
+
+async def summary(db_session, barber_id):
+    result = await db_session.execute(
+        select(BarberDailyAvailability.date, BarberDailyAvailability.free_slots)
+        .filter(BarberDailyAvailability.barber_id == barber_id)
+        .order_by(BarberDailyAvailability.date)
+    )
+    rows = [tuple(row) for row in result.all()]
+    await db_session.commit()
+    return rows
+
+
+def new_schedule(shop, date, time_slots):
+    return {"barber_id": shop.barber_ids[0], "date": date.isoformat(), "is_working": True, "time_slots": time_slots}
+
+
+# Created, moved to another day and deleted, the summary follows the schedule's day each time.
+# The shop's own schedules are seeded without summary rows
+async def test_summary_follows_a_schedule_through_its_writes(client, shop, db_session):
+    headers = auth_headers("barber")
+    barber_id = shop.barber_ids[0]
+    day = shop.date + datetime.timedelta(days=1)
+    other_day = shop.date + datetime.timedelta(days=2)
+    time_slots = [
+        {"start_time": "09:00", "end_time": "09:30"},
+        {"start_time": "09:30", "end_time": "10:00", "is_available": False},
+    ]
+
+    response = await client.post("/api/v1/schedules", json=new_schedule(shop, day, time_slots), headers=headers)
+    assert response.status_code == 200, response.text
+    schedule_id = response.json()["schedule_id"]
+    assert await summary(db_session, barber_id) == [(day, 1)]
+
+    response = await client.put(f"/api/v1/schedules/{schedule_id}", json={"date": other_day.isoformat()}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert await summary(db_session, barber_id) == [(other_day, 1)]
+
+    response = await client.delete(f"/api/v1/schedules/{schedule_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert await summary(db_session, barber_id) == []
+
+
+# The schedule is not committed before its slots, a bad slot leaves nothing behind
+async def test_schedule_and_slots_are_created_together(client, shop, db_session):
+    day = shop.date + datetime.timedelta(days=1)
+    time_slots = [{"start_time": "09:00", "end_time": "09:30"}, {"start_time": "9h30", "end_time": "10:00"}]
+
+    response = await client.post(
+        "/api/v1/schedules", json=new_schedule(shop, day, time_slots), headers=auth_headers("barber")
+    )
+    assert response.status_code == 400
+    schedules = await db_session.execute(select(func.count()).select_from(Schedule).filter(Schedule.date == day))
+    assert schedules.scalar() == 0
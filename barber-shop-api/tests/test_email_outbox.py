@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+
+from sqlalchemy import select, update
+
+from modules.user.models import EmailOutbox, EmailStatus
+from operations.email_dispatcher import email_dispatcher
+from operations.email_outbox_operations import EmailOutboxOperations, claim_lease_seconds, utc_now
+
+# Tried again after 30 seconds, give or take the 20% jitter
+RETRY_DELAY = 30
+
+
+async def enqueue(db_session, *recipients) -> list[int]:
+    outbox_ops = EmailOutboxOperations(db_session)
+    return [await outbox_ops.enqueue_email(recipient, "Reminder", "<p>See you soon</p>") for recipient in recipients]
+
+
+# Ends its transaction, the test session would otherwise hold the database lock the dispatcher needs
+async def read_outbox(db_session) -> dict:
+    result = await db_session.execute(
+        select(
+            EmailOutbox.recipient,
+            EmailOutbox.status,
+            EmailOutbox.attempts,
+            EmailOutbox.next_attempt_at,
+            EmailOutbox.sent_at,
+            EmailOutbox.last_error,
+        ).order_by(EmailOutbox.email_id)
+    )
+    rows = {row.recipient: row for row in result.all()}
+    await db_session.commit()
+    return rows
+
+
+async def make_due(db_session):
+    await db_session.execute(update(EmailOutbox).values(next_attempt_at=utc_now()))
+    await db_session.commit()
+
+
+async def test_due_emails_are_sent_and_marked_sent(db_engine, db_session, fake_smtp):
+    await enqueue(db_session, "a@example.com", "b@example.com", "c@example.com")
+
+    assert await email_dispatcher.dispatch_batch() == 3
+
+    assert sorted(fake_smtp.recipients()) == ["a@example.com", "b@example.com", "c@example.com"]
+    rows = await read_outbox(db_session)
+    assert {row.status for row in rows.values()} == {EmailStatus.sent}
+    assert all(row.attempts == 1 and row.sent_at is not None for row in rows.values())
+    # Nothing is left to claim
+    assert await email_dispatcher.dispatch_batch() == 0
+
+
+async def test_temporary_failures_are_retried_with_a_backoff(db_engine, db_session, fake_smtp, override_settings):
+    override_settings(EMAIL_RETRY_DELAY=str(RETRY_DELAY))
+    fake_smtp.refused["busy@example.com"] = "451 Mailbox busy, try again later"
+    await enqueue(db_session, "busy@example.com", "ok@example.com")
+
+    before = utc_now()
+    await email_dispatcher.dispatch_batch()
+    rows = await read_outbox(db_session)
+    busy = rows["busy@example.com"]
+    assert rows["ok@example.com"].status == EmailStatus.sent
+    assert busy.status == EmailStatus.pending
+    assert busy.attempts == 1
+    assert "Mailbox busy" in busy.last_error
+    assert before + datetime.timedelta(seconds=RETRY_DELAY * 0.8) <= busy.next_attempt_at
+    assert busy.next_attempt_at <= utc_now() + datetime.timedelta(seconds=RETRY_DELAY * 1.2)
+
+    # Not due yet, then sent once the backoff is over and the mailbox accepts it
+    assert await email_dispatcher.dispatch_batch() == 0
+    del fake_smtp.refused["busy@example.com"]
+    await make_due(db_session)
+    assert await email_dispatcher.dispatch_batch() == 1
+
+    busy = (await read_outbox(db_session))["busy@example.com"]
+    assert busy.status == EmailStatus.sent
+    assert busy.attempts == 2
+    assert fake_smtp.recipients().count("busy@example.com") == 1
+
+
+async def test_permanent_failures_and_exhausted_retries_are_marked_failed(
+    db_engine, db_session, fake_smtp, override_settings
+):
+    override_settings(EMAIL_MAX_ATTEMPTS="2")
+    fake_smtp.refused["unknown@example.com"] = "550 No such user"
+    fake_smtp.refused["busy@example.com"] = "451 Mailbox busy, try again later"
+    await enqueue(db_session, "unknown@example.com", "busy@example.com")
+
+    await email_dispatcher.dispatch_batch()
+    rows = await read_outbox(db_session)
+    # A rejection the server would give again is not retried
+    assert rows["unknown@example.com"].status == EmailStatus.failed
+    assert rows["busy@example.com"].status == EmailStatus.pending
+
+    await make_due(db_session)
+    await email_dispatcher.dispatch_batch()
+    rows = await read_outbox(db_session)
+    assert rows["busy@example.com"].status == EmailStatus.failed
+    assert rows["busy@example.com"].attempts == 2
+    assert rows["unknown@example.com"].attempts == 1
+
+
+# The lease outlasts a batch in which every email runs into the send timeout
+async def test_claims_are_leased_for_a_whole_batch_of_timeouts(db_engine, db_session):
+    await enqueue(db_session, "a@example.com")
+    lease = claim_lease_seconds(50, 30)
+    assert lease > 50 * 30
+
+    before = utc_now()
+    claimed = await EmailOutboxOperations(db_session).claim_due(50, lease)
+    assert [email.recipient for email in claimed] == ["a@example.com"]
+    row = (await read_outbox(db_session))["a@example.com"]
+    assert row.next_attempt_at >= before + datetime.timedelta(seconds=lease)
+
+    # Another dispatcher finds nothing due while the lease runs
+    assert await EmailOutboxOperations(db_session).claim_due(50, lease) == []
+
+
+# A dispatcher stopped mid-batch has already marked what it sent, only the rest is sent again
+async def test_emails_are_marked_sent_as_each_goes_out(db_engine, db_session, fake_smtp, override_settings):
+    override_settings(EMAIL_POOL_SIZE="1")
+    recipients = [f"customer{i}@example.com" for i in range(5)]
+    await enqueue(db_session, *recipients)
+    fake_smtp.hang_after = 2
+
+    dispatch = asyncio.create_task(email_dispatcher.dispatch_batch())
+    await fake_smtp.wait_for(2)
+    for _ in range(50):
+        rows = await read_outbox(db_session)
+        if sum(row.status == EmailStatus.sent for row in rows.values()) == 2:
+            break
+        await asyncio.sleep(0.02)
+    dispatch.cancel()
+    await asyncio.gather(dispatch, return_exceptions=True)
+
+    rows = await read_outbox(db_session)
+    assert [rows[recipient].status for recipient in recipients] == [EmailStatus.sent] * 2 + [EmailStatus.pending] * 3
+
+    fake_smtp.hang_after = None
+    await make_due(db_session)
+    assert await email_dispatcher.dispatch_batch() == 3
+    assert sorted(fake_smtp.recipients()) == sorted(recipients)
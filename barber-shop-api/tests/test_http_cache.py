@@ -0,0 +1,206 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from conftest import auth_headers
+from core.http_cache import PRIVATE_REVALIDATE, conditional_get_middleware
+
+# Read routes under the per-user PRIVATE_REVALIDATE policy, and under a shared public one
+PRIVATE_ROUTES = ["/api/v1/barbers", "/api/v1/barbers/{barber_id}", "/api/v1/schedules/{schedule_id}"]
+PUBLIC_ROUTES = ["/api/v1/services"]
+# Routes whose ETag comes from the versions in cache_version, a 304 costs them that one lookup
+VERSIONED_ROUTES = [
+    "/api/v1/barbers",
+    "/api/v1/barbers/{barber_id}",
+    "/api/v1/schedules",
+    "/api/v1/schedules/{schedule_id}",
+    "/api/v1/threads/{user_id}",
+    "/api/v1/threads/{user_id}/and/{other_user_id}",
+]
+ORIGIN = "http://localhost:5173"
+POLLS = 20
+
+
+def vary(response) -> set:
+    return {value.strip().lower() for value in response.headers.get("Vary", "").split(",") if value.strip()}
+
+
+async def get_twice(client, path, headers):
+    first = await client.get(path, headers=headers)
+    assert first.status_code == 200, first.text
+    second = await client.get(path, headers={**headers, "If-None-Match": first.headers["ETag"]})
+    return first, second
+
+
+@pytest.mark.parametrize("route", PRIVATE_ROUTES)
+async def test_private_routes_revalidate_per_user(client, shop, route):
+    path = route.format(barber_id=shop.barber_ids[0], schedule_id=shop.schedule_ids[0])
+    first, second = await get_twice(client, path, auth_headers("barber"))
+
+    assert second.status_code == 304
+    assert second.content == b""
+    for response in (first, second):
+        assert response.headers["ETag"] == first.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private, no-cache"
+        assert "authorization" in vary(response)
+
+
+@pytest.mark.parametrize("route", PUBLIC_ROUTES)
+async def test_public_routes_are_shared_for_max_age(client, shop, route):
+    first, second = await get_twice(client, route, {})
+
+    assert second.status_code == 304
+    assert second.content == b""
+    for response in (first, second):
+        assert response.headers["ETag"] == first.headers["ETag"]
+        assert response.headers["Cache-Control"] == "public, max-age=30"
+        assert "authorization" not in vary(response)
+
+
+async def test_changed_catalog_answers_the_old_etag_with_a_body(client, shop):
+    first = await client.get("/api/v1/services")
+
+    response = await client.post("/api/v1/services", headers=auth_headers("barber"), json={
+        "name": "Shave", "duration": 30, "price": 20, "category": "Beard",
+        "description": "Hot towel shave", "popularity_score": 1,
+    })
+    assert response.status_code == 200, response.text
+
+    response = await client.get("/api/v1/services", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert "Shave" in [service["name"] for service in response.json()]
+
+
+# A thread between the first two customers with a few messages, created through the API
+@pytest.fixture
+async def thread(client, shop):
+    user_id, other_user_id = shop.customer_ids[:2]
+    response = await client.post("/api/v1/threads", json={"receivingUser": user_id, "sendingUser": other_user_id})
+    assert response.status_code == 200, response.text
+    thread_id = response.json()["thread_id"]
+    for i in range(5):
+        response = await client.post(
+            "/api/v1/messages", json={"thread_id": thread_id, "hasActiveMessage": True, "text": f"message {i}"}
+        )
+        assert response.status_code == 200, response.text
+    return thread_id
+
+
+def route_path(route, shop) -> str:
+    return route.format(
+        barber_id=shop.barber_ids[0],
+        schedule_id=shop.schedule_ids[0],
+        user_id=shop.customer_ids[0],
+        other_user_id=shop.customer_ids[1],
+    )
+
+
+@pytest.mark.parametrize("route", VERSIONED_ROUTES)
+async def test_versioned_routes_answer_304_before_loading(client, shop, thread, route):
+    first, second = await get_twice(client, route_path(route, shop), auth_headers("barber"))
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert int(second.headers["X-DB-Query-Count"]) == 1
+
+
+async def test_writes_move_the_etags_of_what_they_change(client, shop, thread):
+    headers = auth_headers("barber")
+    schedule_path = f"/api/v1/schedules/{shop.schedule_ids[0]}"
+    thread_path = f"/api/v1/threads/{shop.customer_ids[0]}"
+    schedule = await client.get(schedule_path, headers=headers)
+    threads = await client.get(thread_path, headers=headers)
+
+    barber_id = shop.barber_ids[0]
+    response = await client.post("/api/v1/appointments", json={
+        "user_id": shop.customer_ids[0],
+        "barber_id": barber_id,
+        "status": "pending",
+        "time_slot": [shop.slot_ids[barber_id][0]],
+        "service_id": [shop.service_ids[0]],
+    })
+    assert response.status_code == 200, response.text
+
+    # The booked slot changed the schedule, the threads are untouched
+    response = await client.get(schedule_path, headers={**headers, "If-None-Match": schedule.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["time_slots"] != schedule.json()["time_slots"]
+    response = await client.get(thread_path, headers={**headers, "If-None-Match": threads.headers["ETag"]})
+    assert response.status_code == 304
+
+    response = await client.post("/api/v1/messages", json={"thread_id": thread, "hasActiveMessage": True, "text": "new"})
+    assert response.status_code == 200, response.text
+    response = await client.get(thread_path, headers={**headers, "If-None-Match": threads.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()[0]["messages"][-1]["text"] == "new"
+
+
+def assert_cors_kept(response):
+    assert response.headers["Access-Control-Allow-Origin"] == ORIGIN
+    assert {"origin", "authorization"} <= vary(response)
+    assert "content-type" not in response.headers
+    assert "content-length" not in response.headers or response.headers["content-length"] == "0"
+
+
+# A 304 answered by the route itself passes through the CORS middleware like any response
+async def test_route_304_keeps_the_cors_headers(client, shop):
+    path = f"/api/v1/schedules/{shop.schedule_ids[0]}"
+    first, second = await get_twice(client, path, {**auth_headers("barber"), "Origin": ORIGIN})
+
+    assert second.status_code == 304
+    assert_cors_kept(second)
+    assert second.headers["Cache-Control"] == "private, no-cache"
+
+
+# A 304 made by the middleware from a hashed body starts from the headers of the response
+# it replaces, CORS ran inside it and its headers would be lost otherwise
+async def test_middleware_304_keeps_the_cors_headers():
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=[ORIGIN], allow_credentials=True, expose_headers=["ETag"])
+    app.middleware("http")(conditional_get_middleware)
+
+    @app.get("/report", dependencies=[Depends(PRIVATE_REVALIDATE)])
+    async def report():
+        return {"rows": list(range(100))}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        first, second = await get_twice(client, "/report", {"Origin": ORIGIN})
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Access-Control-Expose-Headers"] == "ETag"
+    assert_cors_kept(second)
+
+
+# Bytes of a response as sent over HTTP/1.1: status line, headers and body
+def wire_bytes(response) -> int:
+    status_line = len(f"HTTP/1.1 {response.status_code} {response.reason_phrase}\r\n")
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.raw)
+    return status_line + headers + 2 + len(response.content)
+
+
+# A client polling every read route, with and without If-None-Match, while nothing changes
+async def test_polling_with_etags_sends_only_headers(client, shop, thread):
+    headers = auth_headers("barber")
+    routes = VERSIONED_ROUTES + PUBLIC_ROUTES
+    for route in routes:
+        path = route_path(route, shop)
+        plain = conditional = 0
+        etag = None
+        for _ in range(POLLS):
+            response = await client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+            plain += wire_bytes(response)
+            body = len(response.content)
+
+            response = await client.get(path, headers={**headers, **({"If-None-Match": etag} if etag else {})})
+            assert response.status_code == (304 if etag else 200), response.text
+            conditional += wire_bytes(response)
+            etag = response.headers["ETag"]
+
+        # Only the first conditional poll carries the body, the others send the headers alone
+        assert conditional <= plain - (POLLS - 1) * body, route
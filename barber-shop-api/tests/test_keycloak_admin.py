@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from sqlalchemy import func, select
+
+from modules.user.models import User
+
+# How long the stand-in Keycloak takes to answer each admin call
+SLOW_ADMIN_SECONDS = 1.0
+# Registrations in flight at once, twice the admin executor's workers
+REGISTRATIONS = 8
+
+
+def new_user(i: int) -> dict:
+    return {
+        "firstName": "New",
+        "lastName": f"User {i}",
+        "email": f"new{i}@example.com",
+        "phoneNumber": f"55502000{i:02d}",
+        "password": "secret",
+    }
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.05)
+
+
+async def test_keycloak_user_created_after_a_timeout_is_deleted_again(
+    client, db_session, fake_keycloak, override_settings
+):
+    override_settings(KEYCLOAK_ADMIN_TIMEOUT="0.2")
+    fake_keycloak.admin_delay = 0.5
+
+    response = await client.post("/api/v1/users", json=new_user(0))
+    assert response.status_code == 504
+
+    # Keycloak still creates the user once the request has given up, and it is deleted again
+    await wait_until(lambda: fake_keycloak.count("delete_user") == 1 and not fake_keycloak.users)
+    assert fake_keycloak.count("create_user") == 1
+    assert (await db_session.execute(select(func.count()).select_from(User))).scalar() == 0
+
+
+async def test_slow_keycloak_admin_calls_do_not_hold_up_other_requests(client, shop, fake_keycloak):
+    fake_keycloak.admin_delay = SLOW_ADMIN_SECONDS
+    registrations = [
+        asyncio.create_task(client.post("/api/v1/users", json=new_user(i))) for i in range(REGISTRATIONS)
+    ]
+    await wait_until(lambda: fake_keycloak.count("create_user") > 0)
+
+    # Requests that never touch Keycloak, sent while every admin worker is waiting on it
+    latencies = []
+    while not all(registration.done() for registration in registrations):
+        start = time.perf_counter()
+        response = await client.get("/api/v1/services")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+
+    assert [registration.result().status_code for registration in registrations] == [200] * REGISTRATIONS
+    assert len(fake_keycloak.users) == REGISTRATIONS
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    assert len(latencies) > 10
+    assert p99 < SLOW_ADMIN_SECONDS / 4
@@ -0,0 +1,70 @@
+import datetime
+
+from sqlalchemy import update
+
+from modules.user.models import Appointment, AppointmentStatus
+
+NEXT_CURSOR = "X-Next-Cursor"
+
+
+# Follows the X-Next-Cursor header from the first page to the last, returning every id seen
+async def walk(client, path, params, id_field):
+    ids = []
+    cursor = None
+    while True:
+        response = await client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        ids += [item[id_field] for item in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR)
+        if not cursor:
+            return ids
+
+
+# Appointments without a date come first, and the cursor of a page ending on one still continues
+async def test_appointment_cursor_walks_past_appointments_without_a_date(client, shop, db_session):
+    dates = [None, shop.date, None, shop.date + datetime.timedelta(days=1), None, shop.date]
+    appointments = [
+        Appointment(user_id=shop.customer_ids[0], barber_id=shop.barber_ids[0], status=AppointmentStatus.pending)
+        for _ in dates
+    ]
+    db_session.add_all(appointments)
+    await db_session.flush()
+    keys = [(date is not None, date or shop.date, appointment.appointment_id) for date, appointment in zip(dates, appointments)]
+    # The ORM would fill in the column default for a None, so the dates are set in SQL
+    for date, appointment in zip(dates, appointments):
+        await db_session.execute(
+            update(Appointment).where(Appointment.appointment_id == appointment.appointment_id).values(appointment_date=date)
+        )
+    await db_session.commit()
+
+    expected = [appointment_id for _, _, appointment_id in sorted(keys)]
+    assert await walk(client, "/api/v1/appointments", {"limit": 2}, "appointment_id") == expected
+
+
+async def test_cursor_is_refused_by_other_filters_and_endpoints(client, shop, db_session):
+    db_session.add_all(
+        Appointment(
+            appointment_date=shop.date, user_id=user_id, barber_id=shop.barber_ids[0], status=AppointmentStatus.pending
+        )
+        for user_id in shop.customer_ids
+    )
+    await db_session.commit()
+
+    params = {"limit": 1, "barber_id": shop.barber_ids[0]}
+    response = await client.get("/api/v1/appointments", params=params)
+    cursor = response.headers[NEXT_CURSOR]
+
+    # The same list, with the parameters in another order, continues
+    response = await client.get("/api/v1/appointments", params={"cursor": cursor, **params})
+    assert response.status_code == 200, response.text
+
+    response = await client.get("/api/v1/appointments", params={**params, "user_id": shop.customer_ids[0], "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Pagination cursor belongs to another endpoint or set of filters"
+
+    response = await client.get("/api/v1/services", params={"cursor": cursor})
+    assert response.status_code == 400
+
+    response = await client.get("/api/v1/appointments", params={**params, "cursor": cursor[:-2]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
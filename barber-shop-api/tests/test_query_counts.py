@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import auth_headers
+from operations.service_catalog import service_catalog
+
+# Statements each read endpoint issues, whatever the number of rows it returns.
+# The counts follow the loader plans in operations/loader_options.py, a change here means a plan changed.
+# Barber and schedule reads add the version lookup their ETag is built from
+EXPECTED_QUERY_COUNTS = {
+    "/api/v1/barbers": 2,
+    "/api/v1/barbers/{barber_id}": 2,
+    "/api/v1/schedules": 3,
+    "/api/v1/schedules/{schedule_id}": 3,
+    "/api/v1/appointments": 3,
+    "/api/v1/appointments/{appointment_id}": 3,
+}
+
+
+async def book_appointments(client, shop, count):
+    appointment_ids = []
+    for i in range(count):
+        barber_id = shop.barber_ids[i % len(shop.barber_ids)]
+        slot_id = shop.slot_ids[barber_id][i // len(shop.barber_ids)]
+        response = await client.post("/api/v1/appointments", json={
+            "user_id": shop.customer_ids[i % len(shop.customer_ids)],
+            "barber_id": barber_id,
+            "status": "pending",
+            "time_slot": [slot_id],
+            "service_id": shop.service_ids,
+        })
+        assert response.status_code == 200, response.text
+        appointment_ids.append(response.json()["appointment_id"])
+    return appointment_ids
+
+
+# Statements issued for one request, as counted by the request's QueryStats
+async def query_count(client, path):
+    response = await client.get(path, headers=auth_headers("barber"))
+    assert response.status_code == 200, response.text
+    return int(response.headers["X-DB-Query-Count"])
+
+
+@pytest.mark.parametrize("appointments", [1, 12])
+async def test_read_endpoints_issue_a_fixed_number_of_statements(client, shop, appointments, monkeypatch):
+    # Appointment services come from the catalog the bookings loaded, its version is not checked again
+    monkeypatch.setattr(service_catalog, "check_interval", 3600)
+    appointment_ids = await book_appointments(client, shop, appointments)
+    ids = {
+        "barber_id": shop.barber_ids[0],
+        "schedule_id": shop.schedule_ids[0],
+        "appointment_id": appointment_ids[-1],
+    }
+
+    counts = {
+        route: await query_count(client, route.format(**ids) + ("?limit=100" if "{" not in route else ""))
+        for route in EXPECTED_QUERY_COUNTS
+    }
+    assert counts == EXPECTED_QUERY_COUNTS
@@ -0,0 +1,78 @@
+import datetime
+
+from sqlalchemy import func, select
+
+from conftest import auth_headers
+from modules.user.models import Schedule, TimeSlot
+
+ROSTER_DAYS = 7
+
+
+def roster(shop):
+    return {
+        "rules": [{
+            "barber_ids": [shop.barber_ids[0]],
+            "start_date": shop.date.isoformat(),
+            "end_date": (shop.date + datetime.timedelta(days=ROSTER_DAYS - 1)).isoformat(),
+            "weekdays": list(range(7)),
+            "open_time": "09:00:00",
+            "close_time": "12:00:00",
+            "slot_minutes": 30,
+        }],
+    }
+
+
+# Ends its transaction, the test session would otherwise hold the database lock the requests need
+async def count_rows(db_session, model):
+    count = (await db_session.execute(select(func.count()).select_from(model))).scalar()
+    await db_session.commit()
+    return count
+
+
+async def test_roster_reports_the_rows_it_inserted(client, shop, db_session):
+    schedules_before = await count_rows(db_session, Schedule)
+    slots_before = await count_rows(db_session, TimeSlot)
+
+    response = await client.post("/api/v1/schedules/roster", json=roster(shop), headers=auth_headers("barber"))
+    assert response.status_code == 200, response.text
+    # The shop's day already has the barber's schedule, and its slots overlap all six roster slots
+    assert response.json() == {
+        "schedules_inserted": ROSTER_DAYS - 1,
+        "schedules_skipped": 1,
+        "time_slots_inserted": (ROSTER_DAYS - 1) * 6,
+        "time_slots_skipped": 6,
+    }
+    assert await count_rows(db_session, Schedule) - schedules_before == ROSTER_DAYS - 1
+    assert await count_rows(db_session, TimeSlot) - slots_before == (ROSTER_DAYS - 1) * 6
+
+    # Posting it again adds nothing, and says so
+    response = await client.post("/api/v1/schedules/roster", json=roster(shop), headers=auth_headers("barber"))
+    assert response.json() == {
+        "schedules_inserted": 0,
+        "schedules_skipped": ROSTER_DAYS,
+        "time_slots_inserted": 0,
+        "time_slots_skipped": ROSTER_DAYS * 6,
+    }
+    assert await count_rows(db_session, TimeSlot) - slots_before == (ROSTER_DAYS - 1) * 6
+
+
+async def test_roster_leaves_days_off_without_slots(client, shop, db_session):
+    day_off = Schedule(barber_id=shop.barber_ids[0], date=shop.date + datetime.timedelta(days=1), is_working=False)
+    db_session.add(day_off)
+    await db_session.flush()
+    day_off_id = day_off.schedule_id
+    await db_session.commit()
+
+    response = await client.post("/api/v1/schedules/roster", json=roster(shop), headers=auth_headers("barber"))
+    assert response.status_code == 200, response.text
+    # The shop's day and the day off both exist, only the day off's slots are left out for that reason
+    assert response.json() == {
+        "schedules_inserted": ROSTER_DAYS - 2,
+        "schedules_skipped": 2,
+        "time_slots_inserted": (ROSTER_DAYS - 2) * 6,
+        "time_slots_skipped": 12,
+    }
+    day_off_slots = await db_session.execute(
+        select(func.count()).select_from(TimeSlot).filter(TimeSlot.schedule_id == day_off_id)
+    )
+    assert day_off_slots.scalar() == 0
@@ -0,0 +1,43 @@
+from conftest import auth_headers
+
+
+def slot(start_time, end_time, slot_id=None, **fields):
+    return {"slot_id": slot_id, "start_time": start_time, "end_time": end_time, **fields}
+
+
+async def test_slots_without_an_id_are_added(client, shop):
+    barber_id = shop.barber_ids[0]
+    schedule_id = shop.schedule_ids[0]
+    kept = shop.slot_ids[barber_id][:2]
+    time_slots = [
+        slot("09:00", "09:30", kept[0]),
+        slot("09:30", "10:00", kept[1], is_available=False),
+        # New slots, one with a null slot_id and one without the field at all
+        slot("13:00", "13:30"),
+        {"start_time": "13:30", "end_time": "14:00"},
+    ]
+
+    response = await client.put(
+        f"/api/v1/schedules/{schedule_id}", json={"time_slots": time_slots}, headers=auth_headers("barber")
+    )
+    assert response.status_code == 200, response.text
+    slots = sorted(response.json()["time_slots"], key=lambda s: s["start_time"])
+    assert [(s["start_time"], s["is_available"]) for s in slots] == [
+        ("09:00:00", True), ("09:30:00", False), ("13:00:00", True), ("13:30:00", True),
+    ]
+    assert [s["slot_id"] for s in slots[:2]] == kept
+    assert not set(s["slot_id"] for s in slots[2:]) & set(shop.slot_ids[barber_id])
+
+
+# An ID that is not one of this schedule's slots is refused, it is never taken as a new slot
+async def test_slot_ids_of_other_schedules_are_refused(client, shop):
+    schedule_id = shop.schedule_ids[0]
+    other_slot_id = shop.slot_ids[shop.barber_ids[1]][0]
+
+    response = await client.put(
+        f"/api/v1/schedules/{schedule_id}",
+        json={"time_slots": [slot("09:00", "09:30", other_slot_id)]},
+        headers=auth_headers("barber"),
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Time slot {other_slot_id} does not belong to schedule {schedule_id}"
@@ -0,0 +1,44 @@
+import datetime
+
+import pytest
+
+from modules.user.models import Message, Thread
+
+MESSAGES_PER_THREAD = 30
+
+
+# Two threads between the first two customers, each with a long history
+@pytest.fixture
+async def conversation(shop, db_session):
+    user_id, other_user_id = shop.customer_ids[:2]
+    threads = [Thread(receivingUser=user_id, sendingUser=other_user_id) for _ in range(2)]
+    db_session.add_all(threads)
+    await db_session.flush()
+    sent_at = datetime.datetime(2025, 1, 1)
+    db_session.add_all(
+        Message(thread_id=thread.thread_id, hasActiveMessage=True, text=f"message {i}",
+                timeStamp=sent_at + datetime.timedelta(minutes=i))
+        for thread in threads
+        for i in range(MESSAGES_PER_THREAD)
+    )
+    await db_session.commit()
+    return user_id, other_user_id
+
+
+@pytest.mark.parametrize("route", ["/api/v1/threads/{user_id}", "/api/v1/threads/{user_id}/and/{other_user_id}"])
+async def test_thread_routes_return_only_the_latest_messages(client, conversation, route):
+    user_id, other_user_id = conversation
+    path = route.format(user_id=user_id, other_user_id=other_user_id)
+
+    response = await client.get(path, params={"message_limit": 5})
+    assert response.status_code == 200, response.text
+    threads = response.json()
+    assert len(threads) == 2
+    for thread in threads:
+        assert [message["text"] for message in thread["messages"]] == [
+            f"message {i}" for i in range(MESSAGES_PER_THREAD - 5, MESSAGES_PER_THREAD)
+        ]
+
+    # Without a message_limit each thread still comes with a bounded history
+    response = await client.get(path)
+    assert all(len(thread["messages"]) == 20 for thread in response.json())
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from auth.service import AuthService
+from conftest import make_token
+
+# How long the stand-in Keycloak takes to serve the signing keys
+SLOW_CERTS_SECONDS = 0.5
+
+
+# Longest gap between the ticks of a task sleeping 10ms at a time, until stop is set
+async def longest_stall(stop: asyncio.Event) -> float:
+    longest = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+        now = time.perf_counter()
+        longest = max(longest, now - last)
+        last = now
+    return longest
+
+
+async def test_signing_key_refresh_runs_off_the_event_loop_once(fake_keycloak, monkeypatch):
+    verifier = AuthService.token_verifier
+    # The verifier has never seen the realm's key, the first tokens make it fetch the key set
+    monkeypatch.setattr(verifier, "_keys", {})
+    monkeypatch.setattr(verifier, "_last_refresh", 0.0)
+    refreshes_before = verifier.key_refreshes
+    fake_keycloak.certs_delay = SLOW_CERTS_SECONDS
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(longest_stall(stop))
+    tokens = [make_token("barber", subject=f"user-{i}") for i in range(10)]
+    claims = await asyncio.gather(*(AuthService.verify_token(token) for token in tokens))
+    stop.set()
+
+    assert [user.id for user in claims] == [f"user-{i}" for i in range(10)]
+    assert fake_keycloak.count("certs") == 1
+    assert verifier.key_refreshes == refreshes_before + 1
+    # The event loop kept running while the keys were fetched
+    assert await ticker < SLOW_CERTS_SECONDS / 2
@@ -0,0 +1,77 @@
+import json
+
+from sqlalchemy import select
+
+from conftest import auth_headers
+from modules.user.models import User
+
+CSV_IMPORT = (
+    'firstName,lastName,email,phoneNumber,password\r\n'
+    'Ann,"Smith\r\nJones",ann@example.com,5550300001,secret\r\n'
+    '\r\n'
+    'Bob,"Brown, ""Bobby""",bob@example.com,5550300002,secret\r\n'
+    'Cid,Short,cid@example.com\r\n'
+    'Dee,"Multi\nline\nname",not-an-email,5550300004,secret\r\n'
+    'Eve,Evans,ann@example.com,5550300005,secret\r\n'
+)
+
+
+# Sends the body a few bytes at a time, so records and characters are split across chunks
+async def in_chunks(body: str, size: int = 7):
+    data = body.encode()
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def read_users(db_session) -> dict:
+    result = await db_session.execute(select(User.email, User.lastName))
+    users = dict(result.all())
+    await db_session.commit()
+    return users
+
+
+async def test_csv_import_keeps_quoted_line_breaks(client, db_session, fake_keycloak):
+    response = await client.post(
+        "/api/v1/users/import",
+        content=in_chunks(CSV_IMPORT),
+        headers={**auth_headers("barber"), "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["created"] == 2
+    assert body["failed"] == 3
+    # Errors name the first line of their record, counted over the physical lines
+    assert [(error["line"], error["detail"].split(":")[0]) for error in body["errors"]] == [
+        (6, "Expected 5 columns, got 3"),
+        (7, "email"),
+        (10, "Duplicate of the email on line 2"),
+    ]
+
+    assert await read_users(db_session) == {
+        "ann@example.com": "Smith\r\nJones",
+        "bob@example.com": 'Brown, "Bobby"',
+    }
+
+
+async def test_jsonl_import_reports_malformed_lines(client, db_session, fake_keycloak):
+    lines = [
+        json.dumps({"firstName": "Ann", "lastName": "Smith", "email": "ann@example.com",
+                    "phoneNumber": "5550300001", "password": "secret"}),
+        "{not json",
+        "[]",
+        json.dumps({"firstName": "Bob", "lastName": "Brown", "email": "bob@example.com",
+                    "phoneNumber": "5550300002", "password": "secret"}),
+    ]
+    response = await client.post(
+        "/api/v1/users/import?format=jsonl",
+        content=in_chunks("\n".join(lines) + "\n"),
+        headers=auth_headers("barber"),
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["created"] == 2
+    assert [(error["line"], error["detail"].split(":")[0]) for error in body["errors"]] == [
+        (2, "Malformed line"),
+        (3, "Expected a JSON object"),
+    ]
+    assert set(await read_users(db_session)) == {"ann@example.com", "bob@example.com"}
@@ -153,7 +153,7 @@ export type TimeSlotCreate = {
 };
 
 export type TimeSlotUpdate = {
-    slot_id: number;
+    slot_id?: number | null;
     schedule_id?: number | null;
     start_time?: string | null;
     end_time?: string | null;
@@ -19,7 +19,10 @@ import { BarberResponse, createScheduleApiV1SchedulesPost, getAllBarbersApiV1Bar
 import { useKeycloak } from "../hooks/useKeycloak";
 
 interface TimeSlot {
+  // Position in the editor's list, only used to tell the slots apart on screen
   id: number;
+  // The saved slot's ID, null for a slot the schedule does not have yet
+  slotId: number | null;
   timeDisplay: string;
   startTime: string;
   endTime: string;
@@ -102,7 +105,7 @@ export default function BarberSchedule() {
           const timeString = `${hour === 12 ? 12 : hour % 12}:${minutes} ${hour >= 12 ? "PM" : "AM"}`;
           for (const timeSlot of timeSlots) {
             if (timeSlot.timeDisplay === timeString) {
-              timeSlot.id = slot.slot_id;
+              timeSlot.slotId = slot.slot_id;
               timeSlot.selected = slot.is_available;
             }
           }
@@ -135,6 +138,7 @@ export default function BarberSchedule() {
         const endTime = `${minutes === "30" ? hour + 1 : hour}:${minutes === "00" ? "30" : "00"}`;
         slots.push({
           id: slots.length,
+          slotId: null,
           timeDisplay: timeString,
           startTime,
           endTime,
@@ -207,7 +211,7 @@ export default function BarberSchedule() {
         is_working: true,
         time_slots: timeSlots.map((slot) => {
           return {
-            slot_id: slot.id,
+            slot_id: slot.slotId,
             is_available: slot.selected,
             start_time: slot.startTime,
             end_time: slot.endTime,